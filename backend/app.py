@@ -1,46 +1,103 @@
+import asyncio
+import hmac
+import os
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 from globals import get_db
+from globals.database import AsyncSessionLocal, engine, get_pool_stats
 from models import Message, User
 from schemas import ReplyRequest, ReplyResponse, MessageData, MessageContent, MessageRole, ActionType, BookingResponse
-from cache import message_cache
-from queries import MessageQueries
-from user_service import get_or_create_user
+from cache import CachedMessage, message_cache, policy_cache, user_cache
+from cache.records import micros_to_datetime
+from leasing_queries import inventory_index
+from queries import MessageQueries, format_cursor, parse_cursor
+from persistence import Turn, ensure_future_partitions, new_message, turn_writer
+from user_service import get_user_by_email_async, plan_user_write
 
 load_dotenv()
 
+# Optional warm-restart snapshots of the in-memory message cache
+SNAPSHOT_PATH = os.getenv("MESSAGE_CACHE_SNAPSHOT_PATH")
+SNAPSHOT_INTERVAL = float(os.getenv("MESSAGE_CACHE_SNAPSHOT_INTERVAL", "0"))
+
+# Optional startup warmup of the most recently active users (0 = lazy hydration only)
+WARMUP_USERS = int(os.getenv("MESSAGE_CACHE_WARMUP_USERS", "0"))
+WARMUP_MAX_MB = float(os.getenv("MESSAGE_CACHE_WARMUP_MAX_MB", "256"))
+WARMUP_ACTIVE_DAYS = float(os.getenv("MESSAGE_CACHE_WARMUP_ACTIVE_DAYS", "7"))
+
+# In-memory unit inventory for the availability/pricing tools (falls back to SQL when disabled)
+INVENTORY_INDEX_ENABLED = os.getenv("INVENTORY_INDEX_ENABLED", "true").lower() == "true"
+INVENTORY_POLL_SECONDS = float(os.getenv("INVENTORY_POLL_SECONDS", "2"))
+INVENTORY_FULL_REFRESH_SECONDS = float(os.getenv("INVENTORY_FULL_REFRESH_SECONDS", "600"))
+
+# two_stage = RouterPrompt classifies, then BookingInfoPrompt answers; fused = one call does both
+ROUTER_MODE = os.getenv("AGENT_ROUTER_MODE", "two_stage").lower()
+
+# Monthly messages partitions to keep created ahead of time (0 = leave it to scripts/manage_message_partitions.py)
+PARTITION_MONTHS_AHEAD = int(os.getenv("MESSAGE_PARTITION_MONTHS_AHEAD", "3"))
+
+# /admin/* stats and cache controls: off unless enabled; with ADMIN_TOKEN set, callers send it as X-Admin-Token
+ADMIN_ENDPOINTS_ENABLED = os.getenv("ADMIN_ENDPOINTS_ENABLED", "false").lower() == "true"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    """Load existing messages from database into cache on startup"""
-    db = next(get_db())
-    try:
-        message_data = MessageQueries.get_recent_messages(db, limit=50)  # Load recent messages (optimized)
-        
-        for email, messages in message_data.items():
-            message_cache.load_from_db(email, messages)
-            total_loaded += len(messages)
-            print(f"Loaded {len(messages)} messages for user {email}")
-        
-        print(f"Total loaded: {total_loaded} messages from database into cache")
-    except Exception as e:
-        print(f"Warning: Could not load messages from database: {e}")
-        print("Make sure the database container is running: cd database && ./manage.sh start")
-    finally:
-        db.close()
+    """Hydrate per-user history lazily instead of bulk-loading messages on startup"""
+    message_cache.set_loader(load_user_history)
+    print(f"Message cache ready (lazy hydration, last {message_cache.hydration_limit} messages per user)")
+    
+    snapshot_task = None
+    restored = False
+    # Shared backends such as Redis persist themselves and don't take snapshots
+    if SNAPSHOT_PATH and message_cache.backend.supports_snapshots:
+        restored = restore_cache_snapshot(SNAPSHOT_PATH)
+        if SNAPSHOT_INTERVAL > 0:
+            snapshot_task = asyncio.create_task(snapshot_periodically(SNAPSHOT_PATH, SNAPSHOT_INTERVAL))
+    if WARMUP_USERS > 0 and not restored:
+        await asyncio.to_thread(warm_up_message_cache, WARMUP_USERS, WARMUP_MAX_MB)
+    
+    await turn_writer.start()
+    print(f"Message persistence: {turn_writer.mode} mode")
+    
+    partition_task = None
+    if PARTITION_MONTHS_AHEAD > 0:
+        await asyncio.to_thread(create_message_partitions, PARTITION_MONTHS_AHEAD)
+        partition_task = asyncio.create_task(create_partitions_daily(PARTITION_MONTHS_AHEAD))
+    
+    inventory_task = None
+    if INVENTORY_INDEX_ENABLED:
+        await asyncio.to_thread(refresh_inventory_index, True)
+        inventory_task = asyncio.create_task(
+            poll_inventory_periodically(INVENTORY_POLL_SECONDS, INVENTORY_FULL_REFRESH_SECONDS)
+        )
     
     yield  # Application runs here
     
     # Shutdown (optional cleanup)
     print("Application shutting down...")
+    await turn_writer.stop()
+    if inventory_task:
+        inventory_task.cancel()
+    if partition_task:
+        partition_task.cancel()
+    if snapshot_task:
+        snapshot_task.cancel()
+    if SNAPSHOT_PATH:
+        save_cache_snapshot(SNAPSHOT_PATH)
+    from booking_agent.speculation import speculative_executor
+    from booking_agent.tool_runner import tool_runner
+    speculative_executor.shutdown()
+    tool_runner.shutdown()
 
 app = FastAPI(title="Chat API", version="1.0.0", lifespan=lifespan)
 
@@ -58,45 +115,45 @@ async def root():
     return {"message": "Chat API is running"}
 
 @app.post("/api/reply", response_model=ReplyResponse)
-async def reply_endpoint(request: ReplyRequest, db: Session = Depends(get_db)):
+async def reply_endpoint(request: ReplyRequest):
     """
     Handle chat reply requests with the following flow:
-    1. Save user message to database and cache
+    1. Look up the user and add the user message to the cache
     2. Get chat history from cache for context
-    3. Route through security classification (RouterPrompt)
+    3. Route through security classification (RouterPrompt, or in the same call with AGENT_ROUTER_MODE=fused)
     4. Generate structured BookingResponse using tools if needed
-    5. Save assistant response to database and cache
+    5. Add the assistant response to the cache and persist the whole turn
     6. Return structured response with action classificationt
+    
+    The only database work before the agent call is a short read of the user
+    row. The user upsert and both messages are written afterwards as one turn,
+    in a single transaction (see persistence.turn_writer). In write-behind
+    mode the response only waits for the turn to reach the local journal.
+    If the agent fails, the user message is still written as a turn of its own.
     """
     try:
-        # 1. Handle user - get or create user with preferences
+        # 1. Handle user - look up the user and work out any name/preference changes
         # Pydantic has already validated that lead.email and lead.name exist and are valid
-        user_email = request.lead.email
-        user_name = request.lead.name
-        user_preferences = request.preferences or {}
+        async with AsyncSessionLocal() as db:
+            existing_user = await get_user_by_email_async(db, request.lead.email.strip())
+        # Session closed: its connection is back in the pool before the agent runs
+        # A write-behind turn may hold a newer user state than the database
+        existing_user = turn_writer.pending_user(request.lead.email.strip()) or existing_user
         
-        # Get or create user in database
-        user = get_or_create_user(
-            db=db,
-            email=user_email,
-            name=user_name,
-            preferences=user_preferences
+        user, write_user = plan_user_write(
+            existing_user,
+            email=request.lead.email,
+            name=request.lead.name,
+            preferences=request.preferences or {}
         )
-        
-        # Use the actual email from the user object (in case it was generated)
         user_email = user.email
         
-        # 2. Save user message to database and cache with user_id
-        user_message = save_message_and_cache_with_user(
-            db=db, 
-            role=MessageRole.USER, 
-            content=request.message,
-            user_id=user.user_id,
-            user_email=user_email
-        )
+        # 2. Add the user message to the cache; it is written to the database with the turn
+        user_message = new_message(MessageRole.USER.value, request.message, user_id=user.user_id)
+        message_cache.add_message(user_email, user_message)
         
         # 3. Get chat history from cache for this user
-        recent_messages = message_cache.get_message_history(user_email, limit=30, visible_only=False)
+        recent_messages = await get_history(user_email, limit=30, visible_only=False)
                 
 
         # Generate response using the agent
@@ -107,8 +164,8 @@ async def reply_endpoint(request: ReplyRequest, db: Session = Depends(get_db)):
         conversation_history = []
         for msg in recent_messages:  # Include all messages including current user message
             conversation_history.append({
-                "role": msg.get("role", "user"),
-                "content": msg.get("message", {}).get("content", "")
+                "role": msg.role,
+                "content": msg.content or ""
             })
         
         # Build context from user preferences and request
@@ -120,33 +177,48 @@ async def reply_endpoint(request: ReplyRequest, db: Session = Depends(get_db)):
             "email": user.email,
         }
         
-        # Get agent response using RouterPrompt (like in booking_agent/main.py)
-        from booking_agent.prompts.router_prompt import RouterPrompt
-        router = RouterPrompt(request.message, context=context)
-        booking_response = agent.run(router, conversation_history, request_id=str(user_message.id))
-
-        # Extract content for database storage
-        assistant_content = booking_response.reply
+        # Get agent response using RouterPrompt (like in booking_agent/main.py),
+        # or the fused prompt that classifies and answers in one call
+        if ROUTER_MODE == "fused":
+            from booking_agent.prompts.fused_prompt import FusedBookingPrompt
+            router = FusedBookingPrompt(request.message, context=context)
+        else:
+            from booking_agent.prompts.router_prompt import RouterPrompt
+            router = RouterPrompt(request.message, context=context)
+        # The agent makes blocking OpenAI and tool calls, so it runs in a worker thread
+        try:
+            booking_response = await asyncio.to_thread(
+                agent.run, router, conversation_history, request_id=str(user_message.id)
+            )
+        except Exception:
+            # Persist the user message on its own so the cache and the database agree
+            try:
+                await turn_writer.submit(Turn(user, write_user, [user_message]))
+            except Exception:
+                message_cache.clear(user_email)
+            raise
 
-        # 4. Generate UUID first, then save assistant response to database and cache
-        import uuid
-        response_uuid = str(uuid.uuid4())
-        
-        assistant_message = save_message_and_cache_with_user(
-            db=db,
-            role=MessageRole.ASSISTANT,
-            content=assistant_content,
+        # 4. Add the assistant response to the cache, then persist the turn in one transaction
+        assistant_message = new_message(
+            MessageRole.ASSISTANT.value,
+            booking_response.reply,
             user_id=user.user_id,
-            user_email=user_email,
-            parent_id=user_message.id,
-            message_id=response_uuid
+            parent_id=user_message.id
         )
+        message_cache.add_message(user_email, assistant_message)
+        
+        try:
+            await turn_writer.submit(Turn(user, write_user, [user_message, assistant_message]))
+        except Exception:
+            # Drop the unsaved messages; the next read re-hydrates from the database
+            message_cache.clear(user_email)
+            raise
         
         # 5. Return the response using BookingResponse data
         response = ReplyResponse(
-            id=response_uuid,  # Use the same UUID we saved to DB
+            id=str(assistant_message.id),  # Same client-generated UUID that was saved to DB
             reply=booking_response.reply,
-            created_date=assistant_message.created_date.isoformat(),  # Use the actual DB timestamp
+            created_date=assistant_message.created_date,
             action=booking_response.action,
             propose_time=booking_response.propose_time,
             parent_id=str(user_message.id)  # Include the parent_id (user message ID)
@@ -158,37 +230,110 @@ async def reply_endpoint(request: ReplyRequest, db: Session = Depends(get_db)):
         print(f"❌ ERROR in reply_endpoint: {str(e)}")
         import traceback
         print(f"📍 Full traceback:\n{traceback.format_exc()}")
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.get("/api/messages")
-async def get_messages(email: str, limit: int = 100, include_hidden: bool = False):
-    """Get message history from cache for a specific user, filtered by visibility"""
-    messages = message_cache.get_message_history(email, limit=limit, visible_only=not include_hidden)
-    
-    # Clean up message format for frontend compatibility
-    cleaned_messages = []
-    for msg in messages:
-        cleaned_msg = {
-            "id": msg.get("id"),
-            "message": msg.get("message", {}),
-            "created_date": msg.get("created_date")
-        }
-        cleaned_messages.append(cleaned_msg)
+async def get_messages(email: str, limit: int = 100, include_hidden: bool = False, before: Optional[str] = None):
+    """
+    Get a page of message history for a specific user, filtered by visibility.
+    
+    The newest page is served from the cache. Older pages (before=<created_date>,<id>,
+    the next_before of the previous page) and anything the cache can't fill are
+    read from the database with keyset pagination, at the same cost at any depth.
+    """
+    try:
+        cursor = parse_cursor(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be the next_before value of a previous page")
+    visible_only = not include_hidden
+    
+    if cursor is None:
+        messages = await get_history(email, limit=limit, visible_only=visible_only)
+        # The cache only holds the most recent messages; page the rest in from the database
+        if len(messages) < limit and not message_cache.holds_full_history(email):
+            oldest = (micros_to_datetime(messages[0].created_ts), messages[0].id) if messages else None
+            messages = await asyncio.to_thread(load_history_page, email, oldest, limit - len(messages), visible_only) + messages
+    else:
+        messages = await asyncio.to_thread(load_history_page, email, cursor, limit, visible_only)
+    
+    # Render only the fields the frontend uses
+    cleaned_messages = [msg.to_api_dict() for msg in messages]
     
     return {
         "messages": cleaned_messages,
-        "count": len(cleaned_messages)
+        "count": len(cleaned_messages),
+        # Pass back as `before` for the next older page; None once history is exhausted
+        "next_before": format_cursor(messages[0].created_date, messages[0].id) if messages and len(messages) >= limit else None,
     }
 
 
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for /admin/*: 404 while they are disabled, 401 without the admin token"""
+    if not ADMIN_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if ADMIN_TOKEN and not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token")
+
+
+admin = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@admin.get("/cache")
+async def get_cache_stats():
+    """Get message, user and policy cache hit/miss/eviction counters and occupancy"""
+    return {**message_cache.stats(), "user_cache": user_cache.stats(), "policy_cache": policy_cache.stats()}
+
+
+@admin.post("/cache/policies/invalidate")
+async def invalidate_policy_cache(community_id: Optional[str] = None):
+    """Drop cached policies after an edit: one community's, or all of them"""
+    policy_cache.invalidate(community_id)
+    return {"invalidated": community_id or "all"}
+
+
+@admin.get("/db")
+async def get_db_stats():
+    """Get connection pool config, occupancy, checkout wait histogram, connection churn and turn writes"""
+    return {**get_pool_stats(), "persistence": turn_writer.stats()}
+
+
+@admin.get("/preclassifier")
+async def get_preclassifier_stats():
+    """Get how routing was decided locally: skip rate, model use and disagreements with the LLM router"""
+    from booking_agent.preclassifier import preclassifier
+    return preclassifier.stats()
+
+
+@admin.get("/speculation")
+async def get_speculation_stats():
+    """Get speculative booking runs: how many were committed or discarded, and the tokens discarded ones wasted"""
+    from booking_agent.speculation import speculative_executor
+    return speculative_executor.stats()
+
+
+@admin.get("/tools")
+async def get_tool_stats():
+    """Get tool execution limits, timeouts and how much concurrent calls overlapped (tool_ms vs wall_ms)"""
+    from booking_agent.tool_runner import tool_runner
+    return tool_runner.stats()
+
+
+@admin.get("/inventory")
+async def get_inventory_stats():
+    """Get inventory index size, refresh counters, staleness and change-to-visible lag"""
+    return inventory_index.stats()
+
+
+app.include_router(admin)
+
+
 # =============================================================================
 # Helper Functions
 # =============================================================================
 
 
-def save_message_and_cache_with_user(db: Session, role: MessageRole, content: str, user_id: str, user_email: str, parent_id=None, visible_to_user: bool = True, message_id: str = None) -> Message:
+async def save_message_and_cache_with_user(db: AsyncSession, role: MessageRole, content: str, user_id: str, user_email: str, parent_id=None, visible_to_user: bool = True, message_id: str = None) -> Message:
     """
     Save a message to database and add to user's cache.
     Optionally accepts a specific message_id, otherwise auto-generates one.
@@ -216,16 +361,172 @@ def save_message_and_cache_with_user(db: Session, role: MessageRole, content: st
     
     message = Message(**message_kwargs)
     db.add(message)
-    db.commit()
+    await db.commit()  # created_date comes back with the INSERT (eager_defaults)
     
     # Add to user's cache after successful database save
-    cache_data = message.to_dict()
-    message_cache.add_message(user_email, cache_data)
+    message_cache.add_message(user_email, CachedMessage.from_model(message))
     
     return message
 
 
+async def get_history(email: str, limit: int, visible_only: bool):
+    """Read a user's cached history; a cache miss hydrates from the DB in a worker thread"""
+    if message_cache.is_loaded(email):
+        return message_cache.get_message_history(email, limit=limit, visible_only=visible_only)
+    return await asyncio.to_thread(message_cache.get_message_history, email, limit, visible_only)
+
+
+def load_user_history(email: str, limit: int):
+    """Cache loader: fetch one user's most recent messages from the database"""
+    db = next(get_db())
+    try:
+        messages = MessageQueries.get_user_recent_messages(db, email, limit=limit)
+    finally:
+        db.close()
+    # Turns still waiting in the write-behind journal aren't in the database yet
+    pending = turn_writer.pending_messages(email)
+    if pending:
+        loaded_ids = {msg["id"] for msg in messages}
+        messages = messages + [msg for msg in pending if str(msg.id) not in loaded_ids]
+    return messages
+
+
+def load_history_page(email: str, before, limit: int, visible_only: bool) -> List[CachedMessage]:
+    """Read one keyset page of a user's history from the database (oldest first)"""
+    db = next(get_db())
+    try:
+        messages = MessageQueries.get_user_messages_page(db, email, before=before, limit=limit, visible_only=visible_only)
+    finally:
+        db.close()
+    return [CachedMessage.from_dict(msg) for msg in messages]
+
+
+# Overlap with the snapshot watermark so late commits aren't missed (ids are de-duplicated)
+SNAPSHOT_CATCH_UP_OVERLAP = timedelta(seconds=5)
+
+
+def restore_cache_snapshot(path: str) -> bool:
+    """Load the cache snapshot, then catch up messages created after its watermark"""
+    if not os.path.exists(path):
+        print(f"No message cache snapshot at {path}, starting cold")
+        return False
+    
+    start = time.perf_counter()
+    try:
+        watermark = message_cache.load_snapshot(path)
+    except Exception as e:
+        print(f"Warning: Could not load message cache snapshot {path}: {e}")
+        return False
+    print(f"Loaded message cache snapshot in {time.perf_counter() - start:.3f}s (watermark {watermark})")
+    
+    if not watermark:
+        return True
+    db = next(get_db())
+    try:
+        since = datetime.fromisoformat(watermark) - SNAPSHOT_CATCH_UP_OVERLAP
+        caught_up = 0
+        for email, message in MessageQueries.iter_messages_since(db, since):
+            caught_up += message_cache.catch_up(email, [message])
+        print(f"Caught up {caught_up} messages newer than the snapshot")
+    except Exception as e:
+        print(f"Warning: Could not catch up messages since snapshot: {e}")
+    finally:
+        db.close()
+    return True
+
+
+def warm_up_message_cache(max_users: int, max_mb: float):
+    """Stream the last messages of the most recently active users into the cache"""
+    start = time.perf_counter()
+    db = next(get_db())
+    try:
+        # Only users active in the window are considered, so the scan doesn't grow with the table
+        active_since = datetime.now(timezone.utc) - timedelta(days=WARMUP_ACTIVE_DAYS) if WARMUP_ACTIVE_DAYS > 0 else None
+        users = MessageQueries.stream_recent_messages_per_user(
+            db, per_user=message_cache.hydration_limit, max_users=max_users, active_since=active_since
+        )
+        result = message_cache.warm_up(users, max_users=max_users, max_bytes=int(max_mb * 1024 * 1024))
+        print(
+            f"Warmed message cache in {time.perf_counter() - start:.2f}s: "
+            f"{result['users']} users, {result['messages']} messages, ~{result['bytes'] / 1024 / 1024:.1f} MB"
+        )
+    except Exception as e:
+        # Lazy hydration still covers every user
+        print(f"Warning: Could not warm up message cache: {e}")
+    finally:
+        db.close()
+
+
+def save_cache_snapshot(path: str):
+    """Write the message cache snapshot (no-op for backends that persist themselves)"""
+    if not message_cache.backend.supports_snapshots:
+        return
+    try:
+        result = message_cache.save_snapshot(path)
+        print(f"Saved message cache snapshot: {result['users']} users, {result['messages']} messages, {result['bytes']} bytes")
+    except Exception as e:
+        print(f"Warning: Could not save message cache snapshot {path}: {e}")
+
+
+async def snapshot_periodically(path: str, interval: float):
+    """Background task: rewrite the snapshot every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(save_cache_snapshot, path)
+
+
+def create_message_partitions(months_ahead: int):
+    """Make sure messages has a partition for this month and the next months_ahead"""
+    try:
+        with engine.connect() as connection:
+            created = ensure_future_partitions(connection, months_ahead)
+        if created:
+            print(f"Created {created} message partitions ({months_ahead} months ahead)")
+    except Exception as e:
+        # e.g. a database without 09-partition-messages.sql
+        print(f"Warning: Could not create message partitions: {e}")
+
+
+async def create_partitions_daily(months_ahead: int):
+    """Background task: keep future message partitions created while the app runs"""
+    while True:
+        await asyncio.sleep(24 * 60 * 60)
+        await asyncio.to_thread(create_message_partitions, months_ahead)
+
+
+def refresh_inventory_index(full: bool = False):
+    """Load the inventory index, or apply units changed since the last poll"""
+    start = time.perf_counter()
+    db = next(get_db())
+    try:
+        if full or not inventory_index.ready:
+            units = inventory_index.load(db)
+            print(f"Loaded inventory index in {time.perf_counter() - start:.2f}s: {units} units")
+        else:
+            inventory_index.refresh(db)
+    except Exception as e:
+        # Tools keep answering: from the last snapshot, or from SQL if it never loaded
+        print(f"Warning: inventory index refresh failed: {e}")
+    finally:
+        db.close()
+
+
+async def poll_inventory_periodically(interval: float, full_interval: float):
+    """Background task: poll for unit changes, with a periodic full reload to catch deletes"""
+    last_full = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        full = full_interval > 0 and time.monotonic() - last_full >= full_interval
+        if full:
+            last_full = time.monotonic()
+        await asyncio.to_thread(refresh_inventory_index, full)
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=False, workers=1)
+    
+    # More than one worker needs a shared cache: MESSAGE_CACHE_BACKEND=redis
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and message_cache.stats()["backend"] == "memory":
+        print("Warning: in-memory message cache is per process; set MESSAGE_CACHE_BACKEND=redis for multiple workers")
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=False, workers=workers)
@@ -13,8 +13,12 @@ class Agent:
       - injects a system prompt
       - declares tools exactly as provided
       - first pass: model may request tool(s)
-      - run tool(s), append outputs
+      - run tool(s), append outputs; each tool is called with the model's
+        arguments plus context= (a per-turn ToolContext, see tool_context.py)
       - second pass: final text
+    With single-pass on (AGENT_SINGLE_PASS=true) the first pass already
+    requests the structured BookingResponse, and the second pass only runs
+    when tools were called.
     """
     def __init__(self, client, system_prompt: str, tools_spec: List[Dict], tool_impls: Dict[str, Callable]):
         self.client = client
@@ -27,6 +31,9 @@ class Agent:
         self._temperature = 0.2      # Low randomness - safe for structured output
         self._max_output_tokens = 150  # Shorter responses = faster
         self._tool_choice = "auto"
+        self._single_pass = os.getenv("AGENT_SINGLE_PASS", "false").lower() == "true"
+        # Start the booking prompt while the router classifies (see speculation.py)
+        self._speculative_routing = os.getenv("AGENT_SPECULATIVE_ROUTING", "false").lower() == "true"
 
 
     def run(self, user_prompt, conversation_history: List[Dict[str, str]] = None, request_id: str = None) -> BookingResponse:
@@ -0,0 +1,234 @@
+# booking_agent/preclassifier.py
+"""
+Local pre-classifier in front of RouterPrompt.
+
+Most messages are plainly benign ("yes", "2 bedrooms", "do you allow cats")
+and the crude injections are plainly malicious ("ignore previous
+instructions", "DROP TABLE"). Both are decided here on the CPU, in
+microseconds, and only the ambiguous rest pays for the router's LLM call.
+
+- Rules: a compiled pattern set for the injections listed in RouterPrompt's
+  prompt, and a leasing vocabulary: a short message made only of known words,
+  numbers and unit codes is safe. Anything else is ambiguous.
+- Model (optional): a scikit-learn char-ngram pipeline trained from labeled
+  router decisions (scripts/train_preclassifier.py), consulted for messages the
+  rules leave ambiguous. Only probabilities outside [safe_below,
+  malicious_above] count as confident.
+
+A small share of confident decisions (shadow_rate) still goes to the LLM
+router, and the LLM's route is the one used; disagreements between the two are
+counted and logged so the rules and the model can be checked and retrained.
+"""
+
+import logging
+import os
+import pickle
+import random
+import re
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from counters import Counters
+from schemas import ConversationType
+
+logger = logging.getLogger(__name__)
+
+# Injection patterns from RouterPrompt's SECURITY CHECK list
+MALICIOUS_PATTERN = re.compile("|".join([
+    r"\b(ignore|disregard|forget)\s+(all\s+|any\s+|the\s+|your\s+|my\s+)*(previous|prior|above|earlier|original)\s+(instructions|prompts?|rules|messages)",
+    r"\byou\s+are\s+now\b",
+    r"(^|\n)\s*(system|assistant|developer)\s*:",
+    r"\b(system|initial|hidden|original)\s+prompt\b",
+    r"\b(reveal|show|print|repeat|dump|output)\b.{0,40}\b(your\s+instructions|configuration|config\s+files?|api\s+keys?|environment\s+variables)\b",
+    r"\bdrop\s+table\b",
+    r"\bselect\s+\*\s+from\b",
+    r"\bunion\s+(all\s+)?select\b",
+    r"\b(delete\s+from|insert\s+into)\b",
+    r"'\s*;\s*--",
+    r"\bjailbreak",
+    r"\bdeveloper\s+mode\b",
+    r"\bpretend\s+(to\s+be|you\s+are)\b",
+]), re.IGNORECASE)
+
+# Everyday leasing conversation; a message made only of these words is safe
+LEASING_VOCABULARY = frozenset("""
+    a about accept accepted after all allow allowed allows also am an and any anything apartment apartments apt apts are around as at available
+    availability b bath baths bathroom bathrooms bd be bed beds bedroom bedrooms before best big bird birds bring
+    budget but by can cat cats cheap cheaper cheapest community cost costs could date day days deposit
+    did do does dog dogs don't else even fee fees fine floor for from get go good great has have hello hey
+    hi how i i'd i'll i'm if in interested is it it's just large larger lease leases leasing like looking
+    lot many may maybe me month monthly months more most move moving much my need next nice no nope not now of ok
+    okay on one only or other parking perfect pet pets place please policy policies possible price prices
+    pricing question rabbit rabbits range rent rents schedule see show size small smaller smoking so some soon
+    special specials start studio sure tell thank thanks that that's the them then there these they this
+    those three time to today tomorrow tour tours two under unit units up us visit want was we week weekend
+    weeks what what's when where which will with within would yeah year yes yet you your
+    zero one two three four five six first second
+    january february march april may june july august september october november december
+    monday tuesday wednesday thursday friday saturday sunday
+    kitten kittens puppy puppies fish
+""".split())
+
+# Numbers, prices, unit codes (B201), bedroom shorthand (2br, 2bd, 2bed) and dates (3/1)
+SAFE_TOKEN_PATTERN = re.compile(r"^(\$?\d+(,\d{3})*(\.\d+)?k?|[a-z]\d{2,4}|\d+(br|bd|bed|ba)|\d{1,2}/\d{1,2}(/\d{2,4})?|\d+(st|nd|rd|th))$")
+SAFE_CHARACTERS = re.compile(r"^[a-z0-9\s.,!?$'/-]*$")
+TOKEN_PATTERN = re.compile(r"[^\s.,!?]+")
+
+MAX_SAFE_WORDS = 20
+
+
+class Preclassification(NamedTuple):
+    route: Optional[ConversationType]  # None = ambiguous, ask the LLM router
+    source: str                        # "rules", "model" or "none"
+    score: Optional[float] = None      # Model probability of MALICIOUS_QUERY, when the model was asked
+
+
+AMBIGUOUS = Preclassification(None, "none")
+
+
+class PreclassifierStats(Counters):
+    """How messages were decided, and how often the LLM router disagreed"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = 0
+        self.rules_safe = 0
+        self.rules_malicious = 0
+        self.model_safe = 0
+        self.model_malicious = 0
+        self.ambiguous = 0
+        self.shadow_checks = 0          # Confident decisions also sent to the LLM router
+        self.missed_malicious = 0       # Pre-classified safe, LLM said MALICIOUS_QUERY
+        self.false_malicious = 0        # Pre-classified malicious, LLM said BOOKING_INFO
+
+
+def rule_route(message: str) -> Optional[ConversationType]:
+    """Route decided by the rules alone, or None when they can't tell"""
+    if MALICIOUS_PATTERN.search(message):
+        return ConversationType.MALICIOUS_QUERY
+    text = message.strip().lower().replace("’", "'")
+    if not text or not SAFE_CHARACTERS.match(text):
+        return None
+    tokens = TOKEN_PATTERN.findall(text)
+    if len(tokens) > MAX_SAFE_WORDS:
+        return None
+    if all(token.strip("'-/") in LEASING_VOCABULARY or SAFE_TOKEN_PATTERN.match(token) for token in tokens):
+        return ConversationType.BOOKING_INFO
+    return None
+
+
+def load_model(path: str):
+    """Load a pickled scikit-learn pipeline (needs scikit-learn installed); None if it can't be loaded"""
+    try:
+        import sklearn  # noqa: F401 - unpickling the pipeline needs it
+    except ImportError:
+        print("Warning: PRECLASSIFIER_MODEL_PATH is set but scikit-learn is not installed; using rules only")
+        return None
+    try:
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+    except (OSError, pickle.UnpicklingError) as e:
+        print(f"Warning: Could not load pre-classifier model from {path}: {e}; using rules only")
+        return None
+    if ConversationType.MALICIOUS_QUERY.value not in list(model.classes_):
+        print(f"Warning: Pre-classifier model in {path} has no {ConversationType.MALICIOUS_QUERY.value} class; using rules only")
+        return None
+    return model
+
+
+class Preclassifier:
+    """Rules, then the optional model; counts decisions and LLM disagreements"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        model: Any = None,
+        safe_below: float = 0.05,
+        malicious_above: float = 0.95,
+        shadow_rate: float = 0.05,
+        random_fn: Callable[[], float] = random.random,
+    ):
+        self.enabled = enabled
+        self.model = model
+        self.safe_below = safe_below
+        self.malicious_above = malicious_above
+        self.shadow_rate = shadow_rate
+        self._random = random_fn
+        self.counters = PreclassifierStats()
+
+    def classify(self, message: str) -> Preclassification:
+        """Decide a message without counting it"""
+        if not self.enabled:
+            return AMBIGUOUS
+        route = rule_route(message)
+        if route is not None:
+            return Preclassification(route, "rules")
+        if self.model is None:
+            return AMBIGUOUS
+        classes = list(self.model.classes_)
+        score = float(self.model.predict_proba([message])[0][classes.index(ConversationType.MALICIOUS_QUERY.value)])
+        if score >= self.malicious_above:
+            return Preclassification(ConversationType.MALICIOUS_QUERY, "model", score)
+        if score <= self.safe_below:
+            return Preclassification(ConversationType.BOOKING_INFO, "model", score)
+        return Preclassification(None, "model", score)
+
+    def route(self, message: str) -> Preclassification:
+        """Classify and count a message; a None route means the LLM router decides"""
+        result = self.classify(message)
+        self.counters.incr("messages")
+        if result.route is None:
+            self.counters.incr("ambiguous")
+        else:
+            verdict = "malicious" if result.route == ConversationType.MALICIOUS_QUERY else "safe"
+            self.counters.incr(f"{result.source}_{verdict}")
+        return result
+
+    def should_shadow(self, result: Preclassification) -> bool:
+        """Whether to check this confident decision against the LLM router anyway"""
+        if result.route is None or self._random() >= self.shadow_rate:
+            return False
+        self.counters.incr("shadow_checks")
+        return True
+
+    def record_llm_route(self, message: str, result: Preclassification, llm_route: ConversationType):
+        """Compare a confident decision with the LLM router's"""
+        if result.route is None or result.route == llm_route:
+            return
+        if result.route == ConversationType.BOOKING_INFO:
+            self.counters.incr("missed_malicious")
+        else:
+            self.counters.incr("false_malicious")
+        logger.warning(f"⚖️ Pre-classifier ({result.source}) said {result.route.value}, LLM router said {llm_route.value}: {message!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self.counters.as_dict()
+        decided = counters["messages"] - counters["ambiguous"]
+        # Shadow checks still made the LLM call, so they don't count as skipped
+        skipped = decided - counters["shadow_checks"]
+        disagreements = counters["missed_malicious"] + counters["false_malicious"]
+        return {
+            "enabled": self.enabled,
+            "model_loaded": self.model is not None,
+            "safe_below": self.safe_below,
+            "malicious_above": self.malicious_above,
+            "shadow_rate": self.shadow_rate,
+            **counters,
+            "skip_rate": round(skipped / counters["messages"], 4) if counters["messages"] else None,
+            "disagreement_rate": round(disagreements / counters["shadow_checks"], 4) if counters["shadow_checks"] else None,
+        }
+
+
+def create_preclassifier_from_env() -> Preclassifier:
+    """Build the pre-classifier configured by PRECLASSIFIER_* environment variables"""
+    model_path = os.getenv("PRECLASSIFIER_MODEL_PATH")
+    return Preclassifier(
+        enabled=os.getenv("PRECLASSIFIER_ENABLED", "true").lower() == "true",
+        model=load_model(model_path) if model_path else None,
+        safe_below=float(os.getenv("PRECLASSIFIER_SAFE_BELOW", "0.05")),
+        malicious_above=float(os.getenv("PRECLASSIFIER_MALICIOUS_ABOVE", "0.95")),
+        shadow_rate=float(os.getenv("PRECLASSIFIER_SHADOW_RATE", "0.05")),
+    )
+
+
+# Global pre-classifier used by RouterPrompt
+preclassifier = create_preclassifier_from_env()
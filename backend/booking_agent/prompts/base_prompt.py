@@ -9,6 +9,9 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from schemas import BookingResponse
+from booking_agent.speculation import SpeculationCancelled
+from booking_agent.tool_context import ToolContext
+from booking_agent.tool_runner import tool_runner
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
@@ -21,6 +24,9 @@ class BasePrompt(ABC):
     Always returns structured output (BookingResponse).
     """
     
+    # Structured output schema; a BookingResponse subclass may add fields
+    response_format = BookingResponse
+    
     def __init__(self, prompt_text: str, requires_tools: bool = False, context: Optional[Dict] = None):
         """
         Initialize the prompt.
@@ -33,6 +39,9 @@ class BasePrompt(ABC):
         self.prompt_text = prompt_text
         self.requires_tools = requires_tools
         self.context = context or {}
+        self.llm_calls = 0  # LLM round trips made by the last execute()
+        self.tokens_used = 0
+        self.cancel_event = None  # Set by SpeculativeExecutor; stops a speculative run at the next checkpoint
     
     def execute(self, agent, msgs: List[Dict[str, str]], request_id: str = None) -> BookingResponse:
         """
@@ -64,14 +73,24 @@ class BasePrompt(ABC):
             api_params["tools"] = agent.tools_spec
             api_params["tool_choice"] = agent._tool_choice
         
+        # Single-pass mode: the first call already asks for the structured BookingResponse,
+        # so a turn that needs no tools (greetings, clarifications) ends after one call
+        single_pass = agent._single_pass
+        self._raise_if_cancelled(request_id)
+        self.llm_calls = 1
+        
         # First LLM call with timing
         llm1_start = time.perf_counter()
-        r1 = agent.client.chat.completions.create(**api_params)
+        if single_pass:
+            r1 = agent.client.beta.chat.completions.parse(**api_params, response_format=self.response_format)
+        else:
+            r1 = agent.client.chat.completions.create(**api_params)
         llm1_time = time.perf_counter() - llm1_start
         
         # Log token usage if available
         usage1 = getattr(r1, 'usage', None)
         if usage1:
+            self.tokens_used += usage1.total_tokens
             logger.info(f"🤖 [{request_id}] LLM1 | {llm1_time:.3f}s | tokens: {usage1.prompt_tokens}→{usage1.completion_tokens} (total: {usage1.total_tokens})")
         else:
             logger.info(f"🤖 [{request_id}] LLM1 | {llm1_time:.3f}s | tokens: unavailable")
@@ -79,7 +98,12 @@ class BasePrompt(ABC):
         # Handle tool calls if required
         tool_calls = r1.choices[0].message.tool_calls or []
         
+        if not tool_calls and single_pass and r1.choices[0].message.parsed is not None:
+            return self._complete(r1.choices[0].message.parsed, request_id, start_time)
+        
         if tool_calls:
+            self._raise_if_cancelled(request_id)
+            
             # First add the assistant's message with tool calls
             msgs.append({
                 "role": "assistant",
@@ -96,33 +120,41 @@ class BasePrompt(ABC):
                 ]
             })
             
-            # Then add tool responses
+            # Then add tool responses; the tools run concurrently (see tool_runner.py), each
+            # borrowing a session from one per-turn ToolContext that is released before the
+            # final LLM call
+            calls = []
             for call in tool_calls:
-                tool_start = time.perf_counter()
                 name = call.function.name
-                args = json.loads(call.function.arguments or "{}")
                 if name not in agent.tool_impls:
                     raise ValueError(f"Unknown function: {name}")
-                out = agent.tool_impls[name](**args)
-                tool_time = time.perf_counter() - tool_start
-                
-                # Log tool execution with response
-                logger.info(f"🔧 [{request_id}] {name} | {tool_time:.3f}s | args={args} | response={out}")
-                
-                # Add tool call result to messages
+                calls.append((name, agent.tool_impls[name], json.loads(call.function.arguments or "{}")))
+            with ToolContext(request_id=request_id) as tool_context:
+                outputs = tool_runner.run(calls, tool_context, request_id=request_id)
+            
+            # Add tool call results to messages, in tool_calls order
+            for call, (name, _, _), out in zip(tool_calls, calls, outputs):
                 msgs.append({
                     "role": "tool",
                     "tool_call_id": call.id,
                     "name": name,
                     "content": json.dumps(out),
                 })
+            
+            db_stats = tool_context.stats()
+            logger.info(
+                f"🗄️ [{request_id}] Tool DB | connections={db_stats['connections']} for {db_stats['tool_calls']} calls | "
+                f"checkout {db_stats['checkout_ms']:.1f}ms | release {db_stats['release_ms']:.1f}ms"
+            )
         
-        # Final API call with structured output (whether tools were used or not)
+        # Final API call with structured output (tools ran, or the two-pass mode is on)
+        self._raise_if_cancelled(request_id)
+        self.llm_calls += 1
         llm2_start = time.perf_counter()
         response = agent.client.beta.chat.completions.parse(
             model=agent._model,
             messages=msgs,
-            response_format=BookingResponse,
+            response_format=self.response_format,
             temperature=agent._temperature,
             max_tokens=agent._max_output_tokens
         )
@@ -131,14 +163,22 @@ class BasePrompt(ABC):
         # Log final LLM call
         usage2 = getattr(response, 'usage', None)
         if usage2:
+            self.tokens_used += usage2.total_tokens
             logger.info(f"🤖 [{request_id}] LLM2 | {llm2_time:.3f}s | tokens: {usage2.prompt_tokens}→{usage2.completion_tokens} (total: {usage2.total_tokens})")
         else:
             logger.info(f"🤖 [{request_id}] LLM2 | {llm2_time:.3f}s | tokens: unavailable")
         
-        result = response.choices[0].message.parsed
+        return self._complete(response.choices[0].message.parsed, request_id, start_time)
+    
+    def _raise_if_cancelled(self, request_id: str):
+        """Checkpoint for speculative runs the router has since rejected"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            logger.info(f"🛑 [{request_id}] {self.__class__.__name__} cancelled after {self.llm_calls} LLM calls")
+            raise SpeculationCancelled(request_id)
+    
+    def _complete(self, result: BookingResponse, request_id: str, start_time: float) -> BookingResponse:
         total_time = time.perf_counter() - start_time
-        
-        logger.info(f"✅ [{request_id}] Complete | {total_time:.3f}s | action={result.action}")
+        logger.info(f"✅ [{request_id}] Complete | {total_time:.3f}s | calls={self.llm_calls} | action={result.action}")
         return result
 
 
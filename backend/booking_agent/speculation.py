@@ -0,0 +1,104 @@
+# booking_agent/speculation.py
+"""
+Speculative booking execution.
+
+Nearly every message the LLM router classifies comes back BOOKING_INFO, so
+with AGENT_SPECULATIVE_ROUTING=true RouterPrompt starts the BookingInfoPrompt
+on a worker thread while its own classification call is in flight, and a turn
+costs max(router, booking) instead of their sum.
+
+The speculative prompt works on its own copy of the messages, without the
+classification exchange. If the router says BOOKING_INFO its result is used
+as is. If it says MALICIOUS_QUERY the speculation is discarded: a prompt that
+hasn't started is cancelled, and a running one stops at its next checkpoint
+(before its tool calls, before its final LLM call) by raising
+SpeculationCancelled. Tokens and LLM calls spent on discarded work are counted.
+"""
+
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from counters import Counters
+
+
+class SpeculationCancelled(Exception):
+    """Raised inside a speculative prompt once the router has rejected it"""
+
+
+class SpeculationStats(Counters):
+    """Speculative runs and what the discarded ones cost"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = 0
+        self.committed = 0          # Router said BOOKING_INFO; the speculative answer was used
+        self.discarded = 0          # Router said MALICIOUS_QUERY (or failed)
+        self.cancelled_early = 0    # Discarded runs stopped before finishing
+        self.wasted_llm_calls = 0
+        self.wasted_tokens = 0
+
+
+class SpeculativeExecutor:
+    """Runs speculative prompts on a bounded thread pool"""
+
+    def __init__(self, max_workers: int = 32):
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.counters = SpeculationStats()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Created on first use so processes that never speculate start no threads
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="speculative-booking")
+            return self._pool
+
+    def start(self, prompt, agent, msgs: List[Dict[str, str]], request_id: Optional[str] = None) -> Future:
+        """Start prompt.execute on a copy of msgs; the prompt can be stopped through its cancel_event"""
+        prompt.cancel_event = threading.Event()
+        self.counters.incr("started")
+        return self._executor().submit(prompt.execute, agent, list(msgs), request_id=request_id)
+
+    def commit(self, future: Future) -> Any:
+        """Wait for and use the speculative result"""
+        self.counters.incr("committed")
+        return future.result()
+
+    def discard(self, future: Future, prompt):
+        """Stop the speculative prompt and count what it cost once it has stopped"""
+        prompt.cancel_event.set()
+        self.counters.incr("discarded")
+        if future.cancel():
+            return  # Never started: nothing was spent
+        future.add_done_callback(lambda done: self._record_waste(done, prompt))
+
+    def _record_waste(self, future: Future, prompt):
+        try:
+            stopped_early = isinstance(future.exception(), SpeculationCancelled)
+        except CancelledError:
+            stopped_early = True
+        self.counters.incr("wasted_llm_calls", prompt.llm_calls)
+        self.counters.incr("wasted_tokens", prompt.tokens_used)
+        if stopped_early:
+            self.counters.incr("cancelled_early")
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self.counters.as_dict()
+        return {
+            "max_workers": self.max_workers,
+            **counters,
+            "commit_rate": round(counters["committed"] / counters["started"], 4) if counters["started"] else None,
+        }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# Global executor used by RouterPrompt
+speculative_executor = SpeculativeExecutor(max_workers=int(os.getenv("AGENT_SPECULATION_MAX_WORKERS", "32")))
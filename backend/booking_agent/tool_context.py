@@ -0,0 +1,111 @@
+# booking_agent/tool_context.py
+"""
+Per-turn tool execution context.
+
+BasePrompt.execute opens one ToolContext around a turn's tool calls and passes
+it to every tool as `context`. Tools borrow a database session from it instead
+of opening their own, so a turn that runs three tools checks out one pooled
+connection instead of three (and pays one connection reset instead of three).
+
+Sessions run on AUTOCOMMIT connections: tools only read, so there is no
+transaction to open or roll back, and a failed query in one tool can't leave
+the shared connection in an aborted transaction for the next. Tools running in
+parallel each get their own session; idle ones are reused, so the context is a
+small per-turn pool. Everything is released when the context closes, before the
+final LLM call.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+
+class ToolContext:
+    """Resources shared by the tool calls of one turn"""
+
+    def __init__(self, request_id: Optional[str] = None, engine=None):
+        if engine is None:
+            from globals.database import engine
+        self.request_id = request_id
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[Any, Session]] = []
+        self._opened: List[Tuple[Any, Session]] = []
+        self._closed = False
+        self.tool_calls = 0
+        self.connections = 0
+        self.checkout_seconds = 0.0
+        self.release_seconds = 0.0
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """Borrow a session for one tool call"""
+        with self._lock:
+            self.tool_calls += 1
+            pair = self._idle.pop() if self._idle else None
+        if pair is None:
+            pair = self._open()
+        try:
+            yield pair[1]
+        finally:
+            with self._lock:
+                # A tool that outlived its timeout returns its session after close()
+                late = self._closed
+                if late:
+                    self._opened.remove(pair)
+                else:
+                    self._idle.append(pair)
+            if late:
+                self._release([pair])
+
+    def _open(self) -> Tuple[Any, Session]:
+        start = time.perf_counter()
+        connection = self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        pair = (connection, Session(bind=connection))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._opened.append(pair)
+            self.connections += 1
+            self.checkout_seconds += elapsed
+        return pair
+
+    def close(self):
+        """
+        Close every idle session and return its connection to the engine pool.
+        Sessions still borrowed by a timed-out tool are closed when it gives them back.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._closed = True
+            idle = self._idle
+            idle_ids = {id(pair) for pair in idle}
+            self._opened = [pair for pair in self._opened if id(pair) not in idle_ids]
+            self._idle = []
+        self._release(idle)
+        self.release_seconds += time.perf_counter() - start
+
+    @staticmethod
+    def _release(pairs: List[Tuple[Any, Session]]):
+        for connection, session in pairs:
+            try:
+                session.close()
+            finally:
+                connection.close()
+
+    def __enter__(self) -> "ToolContext":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-turn DB overhead: connections used and time spent checking out / releasing them"""
+        return {
+            "tool_calls": self.tool_calls,
+            "connections": self.connections,
+            "checkout_ms": round(self.checkout_seconds * 1000, 3),
+            "release_ms": round(self.release_seconds * 1000, 3),
+        }
@@ -0,0 +1,160 @@
+# booking_agent/tool_runner.py
+"""
+Concurrent tool execution.
+
+When the model asks for several tools in one turn (pet policy plus pricing,
+say), BasePrompt.execute hands them to ToolRunner, which runs them at the
+same time on a shared, bounded thread pool:
+
+- at most max_per_request calls of one turn run at once (TOOL_MAX_CONCURRENCY)
+- each call has its own timeout (TOOL_TIMEOUT_SECONDS, per-tool overrides in
+  TOOL_TIMEOUTS, e.g. "search_units=15,check_pet_policy=5"); a call that runs
+  over gets an error result and the turn carries on without it
+- results come back in the order of the model's tool_calls, so the tool
+  messages line up with their tool_call_ids
+
+Tools borrow DB sessions from the turn's ToolContext, which hands each
+concurrent call its own session.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from counters import Counters
+
+logger = logging.getLogger(__name__)
+
+# (tool name, implementation, arguments from the model)
+ToolCall = Tuple[str, Callable[..., Any], Dict[str, Any]]
+
+
+class ToolRunnerStats(Counters):
+    """Tool batches, timeouts and the time saved by running calls side by side"""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = 0
+        self.calls = 0
+        self.parallel_batches = 0   # Batches with more than one call
+        self.timeouts = 0
+        self.tool_ms = 0            # Sum of individual call durations
+        self.wall_ms = 0            # Time the batches actually took
+
+
+def parse_timeouts(value: Optional[str]) -> Dict[str, float]:
+    """'search_units=15,check_pet_policy=5' -> {'search_units': 15.0, 'check_pet_policy': 5.0}"""
+    timeouts = {}
+    for item in (value or "").split(","):
+        if item.strip():
+            name, seconds = item.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class ToolRunner:
+    """Runs one turn's tool calls concurrently on a process-wide pool"""
+
+    def __init__(
+        self,
+        max_workers: int = 32,
+        max_per_request: int = 4,
+        timeout_seconds: float = 10.0,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.max_workers = max_workers
+        self.max_per_request = max(1, max_per_request)
+        self.timeout_seconds = timeout_seconds
+        self.timeouts = timeouts or {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.counters = ToolRunnerStats()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-call")
+            return self._pool
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.timeout_seconds)
+
+    def run(self, calls: List[ToolCall], context, request_id: Optional[str] = None) -> List[Any]:
+        """Run every call with context=context; outputs are returned in the order of calls"""
+        start = time.perf_counter()
+        outputs: List[Any] = [None] * len(calls)
+        queued = deque(range(len(calls)))
+        running: Dict[Future, Tuple[int, float]] = {}  # future -> (index, deadline)
+        durations: List[float] = []
+
+        while queued or running:
+            while queued and len(running) < self.max_per_request:
+                index = queued.popleft()
+                name, fn, args = calls[index]
+                future = self._executor().submit(self._call, name, fn, args, context, request_id, durations)
+                running[future] = (index, time.perf_counter() + self.timeout_for(name))
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            done, _ = wait(running, timeout=max(next_deadline - time.perf_counter(), 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, _ = running.pop(future)
+                outputs[index] = future.result()
+
+            now = time.perf_counter()
+            for future, (index, deadline) in list(running.items()):
+                if deadline <= now:
+                    # The call may still finish in the background; its result is dropped
+                    del running[future]
+                    future.cancel()
+                    name = calls[index][0]
+                    timeout = self.timeout_for(name)
+                    outputs[index] = {"success": False, "error": f"{name} timed out after {timeout:g}s"}
+                    self.counters.incr("timeouts")
+                    logger.warning(f"⏱️ [{request_id}] {name} | timed out after {timeout:g}s | args={calls[index][2]}")
+
+        self.counters.incr("batches")
+        self.counters.incr("calls", len(calls))
+        if len(calls) > 1:
+            self.counters.incr("parallel_batches")
+        self.counters.incr("tool_ms", int(sum(durations) * 1000))
+        self.counters.incr("wall_ms", int((time.perf_counter() - start) * 1000))
+        return outputs
+
+    @staticmethod
+    def _call(name: str, fn: Callable[..., Any], args: Dict[str, Any], context, request_id: Optional[str], durations: List[float]) -> Any:
+        tool_start = time.perf_counter()
+        out = fn(**args, context=context)
+        tool_time = time.perf_counter() - tool_start
+        durations.append(tool_time)
+
+        # Log tool execution with response
+        logger.info(f"🔧 [{request_id}] {name} | {tool_time:.3f}s | args={args} | response={out}")
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_per_request": self.max_per_request,
+            "timeout_seconds": self.timeout_seconds,
+            "timeouts_by_tool": self.timeouts,
+            **self.counters.as_dict(),
+        }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# Global runner used by BasePrompt
+tool_runner = ToolRunner(
+    max_workers=int(os.getenv("TOOL_POOL_WORKERS", "32")),
+    max_per_request=int(os.getenv("TOOL_MAX_CONCURRENCY", "4")),
+    timeout_seconds=float(os.getenv("TOOL_TIMEOUT_SECONDS", "10")),
+    timeouts=parse_timeouts(os.getenv("TOOL_TIMEOUTS")),
+)
@@ -4,50 +4,71 @@ Simple tools for the booking agent.
 All tools in one file - clean and simple.
 """
 
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+from sqlalchemy.orm import Session
 from globals.database import get_db
+from cache import PetPolicy, policy_cache
+from leasing_queries import inventory_index
+from .tool_context import ToolContext
 from leasing_queries.unit_availability import get_available_units as db_get_available_units
 from leasing_queries.pet_policy import get_pet_policy as db_get_pet_policy
 from leasing_queries.pricing import get_pricing as db_get_pricing
+from leasing_queries.unit_search import search_units as db_search_units
 
 
-def check_availability(community_id: str, bedrooms: int) -> Dict[str, Any]:
+@contextmanager
+def tool_session(context: Optional[ToolContext] = None) -> Iterator[Session]:
+    """The turn's shared session when run by the agent, otherwise a private one"""
+    if context is not None:
+        with context.session() as db:
+            yield db
+        return
+    db = next(get_db())
+    try:
+        yield db
+    finally:
+        db.close()  # Always close, even if exception occurs
+
+
+def check_availability(community_id: str, bedrooms: int, *, context: Optional[ToolContext] = None) -> Dict[str, Any]:
     """Check availability for a community matching bedroom count and move-in date."""
     try:
-        db = next(get_db())
-        try:
-            units = db_get_available_units(
-                db=db, 
-                community_id=community_id, 
-                bedrooms=bedrooms, 
-            )
-            
-            if units is None:
-                return {
-                    "success": False,
-                    "error": "Database error occurred",
-                    "units": []
-                }
-            
-            # Return only unit codes and availability status - NO PRICING OR DATES
-            availability_units = []
-            for unit in units:
-                availability_units.append({
-                    "unit_code": unit.get("unit_code"),
-                    "bedrooms": unit.get("bedrooms"),
-                    "bathrooms": unit.get("bathrooms"),
-                    "availability_status": unit.get("availability_status")
-                    # Removed available_at to prevent model from mentioning dates
-                })
-            
+        # Once the inventory index is loaded the lookup is served from memory, without a session
+        if inventory_index.ready:
+            units = inventory_index.available_units(community_id, bedrooms)
+        else:
+            with tool_session(context) as db:
+                units = db_get_available_units(
+                    db=db, 
+                    community_id=community_id, 
+                    bedrooms=bedrooms, 
+                )
+        
+        if units is None:
             return {
-                "success": True,
-                "units": availability_units,
-                "count": len(units)
+                "success": False,
+                "error": "Database error occurred",
+                "units": []
             }
-        finally:
-            db.close()  # Always close, even if exception occurs
-            
+        
+        # Return only unit codes and availability status - NO PRICING OR DATES
+        availability_units = []
+        for unit in units:
+            availability_units.append({
+                "unit_code": unit.get("unit_code"),
+                "bedrooms": unit.get("bedrooms"),
+                "bathrooms": unit.get("bathrooms"),
+                "availability_status": unit.get("availability_status")
+                # Removed available_at to prevent model from mentioning dates
+            })
+        
+        return {
+            "success": True,
+            "units": availability_units,
+            "count": len(units)
+        }
+        
     except Exception as e:
         return {
             "success": False,
@@ -56,38 +77,38 @@ def check_availability(community_id: str, bedrooms: int) -> Dict[str, Any]:
         }
 
 
-def get_pricing(community_id: str, unit_id: str, move_in_date: str = None) -> Dict[str, Any]:
+def get_pricing(community_id: str, unit_id: str, move_in_date: str = None, *, context: Optional[ToolContext] = None) -> Dict[str, Any]:
     """Get pricing information for a specific unit."""
     try:
-        db = next(get_db())
-        try:
-            pricing = db_get_pricing(
-                db=db, 
-                community_id=community_id, 
-                unit_id=unit_id, 
-                move_in_date=move_in_date
-            )
-            
-            if pricing is None:
-                return {
-                    "success": False,
-                    "error": f"Unit '{unit_id}' not found in community '{community_id}'"
-                }
-            
+        if inventory_index.ready:
+            pricing = inventory_index.unit(community_id, unit_id)
+        else:
+            with tool_session(context) as db:
+                pricing = db_get_pricing(
+                    db=db, 
+                    community_id=community_id, 
+                    unit_id=unit_id, 
+                    move_in_date=move_in_date
+                )
+        
+        if pricing is None:
             return {
-                "success": True,
-                "unit_code": pricing.get('unit_code'),
-                "rent": pricing.get('rent'),
-                "specials": pricing.get('specials'),
-                "bedrooms": pricing.get('bedrooms'),
-                "bathrooms": pricing.get('bathrooms'),
-                "availability_status": pricing.get('availability_status'),
-                "available_at": pricing.get('available_at'),
-                "community_name": pricing.get('community_name')
+                "success": False,
+                "error": f"Unit '{unit_id}' not found in community '{community_id}'"
             }
-        finally:
-            db.close()  # Always close, even if exception occurs
-            
+        
+        return {
+            "success": True,
+            "unit_code": pricing.get('unit_code'),
+            "rent": pricing.get('rent'),
+            "specials": pricing.get('specials'),
+            "bedrooms": pricing.get('bedrooms'),
+            "bathrooms": pricing.get('bathrooms'),
+            "availability_status": pricing.get('availability_status'),
+            "available_at": pricing.get('available_at'),
+            "community_name": pricing.get('community_name')
+        }
+        
     except Exception as e:
         return {
             "success": False,
@@ -96,44 +117,104 @@ def get_pricing(community_id: str, unit_id: str, move_in_date: str = None) -> Di
 
 
 
-def check_pet_policy(community_id: str, pet_type: str) -> Dict[str, Any]:
-    """Check pet policy for a specific pet type in a community."""
+def search_units(
+    community_id: str,
+    bedrooms: Optional[int] = None,
+    unit_codes: Optional[List[str]] = None,
+    min_rent: Optional[float] = None,
+    max_rent: Optional[float] = None,
+    min_bathrooms: Optional[float] = None,
+    move_in_date: Optional[str] = None,
+    *,
+    context: Optional[ToolContext] = None
+) -> Dict[str, Any]:
+    """Search units with rent, specials and availability dates in one call."""
     try:
-        db = next(get_db())
-        try:
-            policy = db_get_pet_policy(db=db, community_id=community_id)
-            
-            if policy is None:
-                return {
-                    "success": False,
-                    "error": "No pet policy found for this community"
-                }
-            
-            # Get pet policy rules and look for the pet type
-            pet_policy_rules = policy.get('pet_policy', {})
-            pet_info = pet_policy_rules.get(pet_type.lower())
-            
-            if pet_info:
-                return {
-                    "success": True,
-                    "pet_type": pet_type,
-                    "allowed": pet_info.get('allowed', False),
-                    "fee": pet_info.get('fee'),
-                    "deposit": pet_info.get('deposit'),
-                    "notes": pet_info.get('notes'),
-                    "restrictions": pet_info.get('restrictions')
-                }
-            else:
-                # Check for default policy
-                default_policy = pet_policy_rules.get('default', {})
-                return {
-                    "success": True,
-                    "pet_type": pet_type,
-                    "allowed": default_policy.get('allowed', False),
-                    "notes": default_policy.get('notes', f"No specific policy for {pet_type}. Contact office for details.")
+        filters = dict(bedrooms=bedrooms, unit_codes=unit_codes, min_rent=min_rent, max_rent=max_rent,
+                       min_bathrooms=min_bathrooms, move_in_date=move_in_date)
+        if inventory_index.ready:
+            units = inventory_index.search(community_id, **filters)
+        else:
+            with tool_session(context) as db:
+                units = db_search_units(db=db, community_id=community_id, **filters)
+        
+        if units is None:
+            return {
+                "success": False,
+                "error": "Database error occurred",
+                "units": []
+            }
+        
+        result = {
+            "success": True,
+            "units": [
+                {
+                    "unit_code": unit.get("unit_code"),
+                    "bedrooms": unit.get("bedrooms"),
+                    "bathrooms": unit.get("bathrooms"),
+                    "rent": unit.get("rent"),
+                    "specials": unit.get("specials"),
+                    "availability_status": unit.get("availability_status"),
+                    "available_at": unit.get("available_at")
                 }
-        finally:
-            db.close()  # Always close, even if exception occurs
+                for unit in units
+            ],
+            "count": len(units)
+        }
+        if unit_codes:
+            found = {unit.get("unit_code") for unit in units}
+            result["not_found"] = [code for code in unit_codes if code not in found]
+        return result
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Error searching units: {str(e)}",
+            "units": []
+        }
+
+
+def check_pet_policy(community_id: str, pet_type: str, *, context: Optional[ToolContext] = None) -> Dict[str, Any]:
+    """Check pet policy for a specific pet type in a community."""
+    try:
+        # Communities asked about recently are answered from the policy cache, without a session
+        cached = policy_cache.peek(community_id)
+        if cached is not None:
+            pet_policy = cached.pet
+        else:
+            with tool_session(context) as db:
+                policy = db_get_pet_policy(db=db, community_id=community_id)
+            pet_policy = PetPolicy(policy.get('pet_policy', {})) if policy is not None else None
+        
+        if pet_policy is None:
+            return {
+                "success": False,
+                "error": "No pet policy found for this community"
+            }
+        
+        # Look for the pet type, by its canonical name ("kittens" -> "cat")
+        pet_info, canonical = pet_policy.lookup(pet_type)
+        policy_cache.record_pet_lookup(pet_type, canonical, matched=pet_info is not None)
+        
+        if pet_info:
+            return {
+                "success": True,
+                "pet_type": pet_type,
+                "allowed": pet_info.get('allowed', False),
+                "fee": pet_info.get('fee'),
+                "deposit": pet_info.get('deposit'),
+                "notes": pet_info.get('notes'),
+                "restrictions": pet_info.get('restrictions')
+            }
+        else:
+            # Check for default policy
+            default_policy = pet_policy.default or {}
+            return {
+                "success": True,
+                "pet_type": pet_type,
+                "allowed": default_policy.get('allowed', False),
+                "notes": default_policy.get('notes', f"No specific policy for {pet_type}. Contact office for details.")
+            }
             
     except Exception as e:
         return {
@@ -194,6 +275,50 @@ TOOLS_SPEC = [
             "strict": True,
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_units",
+            "description": "Search units with rent, specials and availability dates in one call. Use this for pricing questions about several units or a price range (e.g. '2 bedrooms under $2000', 'how much are B201 and B202'). Pass null for filters the user did not give.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "community_id": {
+                        "type": "string",
+                        "description": "Community identifier (e.g., 'sunset-ridge', 'downtown-lofts')"
+                    },
+                    "bedrooms": {
+                        "type": ["integer", "null"],
+                        "description": "Number of bedrooms, or null for any"
+                    },
+                    "unit_codes": {
+                        "type": ["array", "null"],
+                        "items": {"type": "string"},
+                        "description": "Specific unit codes (e.g., ['B201', 'B202']), or null to search all listed units"
+                    },
+                    "min_rent": {
+                        "type": ["number", "null"],
+                        "description": "Minimum monthly rent, or null"
+                    },
+                    "max_rent": {
+                        "type": ["number", "null"],
+                        "description": "Maximum monthly rent, or null"
+                    },
+                    "min_bathrooms": {
+                        "type": ["number", "null"],
+                        "description": "Minimum number of bathrooms, or null"
+                    },
+                    "move_in_date": {
+                        "type": ["string", "null"],
+                        "description": "Optional move-in date in YYYY-MM-DD format; includes units on notice that free up by then"
+                    }
+                },
+                "required": ["community_id", "bedrooms", "unit_codes", "min_rent", "max_rent", "min_bathrooms", "move_in_date"],
+                "additionalProperties": False,
+            },
+            "strict": True,
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -223,5 +348,6 @@ TOOLS_SPEC = [
 TOOL_IMPLS = {
     "check_availability": check_availability,
     "get_pricing": get_pricing,
+    "search_units": search_units,
     "check_pet_policy": check_pet_policy,
 }
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Message Cache Module
+
+Per-user conversation history cache used by the API.
+The storage backend is chosen through the environment:
+- MESSAGE_CACHE_BACKEND=memory (default): per-process, single worker only
+- MESSAGE_CACHE_BACKEND=redis: shared through REDIS_URL, safe for many workers
+
+user_cache is a small per-process TTL cache of user rows (USER_CACHE_*).
+policy_cache holds each community's policies, pet rules pre-normalized (POLICY_CACHE_*).
+"""
+
+import os
+
+from .backends import CacheBackend, CacheStats, InMemoryBackend, RedisBackend
+from .policies import CommunityPolicies, PetPolicy, PolicyCache, normalize_pet_type
+from .records import CachedMessage
+from .user_cache import HistoryLoader, UserMessageCache
+from .users import CachedUser, UserDirectoryCache
+
+
+def _env_number(name: str, cast=int):
+    """Read an optional numeric limit from the environment"""
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+
+def create_backend_from_env() -> CacheBackend:
+    """Build the cache backend configured by MESSAGE_CACHE_* environment variables"""
+    backend = os.getenv("MESSAGE_CACHE_BACKEND", "memory").lower()
+    max_messages_per_user = _env_number("MESSAGE_CACHE_MAX_PER_USER")
+    ttl_seconds = _env_number("MESSAGE_CACHE_TTL_SECONDS", float)
+
+    if backend == "redis":
+        return RedisBackend(
+            url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            prefix=os.getenv("MESSAGE_CACHE_REDIS_PREFIX", "chat"),
+            max_messages_per_user=max_messages_per_user,
+            ttl_seconds=ttl_seconds,
+        )
+    if backend == "memory":
+        return InMemoryBackend(
+            max_messages_per_user=max_messages_per_user,
+            max_users=_env_number("MESSAGE_CACHE_MAX_USERS"),
+            max_total_messages=_env_number("MESSAGE_CACHE_MAX_MESSAGES"),
+            ttl_seconds=ttl_seconds,
+            shards=_env_number("MESSAGE_CACHE_SHARDS") or 16,
+        )
+    raise ValueError(f"Unknown MESSAGE_CACHE_BACKEND: {backend!r} (expected 'memory' or 'redis')")
+
+
+# Global cache instance
+message_cache = UserMessageCache(
+    backend=create_backend_from_env(),
+    hydration_limit=_env_number("MESSAGE_CACHE_HYDRATE_LIMIT") or 100,
+)
+
+# Global email -> user row cache
+user_cache = UserDirectoryCache(
+    ttl_seconds=float(os.getenv("USER_CACHE_TTL_SECONDS", "300")),  # 0 disables it
+    max_users=_env_number("USER_CACHE_MAX_USERS") or 50000,
+)
+
+# Global community_id -> policies cache
+policy_cache = PolicyCache(
+    ttl_seconds=float(os.getenv("POLICY_CACHE_TTL_SECONDS", "300")),  # 0 disables it
+    max_communities=_env_number("POLICY_CACHE_MAX_COMMUNITIES") or 10000,
+)
+
+__all__ = [
+    'CacheBackend',
+    'CacheStats',
+    'CachedMessage',
+    'CachedUser',
+    'CommunityPolicies',
+    'HistoryLoader',
+    'InMemoryBackend',
+    'PetPolicy',
+    'PolicyCache',
+    'RedisBackend',
+    'UserDirectoryCache',
+    'UserMessageCache',
+    'create_backend_from_env',
+    'message_cache',
+    'normalize_pet_type',
+    'policy_cache',
+    'user_cache',
+]
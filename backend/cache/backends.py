@@ -0,0 +1,491 @@
+"""
+Message Cache Backends
+
+Storage behind UserMessageCache. Every backend stores CachedMessage records
+and keeps two per-user views (all messages and visible-only messages) so
+history reads cost O(limit).
+
+- InMemoryBackend: per-process dicts/deques with LRU eviction, sharded locks (single worker)
+- RedisBackend: Redis lists shared by every worker and node
+"""
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import List, Dict, Optional, Any, Tuple
+
+from counters import Counters
+
+from .records import CachedMessage
+
+
+class CacheStats(Counters):
+    """Runtime counters for the message cache, safe to bump from any thread"""
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0     # Whole users dropped by the LRU / entry budget
+        self.expirations = 0   # Whole users dropped because their TTL ran out
+        self.trimmed = 0       # Oldest messages pushed out of a full per-user ring buffer
+
+
+class CacheBackend(ABC):
+    """Storage interface used by UserMessageCache"""
+
+    # Whether dump() works, i.e. UserMessageCache.save_snapshot can be used
+    supports_snapshots = False
+
+    def __init__(
+        self,
+        max_messages_per_user: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.max_messages_per_user = max_messages_per_user
+        self.ttl_seconds = ttl_seconds
+        self.counters = CacheStats()
+
+    @abstractmethod
+    def append(self, email: str, messages: List[CachedMessage]):
+        """Append messages to a user's history, creating the user if needed"""
+
+    @abstractmethod
+    def replace(self, email: str, messages: List[CachedMessage]):
+        """Replace a user's history with messages loaded from the database"""
+
+    @abstractmethod
+    def history(self, email: str, limit: int, visible_only: bool) -> Optional[List[CachedMessage]]:
+        """Get the last limit messages (oldest first), or None if the user isn't cached"""
+
+    @abstractmethod
+    def is_loaded(self, email: str) -> bool:
+        """Check if a user's history has been loaded from the database"""
+
+    @abstractmethod
+    def clear(self, email: str):
+        """Drop a user's messages and mark them as not loaded"""
+
+    @abstractmethod
+    def clear_all(self):
+        """Drop every user"""
+
+    @abstractmethod
+    def size(self, email: str) -> int:
+        """Get the number of cached messages for a user"""
+
+    @abstractmethod
+    def users(self) -> List[str]:
+        """Get the emails that currently have cached data"""
+
+    def merge(self, email: str, messages: List[CachedMessage]):
+        """
+        Replace a user's history with messages loaded from the database, keeping
+        cached messages they don't include (appended while the load ran).
+        Read-then-replace: fine under UserMessageCache's per-user lock, but
+        backends shared between processes must override it with an atomic version.
+        """
+        cached = self.history(email, limit=self.size(email), visible_only=False) or []
+        loaded_ids = {msg.id for msg in messages}
+        self.replace(email, messages + [msg for msg in cached if msg.id not in loaded_ids])
+
+    def append_new(self, email: str, messages: List[CachedMessage]) -> int:
+        """Append the messages whose ids aren't cached yet; returns how many were appended"""
+        cached = self.history(email, limit=self.size(email), visible_only=False) or []
+        cached_ids = {msg.id for msg in cached}
+        new_messages = [msg for msg in messages if msg.id not in cached_ids]
+        if new_messages:
+            self.append(email, new_messages)
+        return len(new_messages)
+
+    def dump(self) -> List[Tuple[str, bool, List[CachedMessage]]]:
+        """Copy out every user as (email, loaded, messages) for a snapshot (see supports_snapshots)"""
+        raise NotImplementedError(f"{self.__class__.__name__} does not support snapshots")
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend counters and occupancy"""
+        return {
+            **self.counters.as_dict(),
+            "max_messages_per_user": self.max_messages_per_user,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class _MemoryShard:
+    """One lock-protected slice of the in-memory users, with its own LRU order and budget"""
+
+    __slots__ = ("lock", "user_caches", "total_messages")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Structure: {email: {"messages": deque, "visible": deque, "loaded": bool, "last_access": float}}
+        # "visible" is a second view holding only visible_to_user messages, kept in step with "messages"
+        self.user_caches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.total_messages = 0
+
+
+class InMemoryBackend(CacheBackend):
+    """
+    Per-process storage.
+
+    Each user is a ring buffer (deque with maxlen) plus a visible-only view.
+    Users are kept in an OrderedDict from least to most recently used so that
+    the least recently used can be evicted in O(1) when over budget.
+
+    Users are hashed by email onto `shards` independent shards, each with its
+    own lock, LRU order and an equal share of the max_users / max_total_messages
+    budget. Every operation locks exactly one shard, so threads working on
+    users in different shards never wait for each other. With shards=1 (the
+    default) LRU eviction is exact; with more shards it is per shard.
+    """
+
+    supports_snapshots = True
+
+    def __init__(
+        self,
+        max_messages_per_user: Optional[int] = None,
+        max_users: Optional[int] = None,
+        max_total_messages: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        shards: int = 1,
+    ):
+        super().__init__(max_messages_per_user=max_messages_per_user, ttl_seconds=ttl_seconds)
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.max_users = max_users
+        self.max_total_messages = max_total_messages
+        self._shards = [_MemoryShard() for _ in range(shards)]
+
+        # Each shard enforces its share of the global budget
+        self._shard_max_users = -(-max_users // shards) if max_users is not None else None
+        self._shard_max_messages = -(-max_total_messages // shards) if max_total_messages is not None else None
+
+    def _shard(self, email: str) -> _MemoryShard:
+        return self._shards[hash(email) % len(self._shards)]
+
+    def _is_expired(self, user_cache: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds is not None and now - user_cache["last_access"] > self.ttl_seconds
+
+    def _drop_user(self, shard: _MemoryShard, email: str):
+        """Remove a user's cache entirely and release its budget"""
+        user_cache = shard.user_caches.pop(email)
+        shard.total_messages -= len(user_cache["messages"])
+
+    def _lookup(self, shard: _MemoryShard, email: str) -> Optional[Dict[str, Any]]:
+        """Get a user's cache without creating it, expiring it if its TTL ran out"""
+        user_cache = shard.user_caches.get(email)
+        if user_cache is None:
+            return None
+
+        now = time.monotonic()
+        if self._is_expired(user_cache, now):
+            self._drop_user(shard, email)
+            self.counters.incr("expirations")
+            return None
+
+        # Mark as most recently used
+        user_cache["last_access"] = now
+        shard.user_caches.move_to_end(email)
+        return user_cache
+
+    def _get_user_cache(self, shard: _MemoryShard, email: str) -> Dict[str, Any]:
+        """Get or create cache for a specific user"""
+        user_cache = self._lookup(shard, email)
+        if user_cache is None:
+            user_cache = {
+                "messages": deque(maxlen=self.max_messages_per_user),
+                "visible": deque(maxlen=self.max_messages_per_user),
+                "loaded": False,
+                "last_access": time.monotonic(),
+            }
+            shard.user_caches[email] = user_cache
+        return user_cache
+
+    def _over_budget(self, shard: _MemoryShard) -> bool:
+        if self._shard_max_users is not None and len(shard.user_caches) > self._shard_max_users:
+            return True
+        if self._shard_max_messages is not None and shard.total_messages > self._shard_max_messages:
+            return True
+        return False
+
+    def _enforce_budget(self, shard: _MemoryShard):
+        """
+        Expire idle users and evict least recently used users until within budget.
+        Works from the LRU end only, so each call is O(users removed).
+        The most recently used user is never evicted.
+        """
+        now = time.monotonic()
+        while len(shard.user_caches) > 1:
+            email, user_cache = next(iter(shard.user_caches.items()))
+            if self._is_expired(user_cache, now):
+                self._drop_user(shard, email)
+                self.counters.incr("expirations")
+            elif self._over_budget(shard):
+                self._drop_user(shard, email)
+                self.counters.incr("evictions")
+            else:
+                break
+
+    def append(self, email: str, messages: List[CachedMessage]):
+        shard = self._shard(email)
+        with shard.lock:
+            user_cache = self._get_user_cache(shard, email)
+            cached = user_cache["messages"]
+            trimmed = 0
+            for message_data in messages:
+                if cached.maxlen is not None and len(cached) == cached.maxlen:
+                    trimmed += 1
+                else:
+                    shard.total_messages += 1
+                cached.append(message_data)
+                if message_data.visible_to_user:
+                    user_cache["visible"].append(message_data)
+            self._enforce_budget(shard)
+        if trimmed:
+            self.counters.incr("trimmed", trimmed)
+
+    def replace(self, email: str, messages: List[CachedMessage]):
+        shard = self._shard(email)
+        with shard.lock:
+            user_cache = self._get_user_cache(shard, email)
+            cached = user_cache["messages"]
+            shard.total_messages -= len(cached)
+            cached.clear()
+            cached.extend(messages)
+            shard.total_messages += len(cached)
+            visible = user_cache["visible"]
+            visible.clear()
+            visible.extend(msg for msg in cached if msg.visible_to_user)
+            user_cache["loaded"] = True
+            self._enforce_budget(shard)
+
+    def history(self, email: str, limit: int, visible_only: bool) -> Optional[List[CachedMessage]]:
+        shard = self._shard(email)
+        with shard.lock:
+            user_cache = self._lookup(shard, email)
+            if user_cache is None:
+                return None
+
+            # Walk backwards from the newest message and stop once we have enough: O(limit)
+            messages = user_cache["visible"] if visible_only else user_cache["messages"]
+            recent = list(islice(reversed(messages), limit))
+        recent.reverse()
+        return recent
+
+    def is_loaded(self, email: str) -> bool:
+        shard = self._shard(email)
+        with shard.lock:
+            user_cache = self._lookup(shard, email)
+            return user_cache is not None and user_cache["loaded"]
+
+    def clear(self, email: str):
+        shard = self._shard(email)
+        with shard.lock:
+            user_cache = shard.user_caches.get(email)
+            if user_cache is not None:
+                shard.total_messages -= len(user_cache["messages"])
+                user_cache["messages"].clear()
+                user_cache["visible"].clear()
+                user_cache["loaded"] = False
+
+    def clear_all(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.user_caches.clear()
+                shard.total_messages = 0
+
+    def size(self, email: str) -> int:
+        shard = self._shard(email)
+        with shard.lock:
+            user_cache = self._lookup(shard, email)
+            return len(user_cache["messages"]) if user_cache else 0
+
+    def users(self) -> List[str]:
+        emails = []
+        for shard in self._shards:
+            with shard.lock:
+                emails.extend(shard.user_caches.keys())
+        return emails
+
+    def dump(self) -> List[Tuple[str, bool, List[CachedMessage]]]:
+        users = []
+        for shard in self._shards:
+            with shard.lock:
+                users.extend(
+                    (user_cache["last_access"], email, user_cache["loaded"], list(user_cache["messages"]))
+                    for email, user_cache in shard.user_caches.items()
+                )
+        if len(self._shards) > 1:
+            # Least recently used first across all shards, matching eviction order
+            users.sort(key=lambda user: user[0])
+        return [(email, loaded, messages) for _, email, loaded, messages in users]
+
+    def stats(self) -> Dict[str, Any]:
+        users = messages = 0
+        for shard in self._shards:
+            with shard.lock:
+                users += len(shard.user_caches)
+                messages += shard.total_messages
+        return {
+            **super().stats(),
+            "backend": "memory",
+            "shards": len(self._shards),
+            "users": users,
+            "messages": messages,
+            "max_users": self.max_users,
+            "max_total_messages": self.max_total_messages,
+        }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis-protocol storage shared by all API workers.
+
+    Per user: a list of all messages, a list of visible messages and a
+    "loaded" flag. Writes run in MULTI/EXEC pipelines (WATCHed when they
+    depend on what is cached), the per-user cap is an
+    LTRIM and the TTL is a sliding EXPIRE refreshed on every access. The
+    global budget and LRU eviction are left to the server's maxmemory policy
+    (e.g. maxmemory-policy allkeys-lru).
+    """
+
+    def __init__(
+        self,
+        client=None,
+        url: Optional[str] = None,
+        prefix: str = "chat",
+        max_messages_per_user: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        super().__init__(max_messages_per_user=max_messages_per_user, ttl_seconds=ttl_seconds)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("RedisBackend requires the 'redis' package: pip install redis") from e
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self._redis = client
+        self.prefix = prefix
+
+    # Keys share a {email} hash tag so a user's keys live in one Redis Cluster slot
+    def _keys(self, email: str):
+        base = f"{self.prefix}:{{{email}}}"
+        return f"{base}:all", f"{base}:visible", f"{base}:loaded"
+
+    @staticmethod
+    def _encode(message_data: CachedMessage) -> bytes:
+        return json.dumps(message_data.to_row(), separators=(",", ":")).encode()
+
+    @staticmethod
+    def _decode(raw: bytes) -> CachedMessage:
+        return CachedMessage.from_row(json.loads(raw))
+
+    def _trim_and_touch(self, pipe, all_key: str, visible_key: str, loaded_key: str):
+        if self.max_messages_per_user is not None:
+            pipe.ltrim(all_key, -self.max_messages_per_user, -1)
+            pipe.ltrim(visible_key, -self.max_messages_per_user, -1)
+        if self.ttl_seconds is not None:
+            ttl_ms = int(self.ttl_seconds * 1000)
+            for key in (all_key, visible_key, loaded_key):
+                pipe.pexpire(key, ttl_ms)
+
+    def _queue_append(self, pipe, email: str, messages: List[CachedMessage]):
+        all_key, visible_key, loaded_key = self._keys(email)
+        visible = [self._encode(msg) for msg in messages if msg.visible_to_user]
+        pipe.rpush(all_key, *[self._encode(msg) for msg in messages])
+        if visible:
+            pipe.rpush(visible_key, *visible)
+        self._trim_and_touch(pipe, all_key, visible_key, loaded_key)
+
+    def _queue_replace(self, pipe, email: str, messages: List[CachedMessage]):
+        all_key, visible_key, loaded_key = self._keys(email)
+        visible = [self._encode(msg) for msg in messages if msg.visible_to_user]
+        pipe.delete(all_key, visible_key)
+        if messages:
+            pipe.rpush(all_key, *[self._encode(msg) for msg in messages])
+        if visible:
+            pipe.rpush(visible_key, *visible)
+        pipe.set(loaded_key, 1)
+        self._trim_and_touch(pipe, all_key, visible_key, loaded_key)
+
+    def append(self, email: str, messages: List[CachedMessage]):
+        if not messages:
+            return
+        pipe = self._redis.pipeline(transaction=True)
+        self._queue_append(pipe, email, messages)
+        pipe.execute()
+
+    def replace(self, email: str, messages: List[CachedMessage]):
+        pipe = self._redis.pipeline(transaction=True)
+        self._queue_replace(pipe, email, messages)
+        pipe.execute()
+
+    # merge and append_new read the list and write it back in one WATCH/MULTI
+    # transaction: if another worker appends in between, EXEC fails and
+    # redis-py's transaction() reruns the read, so no append is lost or doubled.
+
+    def merge(self, email: str, messages: List[CachedMessage]):
+        all_key, _, loaded_key = self._keys(email)
+
+        def write(pipe):
+            cached = [self._decode(raw) for raw in pipe.lrange(all_key, 0, -1)]
+            loaded_ids = {msg.id for msg in messages}
+            pipe.multi()
+            self._queue_replace(pipe, email, messages + [msg for msg in cached if msg.id not in loaded_ids])
+
+        self._redis.transaction(write, all_key, loaded_key)
+
+    def append_new(self, email: str, messages: List[CachedMessage]) -> int:
+        all_key, _, loaded_key = self._keys(email)
+
+        def write(pipe) -> int:
+            cached_ids = {self._decode(raw).id for raw in pipe.lrange(all_key, 0, -1)}
+            new_messages = [msg for msg in messages if msg.id not in cached_ids]
+            pipe.multi()
+            if new_messages:
+                self._queue_append(pipe, email, new_messages)
+            return len(new_messages)
+
+        return self._redis.transaction(write, all_key, loaded_key, value_from_callable=True)
+
+    def history(self, email: str, limit: int, visible_only: bool) -> Optional[List[CachedMessage]]:
+        all_key, visible_key, loaded_key = self._keys(email)
+        key = visible_key if visible_only else all_key
+
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.lrange(key, -max(limit, 1), -1)
+        pipe.exists(all_key, loaded_key)
+        self._trim_and_touch(pipe, all_key, visible_key, loaded_key)
+        raw_messages, exists = pipe.execute()[:2]
+
+        if not exists:
+            return None
+        return [self._decode(raw) for raw in raw_messages[-limit:]] if limit > 0 else []
+
+    def is_loaded(self, email: str) -> bool:
+        return bool(self._redis.exists(self._keys(email)[2]))
+
+    def clear(self, email: str):
+        self._redis.delete(*self._keys(email))
+
+    def clear_all(self):
+        keys = list(self._redis.scan_iter(match=f"{self.prefix}:{{*}}:*"))
+        if keys:
+            self._redis.delete(*keys)
+
+    def size(self, email: str) -> int:
+        return self._redis.llen(self._keys(email)[0])
+
+    def users(self) -> List[str]:
+        emails = set()
+        start = len(self.prefix) + 2  # "<prefix>:{"
+        for key in self._redis.scan_iter(match=f"{self.prefix}:{{*}}:all"):
+            key = key.decode() if isinstance(key, bytes) else key
+            emails.add(key[start:-len("}:all")])
+        return sorted(emails)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "backend": "redis", "prefix": self.prefix}
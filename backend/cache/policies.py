@@ -0,0 +1,181 @@
+"""
+Community Policy Cache
+
+Policies ('pet', 'smoking', 'parking') are edited by hand a few times a year
+but read on every policy question, so each process caches every policy of a
+community after its first lookup, for ttl_seconds or until invalidated.
+Communities without policies are cached too, so repeated questions about them
+don't reach the database either.
+
+Pet policies are normalized once, when cached: rule keys and asked-about pet
+types go through the same normalize_pet_type ("Kittens" -> "cat",
+"puppy" -> "dog"), so a lookup is one dict probe and only genuinely unknown
+pets fall through to the policy's 'default' rule.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from counters import Counters
+
+# Common names for the pet types policies are written for
+PET_ALIASES = {
+    "kitten": "cat",
+    "kitty": "cat",
+    "feline": "cat",
+    "puppy": "dog",
+    "puppies": "dog",
+    "pup": "dog",
+    "doggy": "dog",
+    "doggo": "dog",
+    "canine": "dog",
+    "bunny": "rabbit",
+    "bunnies": "rabbit",
+    "parrot": "bird",
+    "parakeet": "bird",
+    "budgie": "bird",
+    "canary": "bird",
+    "cockatiel": "bird",
+    "goldfish": "fish",
+    "betta": "fish",
+}
+
+
+def normalize_pet_type(pet_type: str) -> str:
+    """Canonical pet type: lower case, singular, aliases resolved ("Kittens" -> "cat")"""
+    name = " ".join(pet_type.lower().replace("-", " ").replace("_", " ").split())
+    if name in PET_ALIASES:
+        return PET_ALIASES[name]
+    if len(name) > 3 and name.endswith("s") and not name.endswith("ss"):
+        name = name[:-1]
+    return PET_ALIASES.get(name, name)
+
+
+class PetPolicy:
+    """A community's pet rules, keyed by canonical pet type"""
+
+    __slots__ = ("rules", "by_type", "default")
+
+    def __init__(self, rules: Dict[str, Any]):
+        self.rules = rules
+        self.default = rules.get("default")
+        by_type: Dict[str, Dict[str, Any]] = {}
+        for key, info in rules.items():
+            if key == "default" or not isinstance(info, dict):
+                continue
+            canonical = normalize_pet_type(key)
+            # A rule written for the canonical name wins over one written for an alias
+            if canonical not in by_type or key.lower() == canonical:
+                by_type[canonical] = info
+        self.by_type = by_type
+
+    def lookup(self, pet_type: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """(rule for this pet or None, canonical pet type)"""
+        canonical = normalize_pet_type(pet_type)
+        return self.by_type.get(canonical), canonical
+
+
+class CommunityPolicies:
+    """Every policy of one community, as cached"""
+
+    __slots__ = ("community_id", "rules", "pet", "expires_at")
+
+    def __init__(self, community_id: str, rules: Dict[str, Dict[str, Any]], expires_at: float):
+        self.community_id = community_id
+        self.rules = rules  # policy_type -> raw rules JSON
+        self.pet = PetPolicy(rules["pet"]) if rules.get("pet") is not None else None
+        self.expires_at = expires_at
+
+
+class PolicyCacheStats(Counters):
+    """Cache counters plus how pet lookups were resolved"""
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0               # Communities read from the database
+        self.invalidations = 0
+        self.alias_resolutions = 0   # Pet lookups that matched only after normalization
+        self.default_fallbacks = 0   # Pet lookups answered by the 'default' rule
+
+
+class PolicyCache:
+    """TTL + LRU cache of community policies keyed by community_id, safe to share between threads"""
+
+    def __init__(self, ttl_seconds: float = 300, max_communities: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_communities = max_communities
+        self._clock = clock
+        self._communities: "OrderedDict[str, CommunityPolicies]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = PolicyCacheStats()
+
+    def get(self, community_id: str) -> Optional[CommunityPolicies]:
+        """Get a live entry, or None on a miss or expiry"""
+        with self._lock:
+            cached = self._communities.get(community_id)
+            if cached is not None and cached.expires_at <= self._clock():
+                del self._communities[community_id]
+                cached = None
+                self.counters.incr("expirations")
+            if cached is None:
+                self.counters.incr("misses")
+                return None
+            self._communities.move_to_end(community_id)
+        self.counters.incr("hits")
+        return cached
+
+    def peek(self, community_id: str) -> Optional[CommunityPolicies]:
+        """Get a live entry without counting a miss; for callers that fall back to a loader calling get()"""
+        with self._lock:
+            cached = self._communities.get(community_id)
+            if cached is None or cached.expires_at <= self._clock():
+                return None
+            self._communities.move_to_end(community_id)
+        self.counters.incr("hits")
+        return cached
+
+    def put(self, community_id: str, rules: Dict[str, Dict[str, Any]]) -> CommunityPolicies:
+        """Store a community's policies as just read from the database (policy_type -> rules)"""
+        cached = CommunityPolicies(community_id, dict(rules), self._clock() + self.ttl_seconds)
+        self.counters.incr("loads")
+        if self.ttl_seconds <= 0:
+            return cached
+        with self._lock:
+            self._communities[community_id] = cached
+            self._communities.move_to_end(community_id)
+            while len(self._communities) > self.max_communities:
+                self._communities.popitem(last=False)
+                self.counters.incr("evictions")
+        return cached
+
+    def invalidate(self, community_id: Optional[str] = None):
+        """Drop one community's policies (after an edit), or every community's"""
+        with self._lock:
+            if community_id is None:
+                self._communities.clear()
+            else:
+                self._communities.pop(community_id, None)
+        self.counters.incr("invalidations")
+
+    def record_pet_lookup(self, pet_type: str, canonical: str, matched: bool):
+        """Count how a pet lookup was resolved"""
+        if not matched:
+            self.counters.incr("default_fallbacks")
+        elif canonical != pet_type.strip().lower():
+            self.counters.incr("alias_resolutions")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            communities = len(self._communities)
+        return {
+            "communities": communities,
+            "max_communities": self.max_communities,
+            "ttl_seconds": self.ttl_seconds,
+            **self.counters.as_dict(),
+        }
@@ -0,0 +1,198 @@
+"""
+Compact Cached Message Records
+
+A CachedMessage holds one cached message in a __slots__ object with raw
+UUIDs, an integer timestamp (µs since the Unix epoch, UTC) and interned role
+strings, instead of a full Message.to_dict() dict of strings. The dict shape is
+only rendered when an API response needs it (to_dict / to_api_dict).
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Union
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Approximate memory held by one record besides its content string (scripts/bench_cache.py)
+RECORD_OVERHEAD_BYTES = 400
+
+
+def _to_uuid(value) -> Optional[uuid.UUID]:
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def datetime_to_micros(value: Optional[datetime]) -> Optional[int]:
+    """Convert a datetime to µs since the epoch (naive datetimes are taken as UTC)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def micros_to_datetime(micros: Optional[int]) -> Optional[datetime]:
+    if micros is None:
+        return None
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class CachedMessage:
+    """One cached message; mirrors the columns of models.Message"""
+
+    __slots__ = (
+        "id",
+        "role",
+        "content",
+        "visible_to_user",
+        "created_ts",
+        "parent_id",
+        "user_id",
+        "step_id",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        id: uuid.UUID,
+        role: str,
+        content: Optional[str],
+        visible_to_user: bool = True,
+        created_ts: Optional[int] = None,
+        parent_id: Optional[uuid.UUID] = None,
+        user_id: Optional[uuid.UUID] = None,
+        step_id: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.id = id
+        self.role = _intern(role)
+        self.content = content
+        self.visible_to_user = visible_to_user
+        self.created_ts = created_ts
+        self.parent_id = parent_id
+        self.user_id = user_id
+        self.step_id = _intern(step_id)
+        self.extra = extra  # Any JSONB keys besides role/content (normally None)
+
+    @classmethod
+    def from_model(cls, message) -> "CachedMessage":
+        """Build a record straight from a models.Message row (or a result row with its columns)"""
+        return cls._from_fields(
+            id=message.id,
+            jsonb=message.message,
+            role=message.role,
+            visible_to_user=message.visible_to_user,
+            created_ts=datetime_to_micros(message.created_date),
+            parent_id=message.parent_id,
+            user_id=message.user_id,
+            step_id=message.step_id.value if message.step_id else None,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CachedMessage":
+        """Build a record from the Message.to_dict() shape"""
+        created_date = data.get("created_date")
+        return cls._from_fields(
+            id=_to_uuid(data["id"]),
+            jsonb=data.get("message"),
+            role=data.get("role"),
+            visible_to_user=data.get("visible_to_user", True),
+            created_ts=datetime_to_micros(datetime.fromisoformat(created_date)) if created_date else None,
+            parent_id=_to_uuid(data.get("parent_id")),
+            user_id=_to_uuid(data.get("user_id")),
+            step_id=data.get("step_id"),
+        )
+
+    @classmethod
+    def _from_fields(cls, jsonb: Optional[Dict[str, Any]], role: Optional[str], **fields) -> "CachedMessage":
+        jsonb = jsonb or {}
+        extra = {k: v for k, v in jsonb.items() if k not in ("role", "content")} or None
+        return cls(role=role or jsonb.get("role", "user"), content=jsonb.get("content"), extra=extra, **fields)
+
+    @classmethod
+    def coerce(cls, message: Union["CachedMessage", Dict[str, Any]]) -> "CachedMessage":
+        """Accept either a record or a Message.to_dict() dict"""
+        return message if isinstance(message, cls) else cls.from_dict(message)
+
+    def approx_size(self) -> int:
+        """Rough bytes of memory this record holds, for memory budgets"""
+        return RECORD_OVERHEAD_BYTES + len(self.content or "")
+
+    @property
+    def message(self) -> Dict[str, Any]:
+        """The JSONB message payload"""
+        payload = {"role": self.role, "content": self.content}
+        if self.extra:
+            payload.update(self.extra)
+        return payload
+
+    @property
+    def created_date(self) -> Optional[str]:
+        created = micros_to_datetime(self.created_ts)
+        return created.isoformat() if created else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Render the Message.to_dict() shape"""
+        return {
+            "id": str(self.id),
+            "message": self.message,
+            "role": self.role,
+            "visible_to_user": self.visible_to_user,
+            "step_id": self.step_id,
+            "parent_id": str(self.parent_id) if self.parent_id else None,
+            "user_id": str(self.user_id) if self.user_id else None,
+            "created_date": self.created_date,
+        }
+
+    def to_api_dict(self) -> Dict[str, Any]:
+        """Render the /api/messages shape"""
+        return {
+            "id": str(self.id),
+            "message": self.message,
+            "created_date": self.created_date,
+        }
+
+    def to_row(self) -> List[Any]:
+        """Positional, JSON/msgpack-safe encoding used by Redis and snapshots"""
+        return [
+            self.id.hex,
+            self.role,
+            self.content,
+            self.visible_to_user,
+            self.created_ts,
+            self.parent_id.hex if self.parent_id else None,
+            self.user_id.hex if self.user_id else None,
+            self.step_id,
+            self.extra,
+        ]
+
+    @classmethod
+    def from_row(cls, row: List[Any]) -> "CachedMessage":
+        id_hex, role, content, visible, created_ts, parent_hex, user_hex, step_id, extra = row
+        return cls(
+            id=uuid.UUID(id_hex),
+            role=role,
+            content=content,
+            visible_to_user=visible,
+            created_ts=created_ts,
+            parent_id=uuid.UUID(parent_hex) if parent_hex else None,
+            user_id=uuid.UUID(user_hex) if user_hex else None,
+            step_id=step_id,
+            extra=extra,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CachedMessage):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"CachedMessage(id={self.id}, role={self.role!r}, created_ts={self.created_ts})"
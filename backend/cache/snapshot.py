@@ -0,0 +1,230 @@
+"""
+Message Cache Snapshots
+
+Compact binary dump of the in-memory cache so a restarted worker comes back
+with a hot cache instead of going back to Postgres for every user.
+
+File layout (little-endian):
+    header:  magic b"ZMCS" | version u8 | codec u8 | user count u32 | watermark i64 (µs since epoch, 0 = none)
+    records: email length u16 | email | loaded u8 | payload length u32 | payload
+             (one per user, least recently used first)
+
+Each payload is the user's message list as CachedMessage.to_row() rows,
+encoded with msgpack when it is installed, otherwise compact JSON. The
+watermark is the newest created_date in the snapshot; messages created after
+it are caught up from the database.
+
+SnapshotReader mmaps the file and only walks the record headers at startup,
+so opening a snapshot costs O(users) small reads no matter how many messages
+it holds. A user's payload is decoded the first time that user is read.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .records import CachedMessage, micros_to_datetime
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency - fall back to JSON payloads
+    msgpack = None
+
+MAGIC = b"ZMCS"
+VERSION = 2
+CODEC_JSON = 1
+CODEC_MSGPACK = 2
+
+_HEADER = struct.Struct("<4sBBIq")
+_EMAIL_LENGTH = struct.Struct("<H")
+_RECORD_META = struct.Struct("<BI")  # loaded, payload length
+
+# (email, loaded, messages) as produced by CacheBackend.dump()
+UserSnapshot = Tuple[str, bool, List[CachedMessage]]
+
+
+def default_codec() -> int:
+    return CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+
+
+def encode_messages(messages: List[CachedMessage], codec: int) -> bytes:
+    rows = [msg.to_row() for msg in messages]
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(rows, use_bin_type=True)
+    return json.dumps(rows, separators=(",", ":")).encode()
+
+
+def decode_messages(payload, codec: int) -> List[CachedMessage]:
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Snapshot was written with msgpack, which is not installed")
+        rows = msgpack.unpackb(payload, raw=False)
+    else:
+        rows = json.loads(bytes(payload))
+    return [CachedMessage.from_row(row) for row in rows]
+
+
+def _from_micros(micros: int) -> Optional[str]:
+    return micros_to_datetime(micros).isoformat() if micros else None
+
+
+def write_snapshot(
+    path: str,
+    users: Iterable[UserSnapshot],
+    carried: Optional["SnapshotReader"] = None,
+    skip_carried: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """
+    Write a snapshot atomically (temp file + rename).
+
+    Args:
+        path: Snapshot file to (over)write
+        users: Decoded users to write, least recently used first
+        carried: Previous snapshot whose not-yet-read users are copied over as raw bytes
+        skip_carried: Emails not to copy from the previous snapshot
+
+    Returns:
+        Dict with the number of users/messages written, the watermark and file size
+    """
+    codec = default_codec()
+    watermark = 0
+    user_count = 0
+    message_count = 0
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        def write_record(email: str, loaded: bool, payload: bytes):
+            email_bytes = email.encode()
+            f.write(_EMAIL_LENGTH.pack(len(email_bytes)))
+            f.write(email_bytes)
+            f.write(_RECORD_META.pack(1 if loaded else 0, len(payload)))
+            f.write(payload)
+
+        # Placeholder header, rewritten in place once counts and watermark are known
+        f.write(_HEADER.pack(MAGIC, VERSION, codec, 0, 0))
+
+        # Users that were never read since the last restore go first: they are the least recently used
+        if carried is not None:
+            skip = set(skip_carried)
+            for email, loaded, payload in carried.remaining():
+                if email in skip:
+                    continue
+                if carried.codec != codec:
+                    payload = encode_messages(decode_messages(payload, carried.codec), codec)
+                write_record(email, loaded, payload)
+                user_count += 1
+            watermark = carried.watermark_micros
+
+        for email, loaded, messages in users:
+            write_record(email, loaded, encode_messages(messages, codec))
+            user_count += 1
+            message_count += len(messages)
+            if messages:
+                # Messages are chronological, so the last one is the user's newest
+                watermark = max(watermark, messages[-1].created_ts or 0)
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, codec, user_count, watermark))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return {
+        "users": user_count,
+        "messages": message_count,
+        "watermark": _from_micros(watermark),
+        "bytes": os.path.getsize(path),
+    }
+
+
+class SnapshotReader:
+    """
+    Memory-mapped view of a snapshot file.
+
+    Opening only indexes record headers; pop(email) decodes one user's
+    messages on demand. Rewriting the snapshot path is safe while a reader
+    is open because writes go through a temp file and rename.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"Snapshot {path} is truncated")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, codec, user_count, watermark = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} message cache snapshot")
+        self.codec = codec
+        self.watermark_micros = watermark
+
+        # {email: (loaded, payload offset, payload length)}, in file (LRU) order
+        self._index: Dict[str, Tuple[bool, int, int]] = {}
+        view = self._mmap
+        offset = _HEADER.size
+        for _ in range(user_count):
+            (email_length,) = _EMAIL_LENGTH.unpack_from(view, offset)
+            offset += _EMAIL_LENGTH.size
+            email = view[offset:offset + email_length].decode()
+            offset += email_length
+            loaded, payload_length = _RECORD_META.unpack_from(view, offset)
+            offset += _RECORD_META.size
+            self._index[email] = (bool(loaded), offset, payload_length)
+            offset += payload_length
+
+    @property
+    def watermark(self) -> Optional[str]:
+        """Newest created_date in the snapshot (ISO 8601), or None if empty"""
+        return _from_micros(self.watermark_micros)
+
+    def __contains__(self, email: str) -> bool:
+        return email in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def emails(self) -> List[str]:
+        return list(self._index.keys())
+
+    def pop(self, email: str) -> Optional[Tuple[bool, List[CachedMessage]]]:
+        """Decode a user's messages and drop them from the index; None if absent"""
+        entry = self._index.pop(email, None)
+        if entry is None:
+            return None
+        loaded, offset, length = entry
+        return loaded, decode_messages(self._mmap[offset:offset + length], self.codec)
+
+    def remaining(self) -> Iterator[Tuple[str, bool, bytes]]:
+        """Raw (email, loaded, payload) for users that haven't been popped"""
+        for email, (loaded, offset, length) in list(self._index.items()):
+            yield email, loaded, self._mmap[offset:offset + length]
+
+    def close(self):
+        self._index.clear()
+        self._mmap.close()
+
+
+def read_snapshot(path: str) -> Tuple[Optional[str], List[UserSnapshot]]:
+    """
+    Eagerly decode a whole snapshot.
+
+    Returns:
+        (watermark, users) where users is a list of (email, loaded, messages)
+
+    Raises:
+        ValueError: If the file is not a snapshot or uses an unknown version/codec
+    """
+    reader = SnapshotReader(path)
+    try:
+        users = []
+        for email in reader.emails():
+            loaded, messages = reader.pop(email)
+            users.append((email, loaded, messages))
+        return reader.watermark, users
+    finally:
+        reader.close()
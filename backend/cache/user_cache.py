@@ -0,0 +1,289 @@
+import threading
+from typing import Callable, Iterable, List, Dict, Optional, Any, Tuple, Union
+
+from . import snapshot
+from .backends import CacheBackend, InMemoryBackend
+from .records import CachedMessage
+
+# Messages can be passed in as records or as Message.to_dict() dicts
+MessageLike = Union[CachedMessage, Dict[str, Any]]
+
+# Loads the most recent messages for one user: (email, limit) -> messages, oldest first
+HistoryLoader = Callable[[str, int], List[MessageLike]]
+
+
+class UserMessageCache:
+    """
+    Cache for storing messages organized by user email.
+    Messages are stored and returned as compact CachedMessage records.
+
+    Storage is delegated to a CacheBackend: InMemoryBackend (default, per process)
+    or RedisBackend (shared by every worker). The in-memory backend is unbounded
+    by default; its limits switch on bounded mode:
+    - max_messages_per_user: per-user ring buffer, oldest messages fall off
+    - max_users / max_total_messages: global budget, least recently used users are evicted
+    - ttl_seconds: users idle for longer than this are expired on next access
+
+    With a loader registered (see set_loader), a user whose history isn't loaded
+    is hydrated on first read with only their last hydration_limit messages.
+    After load_snapshot, users found in the snapshot are restored from it instead.
+
+    The cache is safe to share between threads. Read-modify-write sequences on
+    one user (hydration merge, snapshot restore, catch-up, appends) run under
+    that user's lock, taken from a fixed pool of LOCK_STRIPES locks by email
+    hash, so requests for unrelated users don't serialize behind each other.
+    No method awaits, so asyncio tasks on one event loop can't interleave either.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(
+        self,
+        max_messages_per_user: Optional[int] = None,
+        max_users: Optional[int] = None,
+        max_total_messages: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        hydration_limit: int = 100,
+        backend: Optional[CacheBackend] = None,
+        shards: int = 1,
+    ):
+        self.backend = backend or InMemoryBackend(
+            max_messages_per_user=max_messages_per_user,
+            max_users=max_users,
+            max_total_messages=max_total_messages,
+            ttl_seconds=ttl_seconds,
+            shards=shards,
+        )
+        self.hydration_limit = hydration_limit
+        self._user_locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+
+        # Lazy hydration: one in-flight load per email, shared by concurrent readers
+        self._loader: Optional[HistoryLoader] = None
+        self._hydration_lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+
+        # Warm restarts: users in the snapshot are decoded on first read
+        self._snapshot: Optional[snapshot.SnapshotReader] = None
+        self._snapshot_pending: Dict[str, List[CachedMessage]] = {}
+
+    def add_message(self, email: str, message_data: MessageLike):
+        """Add a message to a user's cache"""
+        self.add_messages(email, [message_data])
+
+    def add_messages(self, email: str, messages: List[MessageLike]):
+        """Add multiple messages to a user's cache"""
+        if self._in_snapshot(email):
+            # Restore the snapshotted history first so new messages land after it
+            self.ensure_loaded(email)
+        messages = [CachedMessage.coerce(msg) for msg in messages]
+        with self._user_lock(email):
+            self.backend.append(email, messages)
+
+    def _user_lock(self, email: str) -> threading.RLock:
+        return self._user_locks[hash(email) % self.LOCK_STRIPES]
+
+    def set_loader(self, loader: Optional[HistoryLoader]):
+        """Register the function used to hydrate a user's history on cache miss"""
+        self._loader = loader
+
+    def ensure_loaded(self, email: str) -> bool:
+        """
+        Hydrate a user's history from the loader if it isn't loaded yet.
+        Concurrent callers for the same email wait on a single load.
+        Returns True if this call had to load (or wait for a load).
+        """
+        if self.is_loaded(email):
+            return False
+        if self._loader is None and not self._in_snapshot(email):
+            return False
+
+        with self._hydration_lock:
+            if self.is_loaded(email):
+                return False
+            event = self._inflight.get(email)
+            is_leader = event is None
+            if is_leader:
+                event = threading.Event()
+                self._inflight[email] = event
+
+        if not is_leader:
+            event.wait()
+            return True
+
+        try:
+            if not self._restore_from_snapshot(email) and self._loader is not None:
+                messages = self._loader(email, self.hydration_limit)
+                self._merge_loaded(email, messages)
+        except Exception as e:
+            # Leave the user unloaded so the next read retries
+            print(f"Warning: Could not hydrate message history for {email}: {e}")
+        finally:
+            with self._hydration_lock:
+                self._inflight.pop(email, None)
+            event.set()
+        return True
+
+    def _merge_loaded(self, email: str, messages: List[MessageLike]):
+        """Load hydrated messages, keeping any cached messages the loader didn't return"""
+        messages = [CachedMessage.coerce(msg) for msg in messages]
+        with self._user_lock(email):
+            # Messages appended while the loader ran (by any worker) are already cached; keep them
+            self.backend.merge(email, messages)
+
+    def get_message_history(self, email: str, limit: int = 100, visible_only: bool = True) -> List[CachedMessage]:
+        """Get recent message history for a user, optionally filtered by visibility"""
+        hydrated = self.ensure_loaded(email)
+        messages = self.backend.history(email, limit, visible_only)
+        if hydrated or messages is None:
+            self.backend.counters.incr("misses")
+        else:
+            self.backend.counters.incr("hits")
+        return messages or []
+
+    def load_from_db(self, email: str, messages: List[MessageLike]):
+        """Load messages from database into a user's cache"""
+        messages = [CachedMessage.coerce(msg) for msg in messages]
+        with self._user_lock(email):
+            self.backend.replace(email, messages)
+
+    def warm_up(
+        self,
+        users: Iterable[Tuple[str, List[MessageLike]]],
+        max_users: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Bulk-load users from a stream of (email, messages) pairs, e.g.
+        MessageQueries.stream_recent_messages_per_user. Users are consumed one at
+        a time and loading stops before max_users or max_bytes (estimated with
+        CachedMessage.approx_size) would be exceeded, so memory stays bounded
+        however large the source is. Users already loaded are skipped.
+
+        Returns:
+            Dict with the number of users and messages loaded and the estimated bytes
+        """
+        loaded_users = loaded_messages = used_bytes = 0
+        try:
+            for email, messages in users:
+                if max_users is not None and loaded_users >= max_users:
+                    break
+                messages = [CachedMessage.coerce(msg) for msg in messages]
+                size = sum(msg.approx_size() for msg in messages)
+                if max_bytes is not None and used_bytes + size > max_bytes:
+                    break
+                if self.is_loaded(email) or self._in_snapshot(email):
+                    continue
+                self.load_from_db(email, messages)
+                loaded_users += 1
+                loaded_messages += len(messages)
+                used_bytes += size
+        finally:
+            # Stop a generator source early so its server-side cursor is released
+            close = getattr(users, "close", None)
+            if close is not None:
+                close()
+        return {"users": loaded_users, "messages": loaded_messages, "bytes": used_bytes}
+
+    def is_loaded(self, email: str) -> bool:
+        """Check if a user's cache has been loaded from DB"""
+        return self.backend.is_loaded(email)
+
+    def clear(self, email: str):
+        """Clear all cached messages for a user"""
+        self.backend.clear(email)
+
+    def clear_all(self):
+        """Clear all user caches"""
+        self.backend.clear_all()
+
+    def size(self, email: str) -> int:
+        """Get total number of cached messages for a user"""
+        return self.backend.size(email)
+
+    def holds_full_history(self, email: str) -> bool:
+        """
+        True if the user's whole history is cached: hydration returned fewer
+        messages than it asked for and the ring buffer has never filled since.
+        Otherwise older messages may only be in the database.
+        """
+        size = self.backend.size(email)
+        limit = self.backend.max_messages_per_user
+        return self.is_loaded(email) and size < self.hydration_limit and (limit is None or size < limit)
+
+    def get_cached_users(self) -> List[str]:
+        """Get list of emails that have cached data"""
+        return self.backend.users()
+
+    def _in_snapshot(self, email: str) -> bool:
+        return self._snapshot is not None and email in self._snapshot
+
+    def _restore_from_snapshot(self, email: str) -> bool:
+        """
+        Move a user from the snapshot into the backend, applying caught-up messages.
+        Returns True if the user is now loaded.
+        """
+        with self._user_lock(email):
+            entry = self._snapshot.pop(email) if self._snapshot is not None else None
+            if entry is None:
+                return False
+            loaded, messages = entry
+            pending = self._snapshot_pending.pop(email, [])
+            if pending:
+                known_ids = {msg.id for msg in messages}
+                messages += [msg for msg in pending if msg.id not in known_ids]
+            if not loaded:
+                self.backend.append(email, messages)
+                return False
+            self._merge_loaded(email, messages)
+            return True
+
+    def catch_up(self, email: str, messages: List[MessageLike]) -> int:
+        """
+        Add messages newer than the snapshot watermark, skipping ids already cached.
+        Users still in the snapshot get them when restored; users that are neither
+        cached nor in the snapshot are left alone (they hydrate on first read).
+        Returns the number of messages accepted.
+        """
+        messages = [CachedMessage.coerce(msg) for msg in messages]
+        with self._user_lock(email):
+            if self._in_snapshot(email):
+                self._snapshot_pending.setdefault(email, []).extend(messages)
+                return len(messages)
+            if not self.is_loaded(email):
+                return 0
+            return self.backend.append_new(email, messages)
+
+    def save_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Write every cached user to a binary snapshot file.
+        Users from the previous snapshot that were never read are carried over unchanged.
+        """
+        # Users with caught-up messages must be decoded so the new watermark covers them
+        for email in list(self._snapshot_pending):
+            self._restore_from_snapshot(email)
+        users = self.backend.dump()
+        return snapshot.write_snapshot(
+            path,
+            users,
+            carried=self._snapshot,
+            skip_carried=[email for email, _, _ in users],
+        )
+
+    def load_snapshot(self, path: str) -> Optional[str]:
+        """
+        Open a snapshot file; its users are restored lazily on first read.
+        Returns the snapshot watermark (newest cached created_date), or None if empty.
+        """
+        if self._snapshot is not None:
+            self._snapshot.close()
+        self._snapshot = snapshot.SnapshotReader(path)
+        self._snapshot_pending.clear()
+        return self._snapshot.watermark
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and current occupancy"""
+        return {
+            **self.backend.stats(),
+            "hydration_limit": self.hydration_limit,
+            "snapshot_users": len(self._snapshot) if self._snapshot is not None else 0,
+        }
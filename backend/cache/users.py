@@ -0,0 +1,106 @@
+"""
+In-Process User Cache
+
+Maps email -> (user_id, name, preferences) for leads seen recently, so a
+repeat message from a known lead with unchanged name and preferences needs no
+database round trip to resolve the user. Entries live for ttl_seconds after
+they were last written from the database; the least recently used entries are
+dropped beyond max_users.
+
+The cache is per process: another worker may have changed a user within the
+TTL. Writes are unaffected because the upsert merges preferences in SQL.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .backends import CacheStats
+
+
+class CachedUser:
+    """One cached user row"""
+
+    __slots__ = ("user_id", "email", "name", "preferences", "expires_at")
+
+    def __init__(self, user_id: uuid.UUID, email: str, name: Optional[str], preferences: Optional[Dict[str, Any]], expires_at: float):
+        self.user_id = user_id
+        self.email = email
+        self.name = name
+        self.preferences = preferences or {}
+        self.expires_at = expires_at
+
+    def satisfies(self, name: str, preferences: Optional[Dict[str, Any]]) -> bool:
+        """True if writing name and preferences would leave this user unchanged"""
+        if name != self.name:
+            return False
+        return all(key in self.preferences and self.preferences[key] == value for key, value in (preferences or {}).items())
+
+    def to_user(self):
+        """A detached models.User carrying the cached columns"""
+        from models import User
+        return User(user_id=self.user_id, email=self.email, name=self.name, preferences=dict(self.preferences))
+
+
+class UserDirectoryCache:
+    """TTL + LRU cache of user rows keyed by email, safe to share between threads"""
+
+    def __init__(self, ttl_seconds: float = 300, max_users: int = 50000, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._clock = clock
+        self._users: "OrderedDict[str, CachedUser]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = CacheStats()
+
+    def get(self, email: str) -> Optional[CachedUser]:
+        """Get a live entry, or None on a miss or expiry"""
+        with self._lock:
+            cached = self._users.get(email)
+            if cached is not None and cached.expires_at <= self._clock():
+                del self._users[email]
+                cached = None
+                self.counters.incr("expirations")
+            if cached is None:
+                self.counters.incr("misses")
+                return None
+            self._users.move_to_end(email)
+        self.counters.incr("hits")
+        return cached
+
+    def put(self, user_id: uuid.UUID, email: str, name: Optional[str], preferences: Optional[Dict[str, Any]]) -> CachedUser:
+        """Store a user's row as just read from or written to the database"""
+        cached = CachedUser(user_id, email, name, dict(preferences or {}), self._clock() + self.ttl_seconds)
+        with self._lock:
+            self._users[email] = cached
+            self._users.move_to_end(email)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.counters.incr("evictions")
+        return cached
+
+    def put_user(self, user) -> CachedUser:
+        """Store a models.User (or any object with its columns)"""
+        return self.put(user.user_id, user.email, user.name, user.preferences)
+
+    def invalidate(self, email: str):
+        """Drop a user, e.g. after a write that may have failed"""
+        with self._lock:
+            self._users.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users = len(self._users)
+        counters = self.counters.as_dict()
+        return {
+            "users": users,
+            "max_users": self.max_users,
+            "ttl_seconds": self.ttl_seconds,
+            **{name: counters[name] for name in ("hits", "misses", "evictions", "expirations")},
+        }
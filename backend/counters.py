@@ -0,0 +1,29 @@
+"""
+Runtime Counters
+
+Thread-safe integer counters behind the /admin stats endpoints: the caches,
+the tool runner, the speculative executor and the pre-classifier each keep
+a Counters subclass.
+"""
+
+import threading
+from typing import Dict
+
+
+class Counters:
+    """
+    Named integer counters, safe to bump from any thread.
+    Subclasses set each counter to 0 in __init__; as_dict reports them in that order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        """Add to a counter (a bare += can lose updates between threads)"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: value for name, value in vars(self).items() if not name.startswith("_")}
@@ -3,12 +3,25 @@ Global Database Configuration
 
 Database session management with per-request sessions.
 Uses eager initialization pattern - connection pool created at startup.
+
+Two engines share the same database:
+- engine / get_db: synchronous Session for scripts, tools and worker threads
+- async_engine / get_async_db: AsyncSession for async endpoints, so DB waits
+  don't block the event loop
+
+Pool settings come from DB_POOL_* environment variables (see env.example).
+Each engine has its own pool, so the database sees up to
+2 x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections per worker process.
 """
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+
+from .pool_metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, pool_status
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,11 +31,68 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL not found in environment variables. Please set it in your .env file.")
 
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def pool_options() -> dict:
+    """Engine keyword arguments for the connection pool, from the environment"""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),  # Seconds; -1 disables
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+        # SQLAlchemy's compiled-statement (SQL string) cache, per engine
+        "query_cache_size": int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+    }
+
+
+def driver_connect_args(url: str) -> dict:
+    """
+    Server-side prepared statements for psycopg 3: a statement is prepared after
+    DB_PREPARE_THRESHOLD executions. "none" disables them (needed behind
+    PgBouncer in transaction mode). asyncpg takes prepared_statement_cache_size
+    in the URL query instead.
+    """
+    if "psycopg" not in make_url(url).drivername:
+        return {}
+    threshold = os.getenv("DB_PREPARE_THRESHOLD", "5").strip().lower()
+    return {"prepare_threshold": None if threshold in ("none", "off", "") else int(threshold)}
+
+
 # Eager initialization - created at import time for connection pooling
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=TimedQueuePool,
+    connect_args=driver_connect_args(DATABASE_URL),
+    **pool_options(),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+def _async_url(url: str) -> str:
+    """Switch a Postgres URL to psycopg 3's async driver (same package, no extra dependency)"""
+    parsed = make_url(url)
+    if parsed.drivername in ("postgresql", "postgresql+psycopg", "postgresql+psycopg2"):
+        parsed = parsed.set(drivername="postgresql+psycopg_async")
+    return parsed.render_as_string(hide_password=False)
+
+
+# ASYNC_DATABASE_URL overrides the driver, e.g. postgresql+asyncpg://...
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    connect_args=driver_connect_args(ASYNC_DATABASE_URL),
+    **pool_options(),
+)
+# Objects stay usable after commit without lazy-loading (which async sessions can't do implicitly)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 def get_db():
     """
     Dependency to get database session.
@@ -37,5 +107,23 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Async dependency to get database session.
+    
+    Yields:
+        AsyncSession: SQLAlchemy async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_stats():
+    """Connection pool config, occupancy, checkout waits and churn for both engines"""
+    return {
+        "config": {**pool_options(), "prepare_threshold": driver_connect_args(DATABASE_URL).get("prepare_threshold")},
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.sync_engine.pool),
+    }
+
 # Table creation is handled by Docker container initialization
 # See database/scripts/init/ for schema management
@@ -0,0 +1,142 @@
+"""
+Connection Pool Metrics
+
+QueuePool subclasses that time every connection checkout, so the time
+requests spend waiting for a free pooled connection shows up as a metric,
+and count connection churn (new, closed and invalidated DBAPI connections).
+See GET /admin/db.
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolWaitStats:
+    """Time spent waiting for pool checkouts, safe to update from any thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record(self, seconds: float, timed_out: bool = False):
+        bucket = bisect.bisect_left(WAIT_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self.buckets[bucket] += 1
+
+    def histogram(self) -> Dict[str, int]:
+        """Checkout count per wait bucket, e.g. {"<=1ms": 950, "<=5ms": 40, ..., ">5000ms": 0}"""
+        labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            return dict(zip(labels, self.buckets))
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.total_wait * 1000, 3),
+                "wait_avg_ms": round(self.total_wait * 1000 / attempts, 3) if attempts else 0.0,
+                "wait_max_ms": round(self.max_wait * 1000, 3),
+            }
+        stats["wait_histogram"] = self.histogram()
+        return stats
+
+
+class ConnectionChurn:
+    """DBAPI connections opened, closed and invalidated by a pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "closes": self.closes,
+                "invalidations": self.invalidations,
+            }
+
+
+class _TimedCheckoutMixin:
+    """Wraps QueuePool._do_get (the blocking checkout) with a timer and counts connection churn"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+        self.churn = ConnectionChurn()
+        if "_dispatch" not in kwargs:
+            # A recreated pool inherits these listeners through _dispatch
+            churn = self.churn
+            event.listen(self, "connect", lambda dbapi_connection, record: churn.incr("connects"))
+            event.listen(self, "close", lambda dbapi_connection, record: churn.incr("closes"))
+            event.listen(self, "invalidate", lambda dbapi_connection, record, error: churn.incr("invalidations"))
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Keep the counters when the engine is disposed and the pool rebuilt
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        pool.churn = self.churn
+        return pool
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    """QueuePool for the sync engine"""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    """QueuePool for the async engine"""
+
+
+def pool_status(pool) -> Dict[str, Any]:
+    """Occupancy, checkout wait and churn metrics for one pool"""
+    status = {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status.update(wait_stats.as_dict())
+    churn = getattr(pool, "churn", None)
+    if churn is not None:
+        status.update(churn.as_dict())
+    return status
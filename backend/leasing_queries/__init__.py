@@ -4,12 +4,30 @@ Queries Module
 Modular database queries for leasing operations.
 Each query type is separated into its own file for better maintainability.
 Returns raw JSON data for LLM processing.
+Every query has an *_async twin that takes an AsyncSession.
+Unit lookups are served from inventory_index once it is loaded.
 """
 
-from .pet_policy import get_pet_policy
-from .pricing import get_pricing
+from .inventory import InventoryIndex, inventory_index
+from .pet_policy import get_pet_policy, get_pet_policy_async
+from .policies import get_community_policies, get_community_policies_async, get_policy, get_policy_async
+from .pricing import get_pricing, get_pricing_async
+from .unit_availability import get_available_units, get_available_units_async
+from .unit_search import search_units, search_units_async
 
 __all__ = [
+    'InventoryIndex',
+    'get_available_units',
+    'get_available_units_async',
+    'get_community_policies',
+    'get_community_policies_async',
     'get_pet_policy',
+    'get_pet_policy_async',
+    'get_policy',
+    'get_policy_async',
     'get_pricing',
+    'get_pricing_async',
+    'inventory_index',
+    'search_units',
+    'search_units_async',
 ]
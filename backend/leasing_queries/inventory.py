@@ -0,0 +1,260 @@
+"""
+In-Memory Inventory Index
+
+Units change a few times a day but are read on every availability and pricing
+tool call, so the whole units JOIN communities inventory is held in process,
+indexed by (community_id, bedrooms, availability_status) and by
+(community_id, unit_code). get_available_units and get_pricing answer from it
+once it is loaded, and fall back to SQL otherwise.
+
+Freshness comes from polling units.updated_at (kept current by the
+units_touch_updated_at trigger, database/scripts/init/07-*.sql): each poll
+re-reads rows changed since the last watermark minus a small overlap, so rows
+from transactions that committed late are not missed. A periodic full rebuild
+picks up deleted units and renamed communities, which polling can't see.
+
+Readers never lock: every change builds a new immutable snapshot and swaps it in.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+INVENTORY_COLUMNS = """
+        u.unit_id,
+        u.community_id,
+        u.unit_code,
+        u.bedrooms,
+        u.bathrooms,
+        u.rent,
+        u.specials,
+        u.availability_status,
+        u.available_at,
+        u.updated_at,
+        c.name as community_name
+"""
+
+FULL_INVENTORY_QUERY = text(f"""
+    SELECT {INVENTORY_COLUMNS}
+    FROM units u
+    INNER JOIN communities c ON u.community_id = c.community_id;
+""")
+
+CHANGED_INVENTORY_QUERY = text(f"""
+    SELECT {INVENTORY_COLUMNS}
+    FROM units u
+    INNER JOIN communities c ON u.community_id = c.community_id
+    WHERE u.updated_at > :since;
+""")
+
+
+class UnitEntry:
+    """One indexed unit: the API dict plus the raw values used for filtering and ordering"""
+
+    __slots__ = ("record", "available_at", "updated_at", "sort_key")
+
+    def __init__(self, row):
+        self.record = {
+            'unit_id': str(row.unit_id),
+            'community_id': str(row.community_id),
+            'unit_code': row.unit_code,
+            'bedrooms': row.bedrooms,
+            'bathrooms': float(row.bathrooms),
+            'rent': float(row.rent),
+            'specials': row.specials,
+            'availability_status': row.availability_status,
+            'available_at': row.available_at.isoformat() if row.available_at else None,
+            'community_name': row.community_name,
+        }
+        self.available_at = row.available_at
+        self.updated_at = row.updated_at
+        # ORDER BY u.rent ASC, u.unit_code ASC
+        self.sort_key = (self.record['rent'], row.unit_code)
+
+    @property
+    def search_key(self) -> Tuple[str, int, str]:
+        return (self.record['community_id'], self.record['bedrooms'], self.record['availability_status'])
+
+    @property
+    def code_key(self) -> Tuple[str, str]:
+        return (self.record['community_id'], self.record['unit_code'])
+
+
+class _Snapshot:
+    """Immutable view of the inventory"""
+
+    __slots__ = ("units", "by_search", "by_code", "by_community")
+
+    def __init__(self, units: Dict[str, UnitEntry]):
+        self.units = units
+        by_search: Dict[Tuple[str, int, str], List[UnitEntry]] = {}
+        by_code: Dict[Tuple[str, str], UnitEntry] = {}
+        by_community: Dict[str, List[UnitEntry]] = {}
+        for entry in units.values():
+            by_search.setdefault(entry.search_key, []).append(entry)
+            by_code[entry.code_key] = entry
+            by_community.setdefault(entry.record['community_id'], []).append(entry)
+        for entries in (*by_search.values(), *by_community.values()):
+            entries.sort(key=lambda entry: entry.sort_key)
+        self.by_search = by_search
+        self.by_code = by_code
+        self.by_community = by_community
+
+
+def _parse_move_in(move_in_date: str) -> datetime:
+    """'YYYY-MM-DD' (or an ISO timestamp) as an aware datetime; dates are taken as midnight UTC"""
+    value = datetime.fromisoformat(move_in_date)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class InventoryIndex:
+    """Process-wide inventory index with incremental refresh and consistency-lag metrics"""
+
+    def __init__(self, overlap: timedelta = timedelta(seconds=5)):
+        self.overlap = overlap
+        self._snapshot: Optional[_Snapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._watermark: Optional[datetime] = None
+        self.last_refresh: Optional[float] = None      # time.time() of the last successful poll/rebuild
+        self.last_full_load: Optional[float] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.changes_applied = 0
+        self.last_change_lag: Optional[float] = None   # Seconds from a row's updated_at to it being served
+        self.max_change_lag = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    # -- Loading --------------------------------------------------------------
+
+    def load(self, db: Session) -> int:
+        """Build the index from scratch; returns the number of units"""
+        rows = db.execute(FULL_INVENTORY_QUERY).fetchall()
+        units = {str(row.unit_id): UnitEntry(row) for row in rows}
+        with self._refresh_lock:
+            self._snapshot = _Snapshot(units)
+            self._watermark = max((entry.updated_at for entry in units.values()), default=None)
+            self.last_refresh = self.last_full_load = time.time()
+        return len(units)
+
+    def refresh(self, db: Session) -> int:
+        """Apply units changed since the last watermark; returns the number of rows applied"""
+        if not self.ready:
+            return self.load(db)
+        since = self._watermark - self.overlap if self._watermark else datetime(1970, 1, 1, tzinfo=timezone.utc)
+        try:
+            rows = db.execute(CHANGED_INVENTORY_QUERY, {"since": since}).fetchall()
+        except Exception:
+            self.refresh_errors += 1
+            raise
+        self.apply(rows)
+        return len(rows)
+
+    def apply(self, rows) -> None:
+        """Merge changed rows into a new snapshot"""
+        now = time.time()
+        with self._refresh_lock:
+            changed = [UnitEntry(row) for row in rows]
+            current = self._snapshot.units
+            # Overlapping polls return rows we already hold; only rebuild on a real change
+            changed = [entry for entry in changed if self._differs(current.get(entry.record['unit_id']), entry)]
+            if changed:
+                units = dict(current)
+                for entry in changed:
+                    units[entry.record['unit_id']] = entry
+                    if entry.updated_at is not None:
+                        lag = max(now - entry.updated_at.timestamp(), 0.0)
+                        self.last_change_lag = lag
+                        self.max_change_lag = max(self.max_change_lag, lag)
+                self._snapshot = _Snapshot(units)
+                self.changes_applied += len(changed)
+            newest = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+            if newest is not None and (self._watermark is None or newest > self._watermark):
+                self._watermark = newest
+            self.last_refresh = now
+            self.refreshes += 1
+
+    @staticmethod
+    def _differs(old: Optional[UnitEntry], new: UnitEntry) -> bool:
+        return old is None or old.updated_at != new.updated_at or old.record != new.record
+
+    # -- Queries ------------------------------------------------------------
+
+    def available_units(self, community_id: str, bedrooms: int, move_in_date: Optional[str] = None) -> List[dict]:
+        """Same result as the availability SQL: available units, plus notice units free by move_in_date"""
+        snapshot = self._snapshot
+        matches = snapshot.by_search.get((community_id, bedrooms, "available"), [])
+        if move_in_date:
+            move_in = _parse_move_in(move_in_date)
+            on_notice = [
+                entry for entry in snapshot.by_search.get((community_id, bedrooms, "notice"), ())
+                if entry.available_at is not None and entry.available_at <= move_in
+            ]
+            if on_notice:
+                matches = sorted(matches + on_notice, key=lambda entry: entry.sort_key)
+        return [dict(entry.record) for entry in matches]
+
+    def search(
+        self,
+        community_id: str,
+        bedrooms: Optional[int] = None,
+        unit_codes: Optional[Sequence[str]] = None,
+        min_rent: Optional[float] = None,
+        max_rent: Optional[float] = None,
+        min_bathrooms: Optional[float] = None,
+        move_in_date: Optional[str] = None,
+    ) -> List[dict]:
+        """Same result as the unit search SQL (see unit_search.py)"""
+        snapshot = self._snapshot
+        if unit_codes:
+            entries = [snapshot.by_code.get((community_id, code)) for code in set(unit_codes)]
+            entries = sorted((entry for entry in entries if entry is not None), key=lambda entry: entry.sort_key)
+        else:
+            move_in = _parse_move_in(move_in_date) if move_in_date else None
+            entries = [
+                entry for entry in snapshot.by_community.get(community_id, ())
+                if entry.record['availability_status'] == "available"
+                or (move_in is not None and entry.record['availability_status'] == "notice"
+                    and entry.available_at is not None and entry.available_at <= move_in)
+            ]
+        return [
+            dict(entry.record) for entry in entries
+            if (bedrooms is None or entry.record['bedrooms'] == bedrooms)
+            and (min_rent is None or entry.record['rent'] >= min_rent)
+            and (max_rent is None or entry.record['rent'] <= max_rent)
+            and (min_bathrooms is None or entry.record['bathrooms'] >= min_bathrooms)
+        ]
+
+    def unit(self, community_id: str, unit_code: str) -> Optional[dict]:
+        """One unit by its code, or None if the community has no such unit"""
+        entry = self._snapshot.by_code.get((community_id, unit_code))
+        return dict(entry.record) if entry else None
+
+    # -- Metrics --------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        now = time.time()
+        return {
+            "ready": snapshot is not None,
+            "units": len(snapshot.units) if snapshot else 0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "changes_applied": self.changes_applied,
+            # Upper bound on how stale the index may be: time since the last successful poll
+            "staleness_seconds": round(now - self.last_refresh, 3) if self.last_refresh else None,
+            "last_change_lag_seconds": round(self.last_change_lag, 3) if self.last_change_lag is not None else None,
+            "max_change_lag_seconds": round(self.max_change_lag, 3),
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "last_full_load_age_seconds": round(now - self.last_full_load, 3) if self.last_full_load else None,
+        }
+
+
+# Global index; loaded and refreshed by the app lifespan (see app.py)
+inventory_index = InventoryIndex()
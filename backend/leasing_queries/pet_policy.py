@@ -3,12 +3,14 @@ Pet Policy Database Queries
 
 Handles pet policy lookups from community_policies table.
 Designed for AI agent tool integration with clean JSON responses.
+Policies are read through policy_cache (see policies.py).
 """
 
 from typing import Optional
-from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .policies import get_policy, get_policy_async
 
 
 def get_pet_policy(db: Session, community_id: str) -> Optional[dict]:
@@ -23,9 +25,9 @@ def get_pet_policy(db: Session, community_id: str) -> Optional[dict]:
     Returns:
         Dict containing the complete pet policy rules or None if not found
     
-    SQL Logic:
-        1. Query community_policies table directly with string identifier
-        2. Return the complete rules JSON blob
+    Lookup Logic:
+        1. Load all of the community's policies (cached after the first call)
+        2. Return the complete pet rules JSON blob
     
     Example JSON structure returned:
         {
@@ -35,32 +37,23 @@ def get_pet_policy(db: Session, community_id: str) -> Optional[dict]:
         }
     """
     
-    # Direct query using string identifier (no UUID lookup needed after migration)
-    policy_query = text("""
-        -- Pet Policy Query - Return complete JSON
-        SELECT 
-            cp.community_id,
-            cp.rules as pet_policy
-        FROM community_policies cp
-        WHERE cp.community_id = :community_id
-            AND cp.policy_type = 'pet'
-        LIMIT 1;
-    """)
-    
-    try:
-        result = db.execute(policy_query, {'community_id': community_id}).fetchone()
-        
-        if not result:
-            return None
-            
-        return {
-            'community_id': community_id,
-            'pet_policy': result.pet_policy  # This is the raw JSON blob
-        }
-        
-    except Exception as e:
-        # Log error in production
-        print(f"Error getting pet policy: {e}")
+    rules = get_policy(db, community_id, 'pet')
+    if rules is None:
         return None
+    
+    return {
+        'community_id': community_id,
+        'pet_policy': rules  # This is the raw JSON blob
+    }
 
 
+async def get_pet_policy_async(db: AsyncSession, community_id: str) -> Optional[dict]:
+    """Async version of get_pet_policy for AsyncSession"""
+    rules = await get_policy_async(db, community_id, 'pet')
+    if rules is None:
+        return None
+    
+    return {
+        'community_id': community_id,
+        'pet_policy': rules
+    }
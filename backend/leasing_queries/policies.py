@@ -0,0 +1,69 @@
+"""
+Community Policy Database Queries
+
+Loads every policy of a community ('pet', 'smoking', 'parking') in one query,
+through the process-wide policy_cache: a cached community is answered without
+touching the database.
+"""
+
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+
+from cache import CommunityPolicies, policy_cache
+
+
+COMMUNITY_POLICIES_QUERY = text("""
+    -- All active policies of a community (one row per policy_type)
+    SELECT 
+        cp.policy_type,
+        cp.rules
+    FROM community_policies cp
+    WHERE cp.community_id = :community_id;
+""")
+
+
+def get_community_policies(db: Session, community_id: str) -> CommunityPolicies:
+    """
+    Get every policy of a community, from the cache or the database.
+    
+    Args:
+        db: Database session (not used on a cache hit)
+        community_id: Community identifier string (e.g., 'sunset-ridge')
+    
+    Returns:
+        CommunityPolicies; .rules is empty for a community without policies
+    """
+    cached = policy_cache.get(community_id)
+    if cached is not None:
+        return cached
+    results = db.execute(COMMUNITY_POLICIES_QUERY, {'community_id': community_id}).fetchall()
+    return policy_cache.put(community_id, {row.policy_type: row.rules for row in results})
+
+
+async def get_community_policies_async(db: AsyncSession, community_id: str) -> CommunityPolicies:
+    """Async version of get_community_policies for AsyncSession"""
+    cached = policy_cache.get(community_id)
+    if cached is not None:
+        return cached
+    results = (await db.execute(COMMUNITY_POLICIES_QUERY, {'community_id': community_id})).fetchall()
+    return policy_cache.put(community_id, {row.policy_type: row.rules for row in results})
+
+
+def get_policy(db: Session, community_id: str, policy_type: str) -> Optional[dict]:
+    """Raw rules JSON of one policy type ('pet', 'smoking', 'parking'), or None if the community has none"""
+    try:
+        return get_community_policies(db, community_id).rules.get(policy_type)
+    except Exception as e:
+        print(f"Error getting {policy_type} policy: {e}")
+        return None
+
+
+async def get_policy_async(db: AsyncSession, community_id: str, policy_type: str) -> Optional[dict]:
+    """Async version of get_policy for AsyncSession"""
+    try:
+        return (await get_community_policies_async(db, community_id)).rules.get(policy_type)
+    except Exception as e:
+        print(f"Error getting {policy_type} policy: {e}")
+        return None
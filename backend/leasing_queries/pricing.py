@@ -8,8 +8,48 @@ Returns raw JSON data for LLM processing.
 from typing import Optional
 from uuid import UUID
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
+from .inventory import inventory_index
+
+
+PRICING_QUERY = text("""
+    -- Get unit pricing data with community validation
+    SELECT 
+        u.unit_id,
+        u.community_id,
+        u.unit_code,
+        u.bedrooms,
+        u.bathrooms,
+        u.rent,
+        u.specials,
+        u.availability_status,
+        u.available_at,
+        c.name as community_name
+
+    FROM units u
+    INNER JOIN communities c ON u.community_id = c.community_id
+    WHERE u.unit_code = :unit_code
+        AND u.community_id = :community_id
+    LIMIT 1;
+""")
+
+
+def _pricing_from_row(result) -> dict:
+    return {
+        'unit_id': str(result.unit_id),
+        'community_id': str(result.community_id),
+        'unit_code': result.unit_code,
+        'bedrooms': result.bedrooms,
+        'bathrooms': float(result.bathrooms),
+        'rent': float(result.rent),
+        'specials': result.specials,
+        'availability_status': result.availability_status,
+        'available_at': result.available_at.isoformat() if result.available_at else None,
+        'community_name': result.community_name,
+    }
+
 
 def get_pricing(db: Session, community_id: str, unit_id: str, move_in_date: str = None) -> Optional[dict]:
     """
@@ -24,53 +64,38 @@ def get_pricing(db: Session, community_id: str, unit_id: str, move_in_date: str
     
     Returns:
         Dict with complete unit pricing data or None if unit not found in community
+
+    Served from the in-memory inventory index once it is loaded.
     """
-    
-    query = text("""
-        -- Get unit pricing data with community validation
-        SELECT 
-            u.unit_id,
-            u.community_id,
-            u.unit_code,
-            u.bedrooms,
-            u.bathrooms,
-            u.rent,
-            u.specials,
-            u.availability_status,
-            u.available_at,
-            c.name as community_name
-            
-        FROM units u
-        INNER JOIN communities c ON u.community_id = c.community_id
-        WHERE u.unit_code = :unit_code
-            AND u.community_id = :community_id
-        LIMIT 1;
-    """)
-    
+    if inventory_index.ready:
+        return inventory_index.unit(community_id, unit_id)
+
     try:
-        result = db.execute(query, {
+        result = db.execute(PRICING_QUERY, {
             'unit_code': unit_id,  # unit_id parameter is actually the unit_code
             'community_id': community_id
         }).fetchone()
         
-        if not result:
-            return None
-            
-        return {
-            'unit_id': str(result.unit_id),
-            'community_id': str(result.community_id),
-            'unit_code': result.unit_code,
-            'bedrooms': result.bedrooms,
-            'bathrooms': float(result.bathrooms),
-            'rent': float(result.rent),
-            'specials': result.specials,
-            'availability_status': result.availability_status,
-            'available_at': result.available_at.isoformat() if result.available_at else None,
-            'community_name': result.community_name,
-        }
+        return _pricing_from_row(result) if result else None
         
     except Exception as e:
         print(f"Error getting pricing: {e}")
         return None
 
 
+async def get_pricing_async(db: AsyncSession, community_id: str, unit_id: str, move_in_date: str = None) -> Optional[dict]:
+    """Async version of get_pricing for AsyncSession"""
+    if inventory_index.ready:
+        return inventory_index.unit(community_id, unit_id)
+
+    try:
+        result = (await db.execute(PRICING_QUERY, {
+            'unit_code': unit_id,
+            'community_id': community_id
+        })).fetchone()
+        
+        return _pricing_from_row(result) if result else None
+        
+    except Exception as e:
+        print(f"Error getting pricing: {e}")
+        return None
@@ -5,37 +5,18 @@ Handles unit availability lookups based on community, bedrooms, and move-in date
 Designed for AI agent tool integration with clean JSON responses.
 """
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 
+from .inventory import inventory_index
 
-def get_available_units(
-    db: Session, 
-    community_id: str, 
-    bedrooms: int, 
-    move_in_date: str = None
-) -> List[dict]:
-    """
-    Get available units for a community matching bedroom count and move-in date.
-    
-    Args:
-        db: Database session
-        community_id: Community identifier string (e.g., 'sunset-ridge')
-        bedrooms: Number of bedrooms required
-        move_in_date: Desired move-in date (YYYY-MM-DD format), optional
-    
-    Returns:
-        List of available units with complete details, or None if error
-        
-    Business Logic:
-        - 'available': Units ready immediately
-        - 'notice': Units where tenant gave notice, available at 'available_at' date
-        - Only show 'notice' units if available_at <= move_in_date
-        - Exclude 'occupied' and 'offline' units
-    """
-    
+
+def _availability_query(community_id: str, bedrooms: int, move_in_date: Optional[str]) -> Tuple[TextClause, dict]:
+    """Build the availability query and its parameters"""
     # Base query for available units
     query_conditions = [
         "u.community_id = :community_id",
@@ -79,28 +60,79 @@ def get_available_units(
         ORDER BY u.rent ASC, u.unit_code ASC;
     """)
     
+    return query, query_params
+
+
+def _unit_from_row(result) -> dict:
+    return {
+        'unit_id': str(result.unit_id),
+        'community_id': str(result.community_id),
+        'unit_code': result.unit_code,
+        'bedrooms': result.bedrooms,
+        'bathrooms': float(result.bathrooms),
+        'rent': float(result.rent),
+        'specials': result.specials,
+        'availability_status': result.availability_status,
+        'available_at': result.available_at.isoformat() if result.available_at else None,
+        'community_name': result.community_name,
+    }
+
+
+def get_available_units(
+    db: Session, 
+    community_id: str, 
+    bedrooms: int, 
+    move_in_date: str = None
+) -> List[dict]:
+    """
+    Get available units for a community matching bedroom count and move-in date.
+    
+    Args:
+        db: Database session
+        community_id: Community identifier string (e.g., 'sunset-ridge')
+        bedrooms: Number of bedrooms required
+        move_in_date: Desired move-in date (YYYY-MM-DD format), optional
+    
+    Returns:
+        List of available units with complete details, or None if error
+        
+    Business Logic:
+        - 'available': Units ready immediately
+        - 'notice': Units where tenant gave notice, available at 'available_at' date
+        - Only show 'notice' units if available_at <= move_in_date
+        - Exclude 'occupied' and 'offline' units
+
+    Served from the in-memory inventory index once it is loaded.
+    """
+    if inventory_index.ready:
+        return inventory_index.available_units(community_id, bedrooms, move_in_date)
+
+    query, query_params = _availability_query(community_id, bedrooms, move_in_date)
+    
     try:
         results = db.execute(query, query_params).fetchall()
+        return [_unit_from_row(result) for result in results]
         
-        if not results:
-            return []
-            
-        units = []
-        for result in results:
-            units.append({
-                'unit_id': str(result.unit_id),
-                'community_id': str(result.community_id),
-                'unit_code': result.unit_code,
-                'bedrooms': result.bedrooms,
-                'bathrooms': float(result.bathrooms),
-                'rent': float(result.rent),
-                'specials': result.specials,
-                'availability_status': result.availability_status,
-                'available_at': result.available_at.isoformat() if result.available_at else None,
-                'community_name': result.community_name,
-            })
-            
-        return units
+    except Exception as e:
+        print(f"Error getting available units: {e}")
+        return None
+
+
+async def get_available_units_async(
+    db: AsyncSession, 
+    community_id: str, 
+    bedrooms: int, 
+    move_in_date: str = None
+) -> List[dict]:
+    """Async version of get_available_units for AsyncSession"""
+    if inventory_index.ready:
+        return inventory_index.available_units(community_id, bedrooms, move_in_date)
+
+    query, query_params = _availability_query(community_id, bedrooms, move_in_date)
+    
+    try:
+        results = (await db.execute(query, query_params)).fetchall()
+        return [_unit_from_row(result) for result in results]
         
     except Exception as e:
         print(f"Error getting available units: {e}")
@@ -0,0 +1,156 @@
+"""
+Unit Search Database Queries
+
+Availability and pricing in one query: matching units with rent, specials and
+available_at, filtered by bedrooms, rent range, bathrooms or an explicit list
+of unit codes. Answers "what 2 bedrooms are under $2,000" or "how much are
+B201 and B202" in a single tool call instead of check_availability plus one
+get_pricing per unit.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import bindparam, text
+from sqlalchemy.sql.elements import TextClause
+
+from .inventory import inventory_index
+from .unit_availability import _unit_from_row
+
+
+def _search_query(
+    community_id: str,
+    bedrooms: Optional[int] = None,
+    unit_codes: Optional[Sequence[str]] = None,
+    min_rent: Optional[float] = None,
+    max_rent: Optional[float] = None,
+    min_bathrooms: Optional[float] = None,
+    move_in_date: Optional[str] = None,
+) -> Tuple[TextClause, dict]:
+    """Build the search query and its parameters"""
+    query_conditions = ["u.community_id = :community_id"]
+    query_params = {'community_id': community_id}
+    
+    if unit_codes:
+        # Named units are returned whatever their status, like get_pricing
+        query_conditions.append("u.unit_code IN :unit_codes")
+        query_params['unit_codes'] = list(unit_codes)
+    elif move_in_date:
+        # Otherwise the same listing rule as get_available_units
+        query_conditions.append("""
+            (u.availability_status = 'available'
+             OR (u.availability_status = 'notice' AND u.available_at <= :move_in_date))
+        """)
+        query_params['move_in_date'] = move_in_date
+    else:
+        query_conditions.append("u.availability_status = 'available'")
+    
+    if bedrooms is not None:
+        query_conditions.append("u.bedrooms = :bedrooms")
+        query_params['bedrooms'] = bedrooms
+    if min_rent is not None:
+        query_conditions.append("u.rent >= :min_rent")
+        query_params['min_rent'] = min_rent
+    if max_rent is not None:
+        query_conditions.append("u.rent <= :max_rent")
+        query_params['max_rent'] = max_rent
+    if min_bathrooms is not None:
+        query_conditions.append("u.bathrooms >= :min_bathrooms")
+        query_params['min_bathrooms'] = min_bathrooms
+    
+    query = text(f"""
+        -- Search units with pricing and community validation
+        SELECT 
+            u.unit_id,
+            u.community_id,
+            u.unit_code,
+            u.bedrooms,
+            u.bathrooms,
+            u.rent,
+            u.specials,
+            u.availability_status,
+            u.available_at,
+            c.name as community_name
+            
+        FROM units u
+        INNER JOIN communities c ON u.community_id = c.community_id
+        WHERE {' AND '.join(query_conditions)}
+        ORDER BY u.rent ASC, u.unit_code ASC;
+    """)
+    if unit_codes:
+        query = query.bindparams(bindparam('unit_codes', expanding=True))
+    
+    return query, query_params
+
+
+def search_units(
+    db: Session,
+    community_id: str,
+    bedrooms: Optional[int] = None,
+    unit_codes: Optional[Sequence[str]] = None,
+    min_rent: Optional[float] = None,
+    max_rent: Optional[float] = None,
+    min_bathrooms: Optional[float] = None,
+    move_in_date: Optional[str] = None,
+) -> List[dict]:
+    """
+    Search a community's units, with pricing, in one query.
+    
+    Args:
+        db: Database session
+        community_id: Community identifier string (e.g., 'sunset-ridge')
+        bedrooms: Exact bedroom count, optional
+        unit_codes: Specific unit codes (e.g., ['B201', 'B202']), optional
+        min_rent / max_rent: Monthly rent range, optional
+        min_bathrooms: Minimum bathroom count, optional
+        move_in_date: Desired move-in date (YYYY-MM-DD format), optional
+    
+    Returns:
+        Matching units sorted by rent, or None if error
+        
+    Business Logic:
+        - Without unit_codes: listed units only, as in get_available_units
+        - With unit_codes: those units whatever their status
+        - Served from the in-memory inventory index once it is loaded
+    """
+    filters = dict(bedrooms=bedrooms, unit_codes=unit_codes, min_rent=min_rent, max_rent=max_rent,
+                   min_bathrooms=min_bathrooms, move_in_date=move_in_date)
+    if inventory_index.ready:
+        return inventory_index.search(community_id, **filters)
+    
+    query, query_params = _search_query(community_id, **filters)
+    
+    try:
+        results = db.execute(query, query_params).fetchall()
+        return [_unit_from_row(result) for result in results]
+        
+    except Exception as e:
+        print(f"Error searching units: {e}")
+        return None
+
+
+async def search_units_async(
+    db: AsyncSession,
+    community_id: str,
+    bedrooms: Optional[int] = None,
+    unit_codes: Optional[Sequence[str]] = None,
+    min_rent: Optional[float] = None,
+    max_rent: Optional[float] = None,
+    min_bathrooms: Optional[float] = None,
+    move_in_date: Optional[str] = None,
+) -> List[dict]:
+    """Async version of search_units for AsyncSession"""
+    filters = dict(bedrooms=bedrooms, unit_codes=unit_codes, min_rent=min_rent, max_rent=max_rent,
+                   min_bathrooms=min_bathrooms, move_in_date=move_in_date)
+    if inventory_index.ready:
+        return inventory_index.search(community_id, **filters)
+    
+    query, query_params = _search_query(community_id, **filters)
+    
+    try:
+        results = (await db.execute(query, query_params)).fetchall()
+        return [_unit_from_row(result) for result in results]
+        
+    except Exception as e:
+        print(f"Error searching units: {e}")
+        return None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Enum, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Boolean, Enum, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -42,6 +42,21 @@ class Message(Base):
     # Timestamp
     created_date = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    # Fetch created_date with INSERT ... RETURNING instead of a SELECT on first access
+    # (async sessions can't lazy-load it after commit)
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Per-user timeline, newest first, for keyset pagination (database/scripts/init/08-*.sql).
+    # The table itself is partitioned by month of created_date (09-*.sql); its
+    # primary key there is (id, created_date), which the ORM doesn't need to know.
+    __table_args__ = (
+        Index("idx_messages_user_timeline", user_id, created_date.desc(), id.desc()),
+        Index(
+            "idx_messages_user_visible_timeline", user_id, created_date.desc(), id.desc(),
+            postgresql_where=visible_to_user,
+        ),
+    )
+
     def to_dict(self):
         return {
             "id": str(self.id),  # Convert UUID to string for JSON serialization
@@ -77,6 +92,8 @@ class User(Base):
     # Timestamp matching existing schema
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __mapper_args__ = {"eager_defaults": True}
+
     def to_dict(self):
         """Convert user to dictionary for JSON serialization"""
         return {
@@ -0,0 +1,63 @@
+"""
+Message Persistence Module
+
+Writes chat turns (user upsert + user message + assistant message) to
+Postgres in one transaction each. The writer is chosen through the environment:
+- MESSAGE_PERSISTENCE_MODE=turn (default): one transaction per turn, per request
+- MESSAGE_PERSISTENCE_MODE=group: group commit across concurrent requests
+  (GROUP_COMMIT_MAX_BATCH turns or GROUP_COMMIT_MAX_DELAY_MS, whichever first)
+- MESSAGE_PERSISTENCE_MODE=write_behind: turns are acknowledged once fsynced
+  to MESSAGE_JOURNAL_PATH and drained to Postgres in the background
+
+The messages table is partitioned by month; partitions.py creates future
+months and archives expired ones.
+"""
+
+import os
+
+from .journal import TurnJournal
+from .partitions import MessagePartition, archive_expired_partitions, ensure_future_partitions, list_partitions
+from .turns import Turn, message_row, new_message, write_turns
+from .writers import GroupCommitWriter, TurnWriter, WriteBehindWriter, WriterStats
+
+
+def create_writer_from_env() -> TurnWriter:
+    """Build the turn writer configured by MESSAGE_PERSISTENCE_* environment variables"""
+    mode = os.getenv("MESSAGE_PERSISTENCE_MODE", "turn").lower()
+    if mode == "turn":
+        return TurnWriter()
+    if mode == "group":
+        return GroupCommitWriter(
+            max_batch=int(os.getenv("GROUP_COMMIT_MAX_BATCH", "200")),
+            max_delay=float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5")) / 1000,
+        )
+    if mode == "write_behind":
+        return WriteBehindWriter(
+            journal_path=os.getenv("MESSAGE_JOURNAL_PATH", "message_journal.jsonl"),
+            fsync_interval=float(os.getenv("MESSAGE_JOURNAL_FSYNC_MS", "5")) / 1000,
+            drain_batch=int(os.getenv("WRITE_BEHIND_BATCH", "500")),
+            drain_interval=float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50")) / 1000,
+        )
+    raise ValueError(f"Unknown MESSAGE_PERSISTENCE_MODE: {mode!r} (expected 'turn', 'group' or 'write_behind')")
+
+
+# Global writer instance, started and stopped by the app lifespan
+turn_writer = create_writer_from_env()
+
+__all__ = [
+    'GroupCommitWriter',
+    'MessagePartition',
+    'Turn',
+    'TurnJournal',
+    'TurnWriter',
+    'WriteBehindWriter',
+    'WriterStats',
+    'archive_expired_partitions',
+    'create_writer_from_env',
+    'ensure_future_partitions',
+    'list_partitions',
+    'message_row',
+    'new_message',
+    'turn_writer',
+    'write_turns',
+]
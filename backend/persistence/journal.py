@@ -0,0 +1,129 @@
+"""
+Write-Behind Turn Journal
+
+An append-only JSON-lines file that makes a turn durable before it reaches
+Postgres. Each turn is one {"seq": n, "turn": {...}} line; once a batch is in
+the database a {"committed": [n, ...]} line is appended. On startup every turn
+without a commit marker is handed back for replay, and the file is rewritten
+to hold only those turns.
+
+Appends only reach the page cache; sync() flushes and fsyncs everything
+written so far, so the writer can make many turns durable with one fsync.
+
+A turn the database keeps rejecting is moved to a dead-letter file next to
+the journal (<path>.dead, one {"seq", "turn", "error"} line each) and marked
+committed, so it can be inspected and replayed by hand.
+"""
+
+import json
+import os
+import threading
+from typing import List, Tuple
+
+from .turns import Turn
+
+
+class TurnJournal:
+    """Append-only, batch-fsynced log of turns not yet known to be in the database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._next_seq = 1
+        self._lock = threading.Lock()       # File writes and reopen
+        self._sync_lock = threading.Lock()  # One fsync at a time; rewrite waits for it
+        self._bytes = 0                     # Size, readable without waiting for a rewrite
+        self.fsyncs = 0
+        self.dead_letter_path = f"{path}.dead"
+
+    def open(self) -> List[Tuple[int, Turn]]:
+        """Open the journal, returning the turns that were never marked committed (oldest first)"""
+        pending = self._read_pending()
+        self._next_seq = max((seq for seq, _ in pending), default=0) + 1
+        self.rewrite(pending)
+        return pending
+
+    def _read_pending(self) -> List[Tuple[int, Turn]]:
+        if not os.path.exists(self.path):
+            return []
+        turns, committed = {}, set()
+        with open(self.path, "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; it was never acknowledged
+                    print(f"Warning: Skipping unreadable journal line {line_number} in {self.path}")
+                    continue
+                if "committed" in record:
+                    committed.update(record["committed"])
+                else:
+                    turns[record["seq"]] = record["turn"]
+        return [(seq, Turn.from_record(turn)) for seq, turn in sorted(turns.items()) if seq not in committed]
+
+    def append(self, turn: Turn) -> int:
+        """Write a turn to the journal (not yet durable; see sync) and return its sequence number"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._write_line({"seq": seq, "turn": turn.to_record()})
+        return seq
+
+    def mark_committed(self, seqs: List[int]):
+        """Record that these turns are in the database (fsynced with the next batch)"""
+        with self._lock:
+            self._write_line({"committed": seqs})
+
+    def dead_letter(self, seq: int, turn: Turn, error: str):
+        """
+        Move a turn the database rejected to the dead-letter file (fsynced),
+        then mark it committed. Blocking; run it off the event loop.
+        """
+        record = {"seq": seq, "turn": turn.to_record(), "error": error}
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.mark_committed([seq])
+
+    def _write_line(self, record):
+        self._bytes += self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+    def sync(self):
+        """Make everything appended so far durable (blocking; run it off the event loop)"""
+        with self._sync_lock:
+            with self._lock:
+                self._file.flush()
+                fd = self._file.fileno()
+            os.fsync(fd)
+            self.fsyncs += 1
+
+    def rewrite(self, pending: List[Tuple[int, Turn]]):
+        """
+        Replace the journal with only the given pending turns (atomic rename).
+        Blocking; the caller must make sure no appends happen concurrently.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with self._sync_lock, self._lock:
+            with open(tmp_path, "wb") as tmp:
+                for seq, turn in pending:
+                    tmp.write(json.dumps({"seq": seq, "turn": turn.to_record()}, separators=(",", ":")).encode() + b"\n")
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            if self._file is not None:
+                self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "ab")
+            self._bytes = self._file.tell()
+
+    def size(self) -> int:
+        """Current journal size in bytes"""
+        return self._bytes if self._file is not None else 0
+
+    def close(self):
+        with self._sync_lock, self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
@@ -0,0 +1,145 @@
+"""
+Monthly Message Partitions
+
+messages is range-partitioned by month of created_date, one table per month
+named messages_yYYYYmMM (database/scripts/init/09-*.sql). Inserts only touch
+the current month's indexes, and expired months leave by detaching a whole
+partition instead of DELETE + VACUUM, so index size and write cost track one
+month of traffic however large the history grows.
+
+- ensure_future_partitions creates the next months ahead of time (rows with no
+  partition for their month are rejected), at API startup and from
+  scripts/manage_message_partitions.py
+- archive_expired_partitions detaches months older than the retention window,
+  exports each one to a gzipped CSV, checks the row count and drops it
+"""
+
+import csv
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+ENSURE_PARTITIONS_QUERY = text("SELECT create_message_partitions('messages', :from_month, :through_month)")
+
+PARTITIONS_QUERY = text("""
+    SELECT c.relname AS name, i.inhrelid IS NOT NULL AS attached
+    FROM pg_class c
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'messages'::regclass
+    WHERE c.relkind = 'r'
+        AND c.relnamespace = current_schema()::regnamespace
+        AND c.relname ~ '^messages_y[0-9]{4}m[0-9]{2}$'
+    ORDER BY c.relname;
+""")
+
+
+class MessagePartition(NamedTuple):
+    name: str
+    month: date       # First day of the month the partition holds
+    attached: bool    # False once detached (e.g. an archive run that stopped before dropping it)
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month `months` after (or before) month"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+
+def _this_month(today: Optional[date]) -> date:
+    today = today or datetime.now(timezone.utc).date()
+    return today.replace(day=1)
+
+
+def ensure_future_partitions(connection: Connection, months_ahead: int = 3, today: Optional[date] = None) -> int:
+    """Create this month's partition and the next months_ahead; returns how many were new"""
+    this_month = _this_month(today)
+    created = connection.execute(ENSURE_PARTITIONS_QUERY, {
+        "from_month": this_month,
+        "through_month": add_months(this_month, months_ahead),
+    }).scalar()
+    connection.commit()
+    return created or 0
+
+
+def list_partitions(connection: Connection) -> List[MessagePartition]:
+    """Monthly partitions, attached or detached, oldest first"""
+    partitions = []
+    for row in connection.execute(PARTITIONS_QUERY):
+        match = PARTITION_NAME.match(row.name)
+        partitions.append(MessagePartition(row.name, date(int(match[1]), int(match[2]), 1), row.attached))
+    return partitions
+
+
+def expired_partitions(partitions: List[MessagePartition], retain_months: int, today: Optional[date] = None) -> List[MessagePartition]:
+    """Partitions entirely older than the last retain_months months (the current month counts)"""
+    cutoff = add_months(_this_month(today), -(retain_months - 1))
+    return [partition for partition in partitions if partition.month < cutoff]
+
+
+def export_partition(connection: Connection, name: str, out_dir: str) -> Dict[str, Any]:
+    """
+    COPY one partition to <out_dir>/<name>.csv.gz (with a header row).
+    The file is written under a temporary name, fsynced and renamed, then read
+    back to count its rows, so a partial export is never mistaken for a complete one.
+    """
+    if not PARTITION_NAME.match(name):
+        raise ValueError(f"Not a message partition: {name!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}.csv.gz")
+    tmp_path = f"{path}.tmp"
+
+    expected = connection.execute(text(f'SELECT COUNT(*) FROM "{name}"')).scalar()
+    dbapi_connection = connection.connection.driver_connection
+    with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as out:
+        with dbapi_connection.cursor() as cursor:
+            copy_sql = f'COPY (SELECT * FROM "{name}" ORDER BY created_date, id) TO STDOUT WITH (FORMAT csv, HEADER)'
+            with cursor.copy(copy_sql) as copy:
+                for chunk in copy:
+                    out.write(chunk)
+        out.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+    with gzip.open(path, "rt", newline="") as exported:
+        rows = sum(1 for _ in csv.reader(exported)) - 1
+    if rows != expected:
+        raise RuntimeError(f"Exported {rows} rows from {name}, expected {expected}; keeping the partition")
+    return {"partition": name, "path": path, "rows": rows, "bytes": os.path.getsize(path)}
+
+
+def archive_expired_partitions(
+    engine: Engine,
+    out_dir: str,
+    retain_months: int = 12,
+    drop: bool = True,
+    today: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Detach, export and (optionally) drop every expired partition.
+
+    Partitions are detached CONCURRENTLY, so reads and writes on messages
+    carry on. A run that fails after detaching leaves the partition detached
+    and intact; the next run picks it up again.
+    """
+    # DETACH ... CONCURRENTLY can't run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        archived = []
+        for partition in expired_partitions(list_partitions(connection), retain_months, today):
+            if partition.attached:
+                connection.execute(text(f'ALTER TABLE messages DETACH PARTITION "{partition.name}" CONCURRENTLY'))
+            result = export_partition(connection, partition.name, out_dir)
+            if drop:
+                connection.execute(text(f'DROP TABLE "{partition.name}"'))
+            archived.append({**result, "dropped": drop})
+        return archived
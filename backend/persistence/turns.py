@@ -0,0 +1,142 @@
+"""
+Chat Turn Unit of Work
+
+A Turn is everything one /api/reply call writes: the user upsert, the user
+message and the assistant message. Messages get their ids and timestamps on
+the client, go into the cache straight away, and the whole turn is written
+later in one transaction (write_turns), so a turn costs one commit.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import CachedMessage, user_cache
+from cache.records import datetime_to_micros, micros_to_datetime
+from models import Message, StepEnum, User
+
+
+class Turn:
+    """One request's pending writes"""
+
+    __slots__ = ("user", "write_user", "messages")
+
+    def __init__(self, user: User, write_user: bool, messages: Optional[List[CachedMessage]] = None):
+        self.user = user                # Detached or transient User; user_id may be client-generated
+        self.write_user = write_user    # Upsert the user row (new user or changed name/preferences)
+        self.messages = messages or []
+
+    @property
+    def email(self) -> str:
+        return self.user.email
+
+    def to_record(self) -> Dict[str, Any]:
+        """JSON-safe encoding used by the write-behind journal"""
+        return {
+            "user": {
+                "user_id": self.user.user_id.hex,
+                "email": self.user.email,
+                "name": self.user.name,
+                "preferences": self.user.preferences or {},
+            },
+            "write_user": self.write_user,
+            "messages": [message.to_row() for message in self.messages],
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Turn":
+        user = record["user"]
+        return cls(
+            User(
+                user_id=uuid.UUID(user["user_id"]),
+                email=user["email"],
+                name=user["name"],
+                preferences=user["preferences"],
+            ),
+            record["write_user"],
+            [CachedMessage.from_row(row) for row in record["messages"]],
+        )
+
+
+def new_message(
+    role: str,
+    content: str,
+    user_id: uuid.UUID,
+    parent_id: Optional[uuid.UUID] = None,
+    message_id: Optional[uuid.UUID] = None,
+    visible_to_user: bool = True,
+) -> CachedMessage:
+    """Build a message with a client-side id and created_date, ready for the cache and the DB"""
+    return CachedMessage(
+        id=message_id or uuid.uuid4(),
+        role=role,
+        content=content,
+        visible_to_user=visible_to_user,
+        created_ts=datetime_to_micros(datetime.now(timezone.utc)),
+        parent_id=parent_id,
+        user_id=user_id,
+    )
+
+
+def message_row(message: CachedMessage, user_id: uuid.UUID) -> Dict[str, Any]:
+    """Column values for inserting a cached message into messages"""
+    return {
+        "id": message.id,
+        "message": message.message,
+        "role": message.role,
+        "visible_to_user": message.visible_to_user,
+        "step_id": StepEnum(message.step_id) if message.step_id else None,
+        "parent_id": message.parent_id,
+        "user_id": user_id,
+        "created_date": micros_to_datetime(message.created_ts),
+    }
+
+
+async def write_turns(db: AsyncSession, turns: List[Turn]) -> int:
+    """
+    Write any number of turns in one transaction: one multi-row user upsert,
+    one multi-row message INSERT and a single commit.
+
+    New users carry a client-generated user_id; if another request created the
+    same email first, the upsert's RETURNING gives the stored user_id and the
+    messages are attached to it.
+
+    Returns:
+        Number of messages written
+    """
+    # Last state wins when a batch holds several turns for one user
+    users = {turn.email: turn.user for turn in turns if turn.write_user}
+    user_ids = {turn.email: turn.user.user_id for turn in turns}
+
+    returned = []
+    if users:
+        statement = pg_insert(User).values([
+            {"user_id": user.user_id, "email": user.email, "name": user.name, "preferences": user.preferences or {}}
+            for user in users.values()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[User.email],
+            set_={
+                "name": statement.excluded.name,
+                # Merge in SQL so a stale view of the row can't drop keys written elsewhere
+                "preferences": func.coalesce(User.preferences, text("'{}'::jsonb")).op("||")(statement.excluded.preferences),
+            },
+        ).returning(User.email, User.user_id, User.name, User.preferences)
+        returned = (await db.execute(statement)).all()
+        for email, user_id, _, _ in returned:
+            user_ids[email] = user_id
+
+    rows = [message_row(message, user_ids[turn.email]) for turn in turns for message in turn.messages]
+    if rows:
+        # Ids and timestamps are client-generated, so a replayed turn (write-behind) is a no-op.
+        # No conflict target: the partitioned table's key is (id, created_date), see 09-*.sql
+        await db.execute(pg_insert(Message).values(rows).on_conflict_do_nothing())
+    await db.commit()
+
+    for email, user_id, name, preferences in returned:
+        user_cache.put(user_id, email, name, preferences)
+    return len(rows)
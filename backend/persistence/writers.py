@@ -0,0 +1,420 @@
+"""
+Turn Writers
+
+How a finished turn reaches Postgres:
+- TurnWriter: each request writes its own turn in one transaction
+- GroupCommitWriter: a background task collects turns from concurrent
+  requests and writes each batch with one multi-row INSERT and one commit;
+  every request still waits until its batch is committed
+- WriteBehindWriter: a request only waits for its turn to be fsynced to a
+  local journal; a background task drains the journal to Postgres in bulk
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import exc as sa_exc
+
+from cache import CachedMessage
+from models import User
+
+from .journal import TurnJournal
+from .turns import Turn, write_turns
+
+
+# Errors that say nothing about the turn itself: the database is unreachable or busy
+TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError, sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.TimeoutError)
+
+
+def is_transient(error: Exception) -> bool:
+    """True if a failed write is worth retrying as is"""
+    return isinstance(error, TRANSIENT_ERRORS) or getattr(error, "connection_invalidated", False)
+
+
+class WriterStats:
+    """Counters for a turn writer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.messages = 0
+        self.commits = 0
+        self.failures = 0
+        self.commit_seconds = 0.0
+
+    def record_commit(self, turns: int, messages: int, seconds: float):
+        with self._lock:
+            self.turns += turns
+            self.messages += messages
+            self.commits += 1
+            self.commit_seconds += seconds
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "messages": self.messages,
+                "commits": self.commits,
+                "failures": self.failures,
+                "turns_per_commit": round(self.turns / self.commits, 2) if self.commits else 0.0,
+                "avg_commit_ms": round(self.commit_seconds * 1000 / self.commits, 3) if self.commits else 0.0,
+            }
+
+
+class TurnWriter:
+    """Writes each turn in its own single transaction"""
+
+    mode = "turn"
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        if session_factory is None:
+            from globals.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        self._session_factory = session_factory
+        self.counters = WriterStats()
+
+    async def start(self):
+        """Start background work (none for this writer)"""
+
+    async def stop(self):
+        """Flush and stop background work (none for this writer)"""
+
+    async def submit(self, turn: Turn):
+        """Persist a turn; returns once it is committed"""
+        await self._write([turn])
+
+    def pending_messages(self, email: str) -> List[CachedMessage]:
+        """Messages accepted but not yet in the database (only write-behind has any)"""
+        return []
+
+    def pending_user(self, email: str) -> Optional[User]:
+        """Latest user state accepted but not yet in the database"""
+        return None
+
+    async def _write(self, turns: List[Turn]):
+        start = time.perf_counter()
+        try:
+            async with self._session_factory() as db:
+                messages = await write_turns(db, turns)
+        except Exception:
+            self.counters.record_failure()
+            raise
+        self.counters.record_commit(len(turns), messages, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, **self.counters.as_dict()}
+
+
+class GroupCommitWriter(TurnWriter):
+    """
+    Batches turns from concurrent requests into shared transactions.
+
+    The first queued turn opens a batch; the batch is written once it holds
+    max_batch turns or max_delay seconds have passed, whichever comes first.
+    If a batch fails, its turns are retried one by one so a single bad turn
+    only fails its own request.
+    """
+
+    mode = "group"
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable] = None,
+        max_batch: int = 200,
+        max_delay: float = 0.005,
+    ):
+        super().__init__(session_factory)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Let queued turns finish, then shut the loop down
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, turn: Turn):
+        if self._task is None:
+            # Not started (e.g. scripts): fall back to a direct write
+            await self._write([turn])
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((turn, future))
+        await future
+
+    async def _next_batch(self) -> List[Tuple[Turn, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[Turn, asyncio.Future]]):
+        try:
+            await self._write([turn for turn, _ in batch])
+            results = [(future, None) for _, future in batch]
+        except Exception:
+            # Retry individually so one bad turn doesn't fail the whole group
+            results = []
+            for turn, future in batch:
+                try:
+                    await self._write([turn])
+                    results.append((future, None))
+                except Exception as e:
+                    results.append((future, e))
+        for future, error in results:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+        }
+
+
+class WriteBehindWriter(TurnWriter):
+    """
+    Acknowledges a turn once it is fsynced to the local journal, then drains
+    journaled turns to Postgres in batches of up to drain_batch.
+
+    Concurrent submits share one fsync (taken fsync_interval after the first
+    unsynced append). While the database is unreachable turns pile up in the
+    journal and the drain retries with exponential backoff. When the database
+    rejects a batch for any other reason, the drain halves the batch straight
+    away until the bad turn is alone, then moves it to the journal's
+    dead-letter file and carries on with the rest. On start, turns left in the journal by a previous run are replayed; message
+    inserts ignore ids that already exist, so replaying a turn that did reach
+    the database before a crash is harmless.
+    """
+
+    mode = "write_behind"
+
+    MAX_BACKOFF = 5.0
+
+    def __init__(
+        self,
+        journal_path: str,
+        session_factory: Optional[Callable] = None,
+        fsync_interval: float = 0.005,
+        drain_batch: int = 500,
+        drain_interval: float = 0.05,
+        compact_bytes: int = 16 * 1024 * 1024,
+    ):
+        super().__init__(session_factory)
+        self.journal = TurnJournal(journal_path)
+        self.fsync_interval = fsync_interval
+        self.drain_batch = drain_batch
+        self.drain_interval = drain_interval
+        self.compact_bytes = compact_bytes
+        self._pending: "OrderedDict[int, Tuple[Turn, float]]" = OrderedDict()
+        self._pending_lock = threading.Lock()  # Cache loaders read pending turns from worker threads
+        self._unsynced: List[asyncio.Future] = []
+        self._journal_lock: Optional[asyncio.Lock] = None  # Appends wait on it while the journal is compacted
+        self._sync_wakeup: Optional[asyncio.Event] = None
+        self._drain_wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        self.replayed = 0
+        self.dead_lettered = 0
+
+    async def start(self):
+        if self._tasks:
+            return
+        replay = await asyncio.to_thread(self.journal.open)
+        now = time.monotonic()
+        with self._pending_lock:
+            for seq, turn in replay:
+                self._pending[seq] = (turn, now)
+        self.replayed = len(replay)
+        if replay:
+            print(f"📒 Replaying {len(replay)} journaled turns from {self.journal.path}")
+        self._journal_lock = asyncio.Lock()
+        self._sync_wakeup = asyncio.Event()
+        self._drain_wakeup = asyncio.Event()
+        self._running = True
+        self._tasks = [asyncio.create_task(self._sync_loop()), asyncio.create_task(self._drain_loop())]
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        # The flag ends loops whose cancellation wait_for() swallowed
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._sync()
+        # One last drain; anything left stays in the journal for the next start
+        try:
+            await self._drain_once()
+        except Exception as e:
+            print(f"Warning: {len(self._pending)} turns left in journal {self.journal.path}: {e}")
+        self.journal.close()
+
+    async def submit(self, turn: Turn):
+        if not self._tasks:
+            # Not started (e.g. scripts): fall back to a direct write
+            await self._write([turn])
+            return
+        async with self._journal_lock:
+            seq = self.journal.append(turn)
+            with self._pending_lock:
+                self._pending[seq] = (turn, time.monotonic())
+        future = asyncio.get_running_loop().create_future()
+        self._unsynced.append(future)
+        self._sync_wakeup.set()
+        await future
+
+    async def _sync_loop(self):
+        while self._running:
+            await self._sync_wakeup.wait()
+            # Give concurrent requests a moment to share this fsync
+            await asyncio.sleep(self.fsync_interval)
+            self._sync_wakeup.clear()
+            await self._sync()
+            self._drain_wakeup.set()
+
+    async def _sync(self):
+        waiters, self._unsynced = self._unsynced, []
+        try:
+            await asyncio.to_thread(self.journal.sync)
+        except Exception as e:
+            for future in waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    async def _drain_loop(self):
+        batch_size, backoff = self.drain_batch, self.drain_interval
+        while self._running:
+            if not self._pending:
+                try:
+                    await asyncio.wait_for(self._drain_wakeup.wait(), timeout=self.drain_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._drain_wakeup.clear()
+                continue
+            attempted = min(batch_size, len(self._pending))
+            try:
+                await self._drain_once(batch_size)
+                batch_size, backoff = self.drain_batch, self.drain_interval
+            except Exception as e:
+                if is_transient(e):
+                    print(f"Warning: Write-behind drain failed ({len(self._pending)} turns pending, retry in {backoff:.2f}s): {e}")
+                    await asyncio.sleep(backoff)
+                    batch_size, backoff = max(batch_size // 2, 1), min(backoff * 2, self.MAX_BACKOFF)
+                elif attempted == 1:
+                    # The database is up and rejects this one turn: retrying won't help
+                    await self._dead_letter_oldest(e)
+                    batch_size, backoff = self.drain_batch, self.drain_interval
+                else:
+                    # Narrow down to the rejected turn; the rest of the batch goes through meanwhile
+                    batch_size = max(min(batch_size, attempted) // 2, 1)
+
+    async def _drain_once(self, batch_size: Optional[int] = None):
+        """Write up to batch_size of the oldest pending turns in one transaction"""
+        with self._pending_lock:
+            batch = list(self._pending.items())[:batch_size or len(self._pending)]
+        if not batch:
+            return
+        await self._write([turn for _, (turn, _) in batch])
+        seqs = [seq for seq, _ in batch]
+        self.journal.mark_committed(seqs)
+        with self._pending_lock:
+            for seq in seqs:
+                self._pending.pop(seq, None)
+        if self.journal.size() > self.compact_bytes:
+            await self._compact()
+
+    async def _dead_letter_oldest(self, error: Exception):
+        with self._pending_lock:
+            seq, (turn, _) = next(iter(self._pending.items()))
+        await asyncio.to_thread(self.journal.dead_letter, seq, turn, f"{type(error).__name__}: {error}")
+        with self._pending_lock:
+            self._pending.pop(seq, None)
+        self.dead_lettered += 1
+        print(f"Warning: Moved turn {seq} for {turn.email} to {self.journal.dead_letter_path}: {error}")
+
+    async def _compact(self):
+        """
+        Rewrite the journal with only pending turns. The rewrite and its fsync
+        run off the event loop; holding the journal lock keeps appends from
+        interleaving, so submits wait for it but other requests carry on.
+        """
+        async with self._journal_lock:
+            with self._pending_lock:
+                pending = [(seq, turn) for seq, (turn, _) in self._pending.items()]
+            await asyncio.to_thread(self.journal.rewrite, pending)
+
+    def pending_messages(self, email: str) -> List[CachedMessage]:
+        with self._pending_lock:
+            turns = [turn for turn, _ in self._pending.values() if turn.email == email]
+        return [message for turn in turns for message in turn.messages]
+
+    def pending_user(self, email: str) -> Optional[User]:
+        """A detached copy: callers apply this request's changes to it, not to the queued turn"""
+        with self._pending_lock:
+            for turn, _ in reversed(self._pending.values()):
+                if turn.email == email and turn.write_user:
+                    user = turn.user
+                    return User(user_id=user.user_id, email=user.email, name=user.name, preferences=dict(user.preferences or {}))
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending = len(self._pending)
+            oldest = next(iter(self._pending.values()), None)
+        return {
+            **super().stats(),
+            "pending_turns": pending,
+            "lag_seconds": round(time.monotonic() - oldest[1], 3) if oldest else 0.0,
+            "replayed_turns": self.replayed,
+            "dead_lettered_turns": self.dead_lettered,
+            "journal_bytes": self.journal.size(),
+            "journal_fsyncs": self.journal.fsyncs,
+        }
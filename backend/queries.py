@@ -2,10 +2,31 @@
 Simple database query functions for the Chat API.
 """
 
-from typing import List, Dict, Any
+import uuid
+from datetime import datetime
+from itertools import groupby
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from models import Message
+from sqlalchemy import desc, func, select, true, tuple_
+from models import Message, User
+from cache import CachedMessage
+
+# Keyset cursor: the (created_date, id) of the oldest message a client has seen
+Cursor = Tuple[datetime, uuid.UUID]
+
+
+def format_cursor(created_date: str, message_id) -> str:
+    """Render a cursor as "<ISO created_date>,<id>" for the `before` query parameter"""
+    return f"{created_date},{message_id}"
+
+
+def parse_cursor(value: str) -> Cursor:
+    """Parse "<ISO created_date>,<id>"; raises ValueError if malformed"""
+    created_date, _, message_id = value.rpartition(",")
+    # An unescaped "+" in a query string arrives as a space
+    created = datetime.fromisoformat(created_date.strip().replace(" ", "+"))
+    return created, uuid.UUID(message_id.strip())
+
 
 class MessageQueries:
     """Simple message query functions"""
@@ -17,4 +38,161 @@ class MessageQueries:
         messages = db.query(Message).order_by(desc(Message.created_date)).limit(limit).all()
         # Reverse to get chronological order (oldest first)
         messages.reverse()
-        return [msg.to_dict() for msg in messages]
\ No newline at end of file
+        return [msg.to_dict() for msg in messages]
+    
+    @staticmethod
+    def get_user_recent_messages(db: Session, email: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get the most recent messages for a single user (oldest first) in one indexed query"""
+        messages = (
+            db.query(Message)
+            .join(User, Message.user_id == User.user_id)
+            .filter(User.email == email)
+            .order_by(desc(Message.created_date))
+            .limit(limit)
+            .all()
+        )
+        messages.reverse()
+        return [msg.to_dict() for msg in messages]
+    
+    @staticmethod
+    def user_messages_page_statement(
+        email: str,
+        before: Optional[Cursor] = None,
+        limit: int = 50,
+        visible_only: bool = True,
+    ):
+        """
+        SELECT one page of a user's messages, newest first: the limit messages
+        just older than the before cursor, or the newest ones without a cursor.
+        Keyset pagination: WHERE (created_date, id) < before walks
+        idx_messages_user_timeline, so a page costs the same however far back it is.
+        """
+        user_id = select(User.user_id).where(User.email == email).scalar_subquery()
+        statement = select(Message).where(Message.user_id == user_id)
+        if visible_only:
+            # The bare column matches idx_messages_user_visible_timeline's WHERE visible_to_user,
+            # so the planner can prove the partial index applies ("IS true" may not)
+            statement = statement.where(Message.visible_to_user)
+        if before is not None:
+            statement = statement.where(tuple_(Message.created_date, Message.id) < tuple_(*before))
+        return statement.order_by(desc(Message.created_date), desc(Message.id)).limit(limit)
+
+    @staticmethod
+    def get_user_messages_page(
+        db: Session,
+        email: str,
+        before: Optional[Cursor] = None,
+        limit: int = 50,
+        visible_only: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """One keyset page of a user's history, oldest first (see user_messages_page_statement)"""
+        statement = MessageQueries.user_messages_page_statement(email, before, limit, visible_only)
+        messages = list(db.scalars(statement).all())
+        messages.reverse()
+        return [msg.to_dict() for msg in messages]
+    
+    @staticmethod
+    def get_messages_since(
+        db: Session,
+        since: datetime,
+        after: Optional[Cursor] = None,
+        limit: int = 1000,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        One page of (email, message) pairs created after a point in time, oldest first.
+        after is the (created_date, id) of the last row of the previous page.
+        """
+        query = (
+            db.query(User.email, Message)
+            .join(User, Message.user_id == User.user_id)
+            .filter(Message.created_date > since)
+        )
+        if after is not None:
+            query = query.filter(tuple_(Message.created_date, Message.id) > tuple_(*after))
+        rows = query.order_by(Message.created_date, Message.id).limit(limit).all()
+        return [(email, msg.to_dict()) for email, msg in rows]
+
+    @staticmethod
+    def iter_messages_since(db: Session, since: datetime, page_size: int = 1000) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Every (email, message) pair created after a point in time, oldest first, page_size rows per query"""
+        after = None
+        while True:
+            page = MessageQueries.get_messages_since(db, since, after, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            last = page[-1][1]
+            after = (datetime.fromisoformat(last["created_date"]), uuid.UUID(last["id"]))
+
+    @staticmethod
+    def recent_messages_per_user_statement(
+        per_user: int = 100,
+        max_users: Optional[int] = None,
+        active_since: Optional[datetime] = None,
+    ):
+        """
+        SELECT the last per_user messages of each of the max_users most recently
+        active users. Active users are those with a message since active_since,
+        found through idx_messages_created_date in the partitions covering that
+        window; each one's messages are then read by
+        JOIN LATERAL (... WHERE user_id = u.user_id ORDER BY created_date DESC LIMIT per_user)
+        over idx_messages_user_timeline. The cost follows the window and
+        max_users x per_user, not the size of the messages table.
+        Rows come back grouped by user (most recently active first), oldest message first.
+        """
+        active_users = select(Message.user_id, func.max(Message.created_date).label("last_message")).where(
+            Message.user_id.isnot(None)
+        )
+        if active_since is not None:
+            active_users = active_users.where(Message.created_date >= active_since)
+        active_users = active_users.group_by(Message.user_id).order_by(desc("last_message"))
+        if max_users is not None:
+            active_users = active_users.limit(max_users)
+        active_users = active_users.subquery("active_users")
+
+        recent = (
+            select(
+                Message.id,
+                Message.message,
+                Message.role,
+                Message.visible_to_user,
+                Message.step_id,
+                Message.parent_id,
+                Message.user_id,
+                Message.created_date,
+            )
+            .where(Message.user_id == active_users.c.user_id)
+            .order_by(desc(Message.created_date), desc(Message.id))
+            .limit(per_user)
+            .lateral("recent")
+        )
+
+        return (
+            select(User.email, recent)
+            .select_from(active_users)
+            .join(recent, true())
+            .join(User, User.user_id == active_users.c.user_id)
+            .order_by(desc(active_users.c.last_message), active_users.c.user_id, recent.c.created_date, recent.c.id)
+        )
+
+    @staticmethod
+    def stream_recent_messages_per_user(
+        db: Session,
+        per_user: int = 100,
+        max_users: Optional[int] = None,
+        batch_size: int = 1000,
+        active_since: Optional[datetime] = None,
+    ) -> Iterator[Tuple[str, List[CachedMessage]]]:
+        """
+        Stream (email, messages) for cache warmup, one user at a time.
+        Rows are fetched batch_size at a time through a server-side cursor (yield_per)
+        and turned straight into CachedMessage records, so only one batch and one
+        user's history are held in memory. Closing the generator closes the cursor.
+        """
+        statement = MessageQueries.recent_messages_per_user_statement(per_user, max_users, active_since)
+        result = db.execute(statement, execution_options={"yield_per": batch_size})
+        try:
+            for email, rows in groupby(result, key=lambda row: row.email):
+                yield email, [CachedMessage.from_model(row) for row in rows]
+        finally:
+            result.close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Agent pipeline benchmark
+
+Replays a recorded conversation set (scripts/data/recorded_conversations.jsonl:
+one conversation per line, {"id", "community_id", "turns": [user messages]})
+through the full agent pipeline, router included, once per mode:
+
+- two-pass:    RouterPrompt, then a booking prompt that makes the tool-call
+               pass and then the structured BookingResponse pass
+- single-pass: the first booking pass already returns the BookingResponse; the
+               second pass only runs when tools were called (AGENT_SINGLE_PASS=true)
+- speculative: single-pass, with the booking prompt started while the router
+               classifies (AGENT_SPECULATIVE_ROUTING=true)
+- fused:       single-pass, with the security classification returned by the
+               booking call instead of a RouterPrompt call (AGENT_ROUTER_MODE=fused)
+
+Each turn sees the replies the same mode gave to the earlier turns. Reports
+LLM calls per turn (counted at the OpenAI client), p50/p95 turn latency and
+how many turns got the security handoff, so a fused run can be checked
+against the two-stage router. Speculative runs also count discarded LLM
+calls, which the client counter includes. The local pre-classifier is off
+during the replay.
+
+Needs OPENAI_API_KEY and a running, seeded database (DATABASE_URL) for the tools.
+
+Usage:
+    python scripts/bench_agent_modes.py
+    python scripts/bench_agent_modes.py --conversations my_recording.jsonl --repeat 3
+    python scripts/bench_agent_modes.py --modes two-pass fused
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_agent.preclassifier import preclassifier
+from booking_agent.prompts.fused_prompt import FusedBookingPrompt
+from booking_agent.prompts.router_prompt import RouterPrompt, security_handoff
+from globals import get_agent
+
+SECURITY_HANDOFF_REPLY = security_handoff().reply
+
+# label -> (AGENT_SINGLE_PASS, AGENT_SPECULATIVE_ROUTING, entry prompt)
+MODES = {
+    "two-pass": (False, False, RouterPrompt),
+    "single-pass": (True, False, RouterPrompt),
+    "speculative": (True, True, RouterPrompt),
+    "fused": (True, False, FusedBookingPrompt),
+}
+
+DEFAULT_CONVERSATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "recorded_conversations.jsonl")
+
+
+def count_llm_calls(client) -> dict:
+    """Wrap the client's completion methods so every request is counted"""
+    counter = {"calls": 0}
+    for owner, name in ((client.chat.completions, "create"), (client.beta.chat.completions, "parse")):
+        original = getattr(owner, name)
+
+        def counted(*args, _original=original, **kwargs):
+            counter["calls"] += 1
+            return _original(*args, **kwargs)
+
+        setattr(owner, name, counted)
+    return counter
+
+
+def load_conversations(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def bench(agent, counter: dict, conversations: list, repeat: int, prompt_cls) -> dict:
+    latencies, calls, handoffs = [], [], 0
+    for _ in range(repeat):
+        for conversation in conversations:
+            history = []
+            for message in conversation["turns"]:
+                history.append({"role": "user", "content": message})
+                prompt = prompt_cls(message, context={"community_id": conversation["community_id"]})
+                calls_before = counter["calls"]
+                start = time.perf_counter()
+                response = agent.run(prompt, list(history))
+                latencies.append(time.perf_counter() - start)
+                calls.append(counter["calls"] - calls_before)
+                handoffs += response.reply == SECURITY_HANDOFF_REPLY
+                history.append({"role": "assistant", "content": response.reply})
+    latencies.sort()
+    return {
+        "turns": len(latencies),
+        "calls_per_turn": statistics.mean(calls),
+        "security_handoffs": handoffs,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM calls and latency per turn for each agent pipeline mode")
+    parser.add_argument("--conversations", default=DEFAULT_CONVERSATIONS, help="Recorded conversations (JSONL)")
+    parser.add_argument("--repeat", type=int, default=1, help="Replays of the whole set per mode")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES), help="Modes to compare")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.conversations)
+    agent = get_agent()
+    counter = count_llm_calls(agent.client)
+    # Every message goes to the LLM router, so modes compare like for like
+    preclassifier.enabled = False
+    print(f"🏁 Replaying {len(conversations)} conversations "
+          f"({sum(len(c['turns']) for c in conversations)} turns) x {args.repeat} per mode")
+
+    results = {}
+    for label in args.modes:
+        agent._single_pass, agent._speculative_routing, prompt_cls = MODES[label]
+        results[label] = bench(agent, counter, conversations, args.repeat, prompt_cls)
+
+    for label, result in results.items():
+        print(f"📊 {label:<11} {result['calls_per_turn']:.2f} calls/turn | "
+              f"p50 {result['p50_ms']:7.0f} ms | p95 {result['p95_ms']:7.0f} ms | "
+              f"{result['security_handoffs']} security handoffs")
+    baseline = results[args.modes[0]]
+    for label, result in list(results.items())[1:]:
+        print(f"🚀 {label} saves {baseline['p50_ms'] - result['p50_ms']:.0f} ms per turn (p50) vs {args.modes[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Message cache microbenchmark
+
+Measures get_message_history on users with long histories, for both the
+visible-only view and the full view, against the old filter-then-slice read.
+Reads should cost O(limit) no matter how long the history is.
+
+Also measures the memory held per cached message, for Message.to_dict()
+dicts (the old cache entries) against compact CachedMessage records.
+
+Usage:
+    python scripts/bench_cache.py
+    python scripts/bench_cache.py --messages 50000 --users 20 --limit 100
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import CachedMessage, UserMessageCache
+
+USER_ID = str(uuid.uuid4())
+START = datetime(2025, 9, 5, tzinfo=timezone.utc)
+
+
+def make_message(n: int):
+    """A Message.to_dict() dict; every third message is hidden, like tool/system turns"""
+    role = "user" if n % 2 else "assistant"
+    return {
+        "id": str(uuid.uuid4()),
+        "message": {"role": role, "content": f"message {n}"},
+        "role": role,
+        "visible_to_user": n % 3 != 0,
+        "step_id": None,
+        "parent_id": None,
+        "user_id": str(uuid.UUID(USER_ID)),  # to_dict() renders a fresh string per row
+        "created_date": (START + timedelta(seconds=n)).isoformat(),
+    }
+
+
+def bytes_per_message(build, count):
+    """Average traced allocation per message kept alive by build(n)"""
+    gc.collect()
+    tracemalloc.start()
+    kept = [build(n) for n in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current / count
+
+
+def legacy_history(messages, limit, visible_only):
+    """The previous read path: filter the whole history, then slice"""
+    if visible_only:
+        messages = [msg for msg in messages if msg.get('visible_to_user', True)]
+    return messages[-limit:] if len(messages) > limit else messages
+
+
+def time_reads(read, emails, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for email in emails:
+            read(email)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(emails)) * 1e6  # microseconds per read
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message cache read benchmark")
+    parser.add_argument("--messages", type=int, default=20000, help="Messages per user")
+    parser.add_argument("--users", type=int, default=10, help="Number of users")
+    parser.add_argument("--limit", type=int, default=100, help="History limit per read")
+    parser.add_argument("--rounds", type=int, default=50, help="Read rounds per user")
+    parser.add_argument("--memory-sample", type=int, default=100000, help="Messages used for the memory measurement")
+    args = parser.parse_args()
+
+    print(f"🏁 Cache benchmark: {args.users} users x {args.messages} messages, limit={args.limit}")
+
+    cache = UserMessageCache()
+    legacy = {}
+    emails = [f"user{i}@example.com" for i in range(args.users)]
+
+    start = time.perf_counter()
+    for email in emails:
+        messages = [make_message(n) for n in range(args.messages)]
+        cache.load_from_db(email, messages)
+        legacy[email] = messages
+    print(f"📦 Loaded in {time.perf_counter() - start:.2f}s")
+
+    for visible_only in (True, False):
+        label = "visible" if visible_only else "all"
+        cached_us = time_reads(
+            lambda email: cache.get_message_history(email, limit=args.limit, visible_only=visible_only),
+            emails, args.rounds,
+        )
+        legacy_us = time_reads(
+            lambda email: legacy_history(legacy[email], args.limit, visible_only),
+            emails, args.rounds,
+        )
+        print(f"📊 {label:<8} cache: {cached_us:9.1f} µs/read | legacy: {legacy_us:9.1f} µs/read | {legacy_us / cached_us:6.1f}x")
+
+    dict_bytes = bytes_per_message(make_message, args.memory_sample)
+    record_bytes = bytes_per_message(lambda n: CachedMessage.from_dict(make_message(n)), args.memory_sample)
+    print(f"💾 memory   dict:  {dict_bytes:9.0f} B/msg   | record: {record_bytes:9.0f} B/msg   | {dict_bytes / record_bytes:6.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Async database benchmark
+
+Runs many concurrent simulated conversations on one event loop and reports
+turns per second. Each turn does what /api/reply does against the database:
+get_or_create_user, save the user message, wait for the "LLM", save the reply.
+
+- sync:  the old path, a blocking Session called from the coroutine
+- async: AsyncSession via get_or_create_user_async / save_message_and_cache_with_user
+
+Needs a running database (DATABASE_URL). Benchmark users are named
+bench-<n>@example.com and are deleted afterwards unless --keep is given.
+
+Usage:
+    python scripts/bench_db_async.py
+    python scripts/bench_db_async.py --conversations 200 --turns 5 --llm-ms 300
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select
+
+from app import save_message_and_cache_with_user
+from cache import CachedMessage, message_cache
+from globals.database import AsyncSessionLocal, SessionLocal, async_engine
+from models import Message, User
+from schemas import MessageRole
+from user_service import get_or_create_user, get_or_create_user_async
+
+
+def bench_email(n: int) -> str:
+    return f"bench-{n}@example.com"
+
+
+def save_message_sync(db, role: MessageRole, content: str, user: User, parent_id=None) -> Message:
+    """The pre-async save path: blocking commit, then cache"""
+    message = Message(message={"role": role.value, "content": content}, role=role.value, user_id=user.user_id, parent_id=parent_id)
+    db.add(message)
+    db.commit()
+    message_cache.add_message(user.email, CachedMessage.from_model(message))
+    return message
+
+
+async def sync_turn(n: int, turn: int, llm_seconds: float):
+    db = SessionLocal()
+    try:
+        user = get_or_create_user(db, bench_email(n), "Bench User", {"turn": turn})
+        question = save_message_sync(db, MessageRole.USER, f"question {turn}", user)
+        await asyncio.sleep(llm_seconds)
+        save_message_sync(db, MessageRole.ASSISTANT, f"answer {turn}", user, parent_id=question.id)
+    finally:
+        db.close()
+
+
+async def async_turn(n: int, turn: int, llm_seconds: float):
+    async with AsyncSessionLocal() as db:
+        user = await get_or_create_user_async(db, bench_email(n), "Bench User", {"turn": turn})
+        question = await save_message_and_cache_with_user(
+            db=db, role=MessageRole.USER, content=f"question {turn}", user_id=user.user_id, user_email=user.email
+        )
+        await asyncio.sleep(llm_seconds)
+        await save_message_and_cache_with_user(
+            db=db, role=MessageRole.ASSISTANT, content=f"answer {turn}", user_id=user.user_id,
+            user_email=user.email, parent_id=question.id
+        )
+
+
+async def run_mode(turn_fn, conversations: int, turns: int, llm_seconds: float):
+    latencies = []
+
+    async def conversation(n: int):
+        for turn in range(turns):
+            start = time.perf_counter()
+            await turn_fn(n, turn, llm_seconds)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(n) for n in range(conversations)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "turns_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def cleanup(conversations: int):
+    emails = [bench_email(n) for n in range(conversations)]
+    async with AsyncSessionLocal() as db:
+        user_ids = select(User.user_id).where(User.email.in_(emails))
+        await db.execute(delete(Message).where(Message.user_id.in_(user_ids)))
+        await db.execute(delete(User).where(User.email.in_(emails)))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Sync vs async database throughput on one event loop")
+    parser.add_argument("--conversations", type=int, default=100, help="Concurrent conversations")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation")
+    parser.add_argument("--llm-ms", type=float, default=200, help="Simulated LLM latency per turn")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark users and messages")
+    args = parser.parse_args()
+
+    print(f"🏁 DB benchmark: {args.conversations} conversations x {args.turns} turns, LLM {args.llm_ms:.0f} ms")
+    try:
+        results = {}
+        for label, turn_fn in (("sync", sync_turn), ("async", async_turn)):
+            results[label] = await run_mode(turn_fn, args.conversations, args.turns, args.llm_ms / 1000)
+            result = results[label]
+            print(f"📊 {label:<6} {result['turns_per_second']:8.1f} turns/s | p50 {result['p50_ms']:7.1f} ms | p95 {result['p95_ms']:7.1f} ms")
+        print(f"🚀 async/sync throughput: {results['async']['turns_per_second'] / results['sync']['turns_per_second']:.1f}x")
+    finally:
+        if not args.keep:
+            await cleanup(args.conversations)
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Per-turn tool DB overhead benchmark
+
+Runs the three leasing tools (check_availability, get_pricing,
+check_pet_policy) as one "turn", many times, in two modes:
+
+- per-call: every tool opens and closes its own session (tools called
+  without a context, the path scripts and tests still use)
+- shared:   one ToolContext per turn, as BasePrompt.execute does
+
+and reports per-turn latency, pool checkouts and connection resets per turn,
+read from the sync engine's pool metrics.
+
+Needs a running, seeded database (DATABASE_URL).
+
+Usage:
+    python scripts/bench_tool_sessions.py
+    python scripts/bench_tool_sessions.py --turns 500 --community sunset-ridge --unit B201
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_agent.tool_context import ToolContext
+from booking_agent.tools import check_availability, check_pet_policy, get_pricing
+from globals.database import engine
+
+
+def run_turn(args, context=None):
+    check_availability(args.community, args.bedrooms, context=context)
+    get_pricing(args.community, args.unit, None, context=context)
+    check_pet_policy(args.community, "cat", context=context)
+
+
+def bench(args, shared: bool) -> dict:
+    pool = engine.pool
+    checkouts_before = pool.wait_stats.checkouts
+    latencies = []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        if shared:
+            with ToolContext(engine=engine) as context:
+                run_turn(args, context)
+        else:
+            run_turn(args)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "checkouts_per_turn": (pool.wait_stats.checkouts - checkouts_before) / args.turns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call vs per-turn DB sessions for tool calls")
+    parser.add_argument("--turns", type=int, default=200, help="Turns per mode (3 tool calls each)")
+    parser.add_argument("--community", default="sunset-ridge", help="community_id to query")
+    parser.add_argument("--unit", default="B201", help="Unit code for get_pricing")
+    parser.add_argument("--bedrooms", type=int, default=2, help="Bedrooms for check_availability")
+    args = parser.parse_args()
+
+    print(f"🏁 Tool DB benchmark: {args.turns} turns x 3 tools against {args.community}")
+    run_turn(args)  # Warm the pool and statement caches
+
+    results = {"per-call": bench(args, shared=False), "shared": bench(args, shared=True)}
+    for label, result in results.items():
+        print(f"📊 {label:<8} p50 {result['p50_ms']:7.2f} ms | p95 {result['p95_ms']:7.2f} ms | "
+              f"{result['checkouts_per_turn']:.1f} checkouts/turn")
+    saved = results["per-call"]["p50_ms"] - results["shared"]["p50_ms"]
+    print(f"🚀 Shared session saves {saved:.2f} ms per turn (p50)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+/api/reply load test
+
+Sends --requests replies with --concurrency in flight against a running API
+while polling GET /admin/db, then reports latency, errors and how the async
+pool behaved: peak checked-out connections, overflow used, checkout waits
+and timeouts. Exits non-zero if any request failed or the pool timed out,
+so it can gate a pool-size change.
+
+Each simulated lead uses its own email (load-<n>@example.com). The API must
+run with ADMIN_ENDPOINTS_ENABLED=true; its ADMIN_TOKEN, if any, is read from
+the environment or --admin-token.
+
+Usage:
+    python scripts/load_test_reply.py --concurrency 50 --requests 500
+    python scripts/load_test_reply.py --url http://localhost:8000 --community sunset-ridge
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+
+async def poll_pool(client: httpx.AsyncClient, samples: list, stop: asyncio.Event, interval: float):
+    """Sample /admin/db until stopped"""
+    while not stop.is_set():
+        try:
+            response = await client.get("/admin/db")
+            samples.append(response.json()["async"])
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent /api/reply load test with pool metrics")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests")
+    parser.add_argument("--leads", type=int, default=50, help="Distinct lead emails")
+    parser.add_argument("--community", default="sunset-ridge", help="community_id sent with each request")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout (seconds)")
+    parser.add_argument("--admin-token", default=os.getenv("ADMIN_TOKEN"), help="X-Admin-Token for /admin/db")
+    args = parser.parse_args()
+    admin_headers = {"X-Admin-Token": args.admin_token} if args.admin_token else {}
+
+    print(f"🏁 Load test: {args.requests} requests, {args.concurrency} concurrent, {args.leads} leads -> {args.url}")
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, headers=admin_headers) as client:
+        before = (await client.get("/admin/db")).json()
+        config = before["config"]
+        print(
+            f"⚙️  Pool: size={config['pool_size']} overflow={config['max_overflow']} "
+            f"timeout={config['pool_timeout']}s pre_ping={config['pool_pre_ping']}"
+        )
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies, errors = [], []
+
+        async def send(n: int):
+            async with semaphore:
+                lead = n % args.leads
+                payload = {
+                    "message": "Do you have any 2 bedroom units available?",
+                    "lead": {"name": f"Load Test {lead}", "email": f"load-{lead}@example.com"},
+                    "community_id": args.community,
+                }
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/reply", json=payload)
+                    if response.status_code != 200:
+                        errors.append(f"HTTP {response.status_code}: {response.text[:120]}")
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+                latencies.append(time.perf_counter() - start)
+
+        samples, stop = [], asyncio.Event()
+        poller = asyncio.create_task(poll_pool(client, samples, stop, interval=0.1))
+        start = time.perf_counter()
+        await asyncio.gather(*(send(n) for n in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await poller
+
+        after = (await client.get("/admin/db")).json()["async"]
+
+    latencies.sort()
+    timeouts = after["timeouts"] - before["async"]["timeouts"]
+    checkouts = after["checkouts"] - before["async"]["checkouts"]
+    print(f"📊 {len(latencies) / elapsed:.1f} req/s | p50 {statistics.median(latencies) * 1000:.0f} ms | "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms | errors {len(errors)}")
+    print(f"🔌 Peak checked out {max((s['checked_out'] for s in samples), default=0)} | "
+          f"peak overflow {max((s['overflow'] for s in samples), default=0)} | "
+          f"checkouts {checkouts} | max wait {after['wait_max_ms']:.1f} ms | timeouts {timeouts}")
+    print(f"🔁 Churn: {after['connects']} connects, {after['closes']} closes, {after['invalidations']} invalidations")
+    print(f"⏱️  Wait histogram: {after['wait_histogram']}")
+
+    for error in errors[:5]:
+        print(f"❌ {error}")
+    if errors or timeouts:
+        print("❌ Pool too small (or API failing) for this concurrency")
+        sys.exit(1)
+    print("✅ No pool timeouts")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
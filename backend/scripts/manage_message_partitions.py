@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Message partition maintenance
+
+messages is partitioned by month (database/scripts/init/09-partition-messages.sql).
+
+- ensure:  create this month's partition and the next --months-ahead
+- list:    show partitions with their row counts
+- archive: detach months older than --retain-months, export each to
+           <out-dir>/messages_yYYYYmMM.csv.gz, verify the row count and drop it
+
+Run archive from cron (e.g. daily); it only acts once a month has expired.
+Needs DATABASE_URL.
+
+Usage:
+    python scripts/manage_message_partitions.py ensure --months-ahead 3
+    python scripts/manage_message_partitions.py list
+    python scripts/manage_message_partitions.py archive --retain-months 12 --out-dir /var/lib/chat-api/archive
+    python scripts/manage_message_partitions.py archive --retain-months 12 --out-dir ./archive --keep
+"""
+
+import argparse
+import os
+import sys
+
+from sqlalchemy import text
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from globals.database import engine
+from persistence.partitions import archive_expired_partitions, ensure_future_partitions, list_partitions
+
+
+def ensure(args):
+    with engine.connect() as connection:
+        created = ensure_future_partitions(connection, args.months_ahead)
+    print(f"✅ {created} new partitions ({args.months_ahead} months ahead)")
+
+
+def show(args):
+    with engine.connect() as connection:
+        for partition in list_partitions(connection):
+            rows = connection.execute(text(f'SELECT COUNT(*) FROM "{partition.name}"')).scalar()
+            state = "attached" if partition.attached else "DETACHED"
+            print(f"📋 {partition.name}  {partition.month:%Y-%m}  {state:<8}  {rows} rows")
+
+
+def archive(args):
+    archived = archive_expired_partitions(engine, args.out_dir, retain_months=args.retain_months, drop=not args.keep)
+    for result in archived:
+        action = "dropped" if result["dropped"] else "kept detached"
+        print(f"📦 {result['partition']}: {result['rows']} rows -> {result['path']} "
+              f"({result['bytes'] / 1024 / 1024:.1f} MB), {action}")
+    print(f"✅ Archived {len(archived)} partitions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, list and archive monthly messages partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ensure_parser = commands.add_parser("ensure", help="Create future monthly partitions")
+    ensure_parser.add_argument("--months-ahead", type=int, default=3, help="Months to create beyond the current one")
+    ensure_parser.set_defaults(func=ensure)
+
+    list_parser = commands.add_parser("list", help="List partitions and row counts")
+    list_parser.set_defaults(func=show)
+
+    archive_parser = commands.add_parser("archive", help="Detach, export and drop expired partitions")
+    archive_parser.add_argument("--retain-months", type=int, default=12, help="Months kept online, including the current one")
+    archive_parser.add_argument("--out-dir", required=True, help="Directory for the .csv.gz exports")
+    archive_parser.add_argument("--keep", action="store_true", help="Leave exported partitions detached instead of dropping them")
+    archive_parser.set_defaults(func=archive)
+
+    args = parser.parse_args()
+    if getattr(args, "retain_months", 1) < 1:
+        parser.error("--retain-months must be at least 1")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Train the router pre-classifier model
+
+Fits a char n-gram TF-IDF + logistic regression pipeline on labeled messages
+and pickles it for PRECLASSIFIER_MODEL_PATH (see booking_agent/preclassifier.py).
+Labels come from either source, or both:
+
+- --labels:  JSONL with {"message": ..., "route": "BOOKING_INFO" | "MALICIOUS_QUERY"}
+- --from-db: every user message in messages, labeled MALICIOUS_QUERY when the
+             assistant's reply to it was the security handoff (needs DATABASE_URL)
+
+A stratified --holdout share is kept back to report how many messages the
+model would decide at the configured thresholds, and how many of those it
+gets wrong.
+
+Needs scikit-learn (pip install scikit-learn).
+
+Usage:
+    python scripts/train_preclassifier.py --from-db --out preclassifier.pkl
+    python scripts/train_preclassifier.py --labels router_labels.jsonl --out preclassifier.pkl --safe-below 0.02
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schemas import ConversationType
+
+LABELED_MESSAGES_QUERY = """
+    SELECT u.message->>'content' AS message, a.message->>'content' = :handoff AS malicious
+    FROM messages u
+    JOIN messages a ON a.parent_id = u.id AND a.role = 'assistant'
+    WHERE u.role = 'user';
+"""
+
+
+def load_labels(path: str) -> list:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["message"], ConversationType(row["route"]).value) for row in rows]
+
+
+def load_db_labels() -> list:
+    from sqlalchemy import text
+    from booking_agent.prompts.router_prompt import security_handoff
+    from globals.database import engine
+
+    with engine.connect() as connection:
+        rows = connection.execute(text(LABELED_MESSAGES_QUERY), {"handoff": security_handoff().reply}).fetchall()
+    return [
+        (row.message, (ConversationType.MALICIOUS_QUERY if row.malicious else ConversationType.BOOKING_INFO).value)
+        for row in rows if row.message
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the char n-gram router pre-classifier")
+    parser.add_argument("--labels", help="Labeled messages (JSONL: message, route)")
+    parser.add_argument("--from-db", action="store_true", help="Label user messages by whether they got the security handoff")
+    parser.add_argument("--out", required=True, help="Where to write the pickled model")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of messages held out for evaluation")
+    parser.add_argument("--safe-below", type=float, default=0.05, help="PRECLASSIFIER_SAFE_BELOW to evaluate")
+    parser.add_argument("--malicious-above", type=float, default=0.95, help="PRECLASSIFIER_MALICIOUS_ABOVE to evaluate")
+    args = parser.parse_args()
+    if not args.labels and not args.from_db:
+        parser.error("give --labels, --from-db or both")
+
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.model_selection import train_test_split
+        from sklearn.pipeline import make_pipeline
+    except ImportError:
+        print("❌ scikit-learn is required: pip install scikit-learn")
+        sys.exit(1)
+
+    samples = (load_labels(args.labels) if args.labels else []) + (load_db_labels() if args.from_db else [])
+    messages = [message for message, _ in samples]
+    routes = [route for _, route in samples]
+    malicious = routes.count(ConversationType.MALICIOUS_QUERY.value)
+    print(f"📋 {len(samples)} labeled messages ({malicious} malicious)")
+    if malicious == 0 or malicious == len(samples):
+        print("❌ Need examples of both routes")
+        sys.exit(1)
+
+    def pipeline():
+        return make_pipeline(
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 5), lowercase=True, sublinear_tf=True),
+            LogisticRegression(max_iter=1000, class_weight="balanced"),
+        )
+
+    train_x, test_x, train_y, test_y = train_test_split(
+        messages, routes, test_size=args.holdout, stratify=routes, random_state=0
+    )
+    model = pipeline().fit(train_x, train_y)
+    malicious_column = list(model.classes_).index(ConversationType.MALICIOUS_QUERY.value)
+    decided = wrong = 0
+    for score, route in zip(model.predict_proba(test_x)[:, malicious_column], test_y):
+        if score >= args.malicious_above or score <= args.safe_below:
+            decided += 1
+            predicted = ConversationType.MALICIOUS_QUERY.value if score >= args.malicious_above else ConversationType.BOOKING_INFO.value
+            wrong += predicted != route
+    print(f"📊 Holdout: {decided}/{len(test_y)} decided locally ({decided / len(test_y):.0%}), "
+          f"{wrong} of those wrong ({wrong / decided if decided else 0:.1%})")
+
+    # Ship a model trained on everything
+    model = pipeline().fit(messages, routes)
+    with open(args.out, "wb") as f:
+        pickle.dump(model, f)
+    print(f"✅ Model written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
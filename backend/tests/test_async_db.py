@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the Async Database Layer
+
+Tests the awaitable versions of the DB helpers against a mocked AsyncSession:
+1. Async driver URL selection
+2. Async leasing queries (availability, pricing, pet policy)
+3. get_or_create_user_async (one upsert statement, cached known users, failures)
+4. save_message_and_cache_with_user commits without blocking and caches the message
+5. /api/reply holds no DB session while the agent (LLM) runs, and keeps the user message if it fails
+6. Pool checkout wait metrics, histogram and connection churn
+7. Pool configuration from the environment
+8. User cache TTL, LRU and change detection
+9. /admin/* endpoints are disabled by default and token-gated when enabled
+
+Run with: python -m pytest tests/test_async_db.py -v
+"""
+
+import pytest
+import sys
+import os
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from globals.database import _async_url
+from leasing_queries import get_available_units_async, get_pet_policy_async, get_pricing_async
+from sqlalchemy.dialects import postgresql
+
+from cache import user_cache
+from models import User
+from user_service import get_or_create_user_async
+
+
+def unit_row(unit_code: str = "B201", rent: float = 2100):
+    return SimpleNamespace(
+        unit_id=uuid.UUID(int=1),
+        community_id="sunset-ridge",
+        unit_code=unit_code,
+        bedrooms=2,
+        bathrooms=2,
+        rent=rent,
+        specials=None,
+        availability_status="available",
+        available_at=None,
+        community_name="Sunset Ridge",
+    )
+
+
+def async_session(rows=None, scalar=None):
+    """AsyncSession mock whose execute() returns the given rows / scalar result"""
+    result = Mock()
+    result.fetchall.return_value = rows or []
+    result.fetchone.return_value = rows[0] if rows else None
+    result.scalars.return_value.first.return_value = scalar
+    db = Mock()
+    db.execute = AsyncMock(return_value=result)
+    db.commit = AsyncMock()
+    db.rollback = AsyncMock()
+    return db
+
+
+class TestAsyncUrl:
+    """The async engine reuses DATABASE_URL with psycopg 3's async driver"""
+
+    @pytest.mark.parametrize("url", [
+        "postgresql://u:p@localhost/db",
+        "postgresql+psycopg://u:p@localhost/db",
+    ])
+    def test_switches_to_psycopg_async(self, url):
+        assert _async_url(url) == "postgresql+psycopg_async://u:p@localhost/db"
+
+    def test_keeps_async_drivers(self):
+        assert _async_url("postgresql+asyncpg://u:p@localhost/db") == "postgresql+asyncpg://u:p@localhost/db"
+
+
+class TestAsyncLeasingQueries:
+    """Async twins return the same shapes as the sync queries"""
+
+    @pytest.mark.asyncio
+    async def test_available_units(self):
+        db = async_session(rows=[unit_row("B201"), unit_row("B202", 2200)])
+
+        units = await get_available_units_async(db, "sunset-ridge", 2, "2025-10-01")
+
+        assert [unit["unit_code"] for unit in units] == ["B201", "B202"]
+        assert db.execute.await_args.args[1] == {
+            "community_id": "sunset-ridge", "bedrooms": 2, "move_in_date": "2025-10-01"
+        }
+
+    @pytest.mark.asyncio
+    async def test_pricing(self):
+        db = async_session(rows=[unit_row()])
+
+        pricing = await get_pricing_async(db, "sunset-ridge", "B201")
+
+        assert pricing["rent"] == 2100.0
+        assert pricing["community_name"] == "Sunset Ridge"
+
+    @pytest.mark.asyncio
+    async def test_pet_policy_not_found(self):
+        assert await get_pet_policy_async(async_session(), "unknown") is None
+
+    @pytest.mark.asyncio
+    async def test_database_error_returns_none(self):
+        db = async_session()
+        db.execute.side_effect = Exception("connection lost")
+
+        assert await get_pricing_async(db, "sunset-ridge", "B201") is None
+
+
+class TestGetOrCreateUserAsync:
+    """Single-statement user upsert in front of the user cache"""
+
+    def setup_method(self):
+        user_cache.clear()
+
+    def upsert_session(self, user):
+        db = async_session()
+        db.scalars = AsyncMock(return_value=Mock(one=Mock(return_value=user)))
+        return db
+
+    @pytest.mark.asyncio
+    async def test_one_upsert_statement_merges_in_sql(self):
+        user = User(user_id=uuid.UUID(int=1), email="jane@example.com", name="Jane", preferences={"bedrooms": 2})
+        db = self.upsert_session(user)
+
+        result = await get_or_create_user_async(db, " jane@example.com ", "Jane", {"move_in": "2025-10-01"})
+
+        assert result is user
+        statement, = db.scalars.await_args.args
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (email) DO UPDATE" in sql
+        assert "coalesce(users.preferences, '{}'::jsonb) || excluded.preferences" in sql
+        assert "RETURNING" in sql
+        db.execute.assert_not_awaited()
+        db.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_unchanged_known_user_skips_database(self):
+        user_cache.put(uuid.UUID(int=1), "jane@example.com", "Jane", {"bedrooms": 2, "pets": True})
+        db = self.upsert_session(None)
+
+        user = await get_or_create_user_async(db, "jane@example.com", "Jane", {"bedrooms": 2})
+
+        assert user.user_id == uuid.UUID(int=1)
+        assert user.preferences == {"bedrooms": 2, "pets": True}
+        db.scalars.assert_not_awaited()
+        db.commit.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_changed_preferences_go_to_database(self):
+        user_cache.put(uuid.UUID(int=1), "jane@example.com", "Jane", {"bedrooms": 2})
+        stored = User(user_id=uuid.UUID(int=1), email="jane@example.com", name="Jane", preferences={"bedrooms": 3})
+        db = self.upsert_session(stored)
+
+        await get_or_create_user_async(db, "jane@example.com", "Jane", {"bedrooms": 3})
+
+        db.scalars.assert_awaited_once()
+        assert user_cache.get("jane@example.com").preferences == {"bedrooms": 3}
+
+    @pytest.mark.asyncio
+    async def test_failed_upsert_rolls_back(self):
+        db = async_session()
+        db.scalars = AsyncMock(side_effect=Exception("connection lost"))
+
+        with pytest.raises(Exception):
+            await get_or_create_user_async(db, "jane@example.com", "Jane")
+
+        db.rollback.assert_awaited_once()
+        assert user_cache.get("jane@example.com") is None
+
+    @pytest.mark.asyncio
+    async def test_requires_name(self):
+        with pytest.raises(ValueError):
+            await get_or_create_user_async(async_session(), "jane@example.com", "  ")
+
+
+class TestSaveMessageAsync:
+    """save_message_and_cache_with_user is awaitable"""
+
+    @pytest.mark.asyncio
+    async def test_commits_and_caches(self):
+        from app import save_message_and_cache_with_user
+        from cache import message_cache
+        from schemas import MessageRole
+
+        added = []
+        db = async_session()
+        db.add = added.append
+
+        async def commit():
+            # The INSERT ... RETURNING fills in the server default
+            added[0].created_date = datetime(2025, 9, 5, 19, 1, tzinfo=timezone.utc)
+
+        db.commit = AsyncMock(side_effect=commit)
+        message_id = str(uuid.UUID(int=9))
+        email = "async-save@example.com"
+        message_cache.clear(email)
+
+        message = await save_message_and_cache_with_user(
+            db=db, role=MessageRole.USER, content="Hi there", user_id=uuid.UUID(int=1),
+            user_email=email, message_id=message_id,
+        )
+
+        db.commit.assert_awaited_once()
+        cached = message_cache.get_message_history(email)
+        assert [msg.id for msg in cached] == [message.id]
+        assert cached[0].content == "Hi there"
+        assert cached[0].created_date == "2025-09-05T19:01:00+00:00"
+        message_cache.clear(email)
+
+
+class TestReplyDbScopes:
+    """The reply endpoint splits DB work into short scopes around the agent call"""
+
+    @pytest.mark.asyncio
+    async def test_no_session_open_during_agent_run(self):
+        import app
+        from schemas import BookingResponse, LeadInfo, ReplyRequest
+
+        open_sessions = []
+
+        class FakeSession:
+            async def __aenter__(self):
+                open_sessions.append(self)
+                return self
+
+            async def __aexit__(self, *exc_info):
+                open_sessions.remove(self)
+
+        def agent_run(prompt, history, request_id=None):
+            # The LLM round trips happen here: no connection may be checked out
+            assert open_sessions == []
+            return BookingResponse(reply="We have 2 units available.")
+
+        submitted = []
+
+        async def submit(turn):
+            assert open_sessions == []
+            submitted.append(turn)
+
+        request = ReplyRequest(message="Any 2 bedrooms?", lead=LeadInfo(name="Jane", email="jane@example.com"))
+        with patch.object(app, "AsyncSessionLocal", FakeSession), \
+                patch.object(app, "get_user_by_email_async", AsyncMock(return_value=None)), \
+                patch.object(app.turn_writer, "submit", side_effect=submit), \
+                patch.object(app, "get_history", AsyncMock(return_value=[])), \
+                patch("globals.get_agent", return_value=Mock(run=agent_run)), \
+                patch("booking_agent.prompts.router_prompt.RouterPrompt"):
+            response = await app.reply_endpoint(request)
+
+        assert response.reply == "We have 2 units available."
+        assert open_sessions == []
+
+        # One turn: new user plus both messages, written after the agent call
+        turn, = submitted
+        assert turn.write_user and turn.email == "jane@example.com"
+        user_message, assistant_message = turn.messages
+        assert str(assistant_message.id) == response.id
+        assert assistant_message.parent_id == user_message.id
+        assert response.created_date == assistant_message.created_date
+        app.message_cache.clear("jane@example.com")
+
+    @pytest.mark.asyncio
+    async def test_agent_failure_persists_user_message(self):
+        import app
+        from fastapi import HTTPException
+        from schemas import LeadInfo, ReplyRequest
+
+        email = "agent-down@example.com"
+        app.message_cache.clear(email)
+        submitted = []
+
+        async def submit(turn):
+            submitted.append(turn)
+
+        request = ReplyRequest(message="Any 2 bedrooms?", lead=LeadInfo(name="Jane", email=email))
+        with patch.object(app, "get_user_by_email_async", AsyncMock(return_value=None)), \
+                patch.object(app, "AsyncSessionLocal", Mock(return_value=AsyncMock())), \
+                patch.object(app.turn_writer, "submit", side_effect=submit), \
+                patch.object(app, "get_history", AsyncMock(return_value=[])), \
+                patch("globals.get_agent", return_value=Mock(run=Mock(side_effect=RuntimeError("OpenAI down")))), \
+                patch("booking_agent.prompts.router_prompt.RouterPrompt"):
+            with pytest.raises(HTTPException):
+                await app.reply_endpoint(request)
+
+        # The user message is written on its own, and the cache holds exactly that
+        turn, = submitted
+        assert turn.write_user
+        user_message, = turn.messages
+        assert user_message.content == "Any 2 bedrooms?"
+        cached = app.message_cache.get_message_history(email, visible_only=False)
+        assert [msg.id for msg in cached] == [user_message.id]
+        app.message_cache.clear(email)
+
+    @pytest.mark.asyncio
+    async def test_agent_and_write_failure_clears_cache(self):
+        import app
+        from fastapi import HTTPException
+        from schemas import LeadInfo, ReplyRequest
+
+        email = "all-down@example.com"
+        app.message_cache.clear(email)
+
+        request = ReplyRequest(message="Hello?", lead=LeadInfo(name="Jane", email=email))
+        with patch.object(app, "get_user_by_email_async", AsyncMock(return_value=None)), \
+                patch.object(app, "AsyncSessionLocal", Mock(return_value=AsyncMock())), \
+                patch.object(app.turn_writer, "submit", AsyncMock(side_effect=ConnectionError("db down"))), \
+                patch.object(app, "get_history", AsyncMock(return_value=[])), \
+                patch("globals.get_agent", return_value=Mock(run=Mock(side_effect=RuntimeError("OpenAI down")))), \
+                patch("booking_agent.prompts.router_prompt.RouterPrompt"):
+            with pytest.raises(HTTPException):
+                await app.reply_endpoint(request)
+
+        # Nothing reached the database, so nothing may linger in the cache
+        assert app.message_cache.get_message_history(email, visible_only=False) == []
+
+
+class TestPoolMetrics:
+    """Checkout wait times are recorded by the timed pool classes"""
+
+    def test_records_checkouts_and_timeouts(self):
+        import threading
+        from sqlalchemy import exc
+        from globals.pool_metrics import TimedQueuePool, pool_status
+
+        pool = TimedQueuePool(lambda: Mock(), pool_size=1, max_overflow=0, timeout=0.2)
+        first = pool.connect()
+
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+
+        # A waiter gets the connection as soon as it's returned
+        threading.Timer(0.05, first.close).start()
+        second = pool.connect()
+
+        status = pool_status(pool)
+        assert status["checked_out"] == 1
+        assert status["checkouts"] == 2
+        assert status["timeouts"] == 1
+        assert status["wait_max_ms"] >= 40
+        second.close()
+
+    def test_stats_survive_pool_recreate(self):
+        from globals.pool_metrics import TimedQueuePool
+
+        pool = TimedQueuePool(lambda: Mock(), pool_size=1)
+        pool.connect().close()
+
+        assert pool.recreate().wait_stats.checkouts == 1
+
+    def test_histogram_buckets(self):
+        from globals.pool_metrics import PoolWaitStats
+
+        stats = PoolWaitStats()
+        for seconds in (0.0005, 0.003, 0.003, 7.0):
+            stats.record(seconds)
+
+        histogram = stats.as_dict()["wait_histogram"]
+        assert histogram["<=1ms"] == 1
+        assert histogram["<=5ms"] == 2
+        assert histogram[">5000ms"] == 1
+        assert sum(histogram.values()) == 4
+
+    def test_counts_connection_churn(self):
+        from globals.pool_metrics import TimedQueuePool, pool_status
+
+        pool = TimedQueuePool(lambda: Mock(), pool_size=1, max_overflow=1)
+        first, second = pool.connect(), pool.connect()
+        first.close()
+        second.close()  # Overflow connection is closed, not returned to the pool
+        pool.connect().invalidate()
+
+        status = pool_status(pool)
+        assert status["connects"] == 2  # The third checkout reuses the pooled connection
+        assert status["closes"] == 2
+        assert status["invalidations"] == 1
+
+
+class TestPoolConfig:
+    """DB_POOL_* settings are read from the environment"""
+
+    def test_defaults(self, monkeypatch):
+        from globals.database import pool_options
+
+        for name in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE", "DB_POOL_PRE_PING"):
+            monkeypatch.delenv(name, raising=False)
+
+        assert pool_options() == {
+            "pool_size": 5, "max_overflow": 10, "pool_timeout": 30.0, "pool_recycle": 1800,
+            "pool_pre_ping": True, "query_cache_size": 500,
+        }
+
+    def test_overrides(self, monkeypatch):
+        from globals.database import driver_connect_args, pool_options
+
+        monkeypatch.setenv("DB_POOL_SIZE", "20")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+        monkeypatch.setenv("DB_PREPARE_THRESHOLD", "none")
+
+        options = pool_options()
+        assert options["pool_size"] == 20
+        assert options["pool_pre_ping"] is False
+        assert driver_connect_args("postgresql+psycopg://u:p@localhost/db") == {"prepare_threshold": None}
+        assert driver_connect_args("postgresql+asyncpg://u:p@localhost/db") == {}
+
+
+class TestUserCache:
+    """TTL + LRU email -> user cache"""
+
+    def test_ttl_and_lru(self):
+        from cache import UserDirectoryCache
+
+        now = [0.0]
+        cache = UserDirectoryCache(ttl_seconds=10, max_users=2, clock=lambda: now[0])
+        cache.put(uuid.UUID(int=1), "a@example.com", "A", {})
+        cache.put(uuid.UUID(int=2), "b@example.com", "B", {})
+        cache.get("a@example.com")
+        cache.put(uuid.UUID(int=3), "c@example.com", "C", {})
+
+        assert cache.get("b@example.com") is None  # Least recently used
+        now[0] = 11
+        assert cache.get("a@example.com") is None  # Expired
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["expirations"] == 1
+
+    def test_satisfies(self):
+        from cache import CachedUser
+
+        cached = CachedUser(uuid.UUID(int=1), "a@example.com", "A", {"bedrooms": 2, "pets": True}, expires_at=0)
+
+        assert cached.satisfies("A", {"pets": True})
+        assert cached.satisfies("A", None)
+        assert not cached.satisfies("A", {"pets": False})
+        assert not cached.satisfies("B", {})
+
+
+
+class TestAdminEndpoints:
+    """/admin/* is off by default and needs X-Admin-Token when ADMIN_TOKEN is set"""
+
+    def request(self, method, path, enabled, token=None, headers=None):
+        import app
+        from fastapi.testclient import TestClient
+
+        with patch.object(app, "ADMIN_ENDPOINTS_ENABLED", enabled), \
+                patch.object(app, "ADMIN_TOKEN", token), \
+                patch.object(app.inventory_index, "stats", return_value={"units": 3}), \
+                patch.object(app.policy_cache, "invalidate") as invalidate:
+            response = TestClient(app.app).request(method, path, headers=headers or {})
+        return response, invalidate
+
+    def test_disabled_endpoints_are_not_found(self):
+        response, invalidate = self.request("POST", "/admin/cache/policies/invalidate", enabled=False)
+
+        assert response.status_code == 404
+        invalidate.assert_not_called()
+
+    def test_enabled_without_token(self):
+        response, _ = self.request("GET", "/admin/inventory", enabled=True)
+
+        assert response.status_code == 200
+        assert response.json() == {"units": 3}
+
+    def test_token_required_when_set(self):
+        missing, invalidate = self.request("POST", "/admin/cache/policies/invalidate", enabled=True, token="s3cret")
+        wrong, _ = self.request("GET", "/admin/inventory", enabled=True, token="s3cret", headers={"X-Admin-Token": "guess"})
+        right, _ = self.request("GET", "/admin/inventory", enabled=True, token="s3cret", headers={"X-Admin-Token": "s3cret"})
+
+        assert (missing.status_code, wrong.status_code, right.status_code) == (401, 401, 200)
+        invalidate.assert_not_called()
+
+
+if __name__ == "__main__":
+    # Run tests directly
+    pytest.main([__file__, "-v"])
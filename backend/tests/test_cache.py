@@ -0,0 +1,843 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the User Message Cache
+
+Tests the bounded cache mode:
+1. Per-user ring buffer
+2. LRU eviction under a user / message budget
+3. TTL expiry
+4. Hit/miss/eviction counters
+5. Lazy per-user hydration on cache miss
+6. Shared Redis backend (via fakeredis), with hydration merges atomic across workers
+7. Warm-restart snapshots
+8. Compact CachedMessage records
+9. Thread safety under concurrent writers, readers and hydration
+10. Streaming startup warmup with user / memory caps
+11. Community policy cache: TTL, invalidation, pet-type normalization
+12. Keyset-paginated history: cursor, SQL, cache first then database
+
+Run with: python -m pytest tests/test_cache.py -v
+"""
+
+import pytest
+import sys
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from cache import CachedMessage, UserMessageCache, RedisBackend
+from cache import snapshot
+from cache import PetPolicy, PolicyCache, normalize_pet_type
+
+
+def make_message(n: int, visible: bool = True):
+    """Build a cached message dict shaped like Message.to_dict()"""
+    return {
+        "id": str(uuid.UUID(int=n)),
+        "message": {"role": "user", "content": f"message {n}"},
+        "role": "user",
+        "visible_to_user": visible,
+        "created_date": None,
+    }
+
+
+def ids(messages):
+    """Message numbers (as passed to make_message) of cached records"""
+    return [msg.id.int for msg in messages]
+
+
+class TestUnboundedCache:
+    """Default mode keeps the original behaviour"""
+
+    def test_history_returns_last_limit_in_order(self):
+        cache = UserMessageCache()
+        cache.add_messages("jane@example.com", [make_message(i) for i in range(10)])
+
+        history = cache.get_message_history("jane@example.com", limit=3)
+
+        assert ids(history) == [7, 8, 9]
+        assert cache.size("jane@example.com") == 10
+
+    def test_visible_only_filters_hidden(self):
+        cache = UserMessageCache()
+        cache.add_message("jane@example.com", make_message(1))
+        cache.add_message("jane@example.com", make_message(2, visible=False))
+        cache.add_message("jane@example.com", make_message(3))
+
+        visible = cache.get_message_history("jane@example.com", limit=10)
+        everything = cache.get_message_history("jane@example.com", limit=10, visible_only=False)
+
+        assert ids(visible) == [1, 3]
+        assert len(everything) == 3
+
+    def test_visible_view_maintained_by_load_from_db(self):
+        cache = UserMessageCache()
+        cache.add_message("jane@example.com", make_message(1))
+        cache.load_from_db("jane@example.com", [make_message(i, visible=i % 2 == 0) for i in range(6)])
+        cache.add_message("jane@example.com", make_message(6, visible=False))
+        cache.add_message("jane@example.com", make_message(7))
+
+        visible = cache.get_message_history("jane@example.com", limit=3)
+        everything = cache.get_message_history("jane@example.com", limit=3, visible_only=False)
+
+        assert ids(visible) == [2, 4, 7]
+        assert ids(everything) == [5, 6, 7]
+
+    def test_load_from_db_replaces_messages(self):
+        cache = UserMessageCache()
+        cache.add_message("jane@example.com", make_message(1))
+        cache.load_from_db("jane@example.com", [make_message(5), make_message(6)])
+
+        assert cache.is_loaded("jane@example.com")
+        assert cache.size("jane@example.com") == 2
+        assert cache.stats()["messages"] == 2
+
+    def test_reads_do_not_create_users(self):
+        cache = UserMessageCache()
+
+        assert cache.get_message_history("nobody@example.com") == []
+        assert cache.is_loaded("nobody@example.com") is False
+        assert cache.get_cached_users() == []
+
+
+class TestBoundedCache:
+    """Ring buffers, LRU eviction, TTL and counters"""
+
+    def test_per_user_ring_buffer(self):
+        cache = UserMessageCache(max_messages_per_user=5)
+        for i in range(12):
+            cache.add_message("jane@example.com", make_message(i))
+
+        history = cache.get_message_history("jane@example.com", limit=100, visible_only=False)
+
+        assert ids(history) == list(range(7, 12))
+        assert cache.stats()["messages"] == 5
+        assert cache.stats()["trimmed"] == 7
+
+    def test_lru_eviction_by_user_count(self):
+        cache = UserMessageCache(max_users=2)
+        cache.add_message("a@example.com", make_message(1))
+        cache.add_message("b@example.com", make_message(2))
+
+        # Touch a so that b becomes least recently used
+        cache.get_message_history("a@example.com")
+        cache.add_message("c@example.com", make_message(3))
+
+        assert set(cache.get_cached_users()) == {"a@example.com", "c@example.com"}
+        assert cache.stats()["evictions"] == 1
+
+    def test_lru_eviction_by_message_budget(self):
+        cache = UserMessageCache(max_total_messages=6)
+        cache.add_messages("a@example.com", [make_message(i) for i in range(3)])
+        cache.add_messages("b@example.com", [make_message(i) for i in range(3)])
+        cache.add_messages("c@example.com", [make_message(i) for i in range(3)])
+
+        assert cache.get_cached_users() == ["b@example.com", "c@example.com"]
+        assert cache.stats()["messages"] == 6
+
+    def test_most_recent_user_is_never_evicted(self):
+        cache = UserMessageCache(max_total_messages=2)
+        cache.add_messages("a@example.com", [make_message(i) for i in range(4)])
+
+        assert cache.get_cached_users() == ["a@example.com"]
+
+    def test_ttl_expiry(self):
+        cache = UserMessageCache(ttl_seconds=60)
+        with patch("cache.backends.time.monotonic", return_value=1000.0):
+            cache.add_message("jane@example.com", make_message(1))
+
+        with patch("cache.backends.time.monotonic", return_value=1030.0):
+            assert len(cache.get_message_history("jane@example.com")) == 1
+
+        with patch("cache.backends.time.monotonic", return_value=1200.0):
+            assert cache.get_message_history("jane@example.com") == []
+
+        stats = cache.stats()
+        assert stats["expirations"] == 1
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["messages"] == 0
+
+
+class TestLazyHydration:
+    """Per-user history is fetched from the loader on first read"""
+
+    def test_first_read_hydrates_only_that_user(self):
+        loader = Mock(return_value=[make_message(1), make_message(2)])
+        cache = UserMessageCache(hydration_limit=50)
+        cache.set_loader(loader)
+
+        history = cache.get_message_history("jane@example.com", limit=10)
+        cache.get_message_history("jane@example.com", limit=10)
+
+        assert ids(history) == [1, 2]
+        loader.assert_called_once_with("jane@example.com", 50)
+        assert cache.is_loaded("jane@example.com")
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hits"] == 1
+
+    def test_hydration_keeps_messages_added_before_load(self):
+        cache = UserMessageCache()
+        cache.set_loader(lambda email, limit: [make_message(1), make_message(2)])
+
+        # Written to the DB and cache just before the first read
+        cache.add_message("jane@example.com", make_message(2))
+        cache.add_message("jane@example.com", make_message(3))
+
+        history = cache.get_message_history("jane@example.com", limit=10)
+
+        assert ids(history) == [1, 2, 3]
+
+    def test_concurrent_reads_share_one_load(self):
+        calls = []
+
+        def slow_loader(email, limit):
+            calls.append(email)
+            time.sleep(0.05)
+            return [make_message(1)]
+
+        cache = UserMessageCache()
+        cache.set_loader(slow_loader)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_message_history("jane@example.com")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert calls == ["jane@example.com"]
+        assert all(len(history) == 1 for history in results)
+
+    def test_failed_load_is_retried(self):
+        loader = Mock(side_effect=[RuntimeError("db down"), [make_message(1)]])
+        cache = UserMessageCache()
+        cache.set_loader(loader)
+
+        assert cache.get_message_history("jane@example.com") == []
+        assert cache.is_loaded("jane@example.com") is False
+        assert len(cache.get_message_history("jane@example.com")) == 1
+        assert loader.call_count == 2
+
+
+class TestRedisBackend:
+    """Redis-protocol backend shared between workers"""
+
+    @pytest.fixture
+    def server(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        return fakeredis.FakeServer()
+
+    def make_cache(self, server, **kwargs):
+        import fakeredis
+        return UserMessageCache(backend=RedisBackend(client=fakeredis.FakeRedis(server=server), **kwargs))
+
+    def test_history_and_visibility(self, server):
+        cache = self.make_cache(server)
+        cache.add_message("jane@example.com", make_message(1))
+        cache.add_message("jane@example.com", make_message(2, visible=False))
+        cache.add_message("jane@example.com", make_message(3))
+
+        assert ids(cache.get_message_history("jane@example.com", limit=10)) == [1, 3]
+        assert ids(cache.get_message_history("jane@example.com", limit=2, visible_only=False)) == [2, 3]
+        assert cache.get_message_history("nobody@example.com") == []
+
+    def test_workers_share_one_history(self, server):
+        worker_a = self.make_cache(server)
+        worker_b = self.make_cache(server)
+
+        worker_a.load_from_db("jane@example.com", [make_message(1)])
+        worker_b.add_message("jane@example.com", make_message(2))
+
+        assert worker_b.is_loaded("jane@example.com")
+        assert ids(worker_a.get_message_history("jane@example.com")) == [1, 2]
+        assert worker_a.get_cached_users() == ["jane@example.com"]
+
+    def interleave(self, backend, method, action):
+        """Run action (another worker's write) once, between backend's read and its queued write"""
+        original = getattr(backend, method)
+
+        def write_after_action(*args):
+            if not action.called:
+                action()
+            original(*args)
+
+        action.called = False
+        return patch.object(backend, method, side_effect=write_after_action)
+
+    def test_hydration_merge_keeps_concurrent_append(self, server):
+        worker_a = self.make_cache(server)
+        worker_b = self.make_cache(server)
+        worker_a.set_loader(lambda email, limit: [make_message(1), make_message(2)])
+        worker_b.add_message("jane@example.com", make_message(2))
+        append = Mock(side_effect=lambda: worker_b.add_message("jane@example.com", make_message(3)))
+
+        with self.interleave(worker_a.backend, "_queue_replace", append):
+            history = worker_a.get_message_history("jane@example.com", limit=10)
+
+        assert ids(history) == [1, 2, 3]
+        assert ids(worker_b.get_message_history("jane@example.com", limit=10)) == [1, 2, 3]
+
+    def test_catch_up_skips_ids_appended_concurrently(self, server):
+        worker_a = self.make_cache(server)
+        worker_b = self.make_cache(server)
+        worker_a.load_from_db("jane@example.com", [make_message(1)])
+        append = Mock(side_effect=lambda: worker_b.add_message("jane@example.com", make_message(2)))
+
+        with self.interleave(worker_a.backend, "_queue_append", append):
+            accepted = worker_a.catch_up("jane@example.com", [make_message(2), make_message(3)])
+
+        assert accepted == 1
+        assert ids(worker_a.get_message_history("jane@example.com", limit=10)) == [1, 2, 3]
+
+    def test_per_user_cap(self, server):
+        cache = self.make_cache(server, max_messages_per_user=3)
+        cache.add_messages("jane@example.com", [make_message(i) for i in range(5)])
+
+        assert cache.size("jane@example.com") == 3
+        assert ids(cache.get_message_history("jane@example.com", visible_only=False)) == [2, 3, 4]
+
+    def test_clear(self, server):
+        cache = self.make_cache(server)
+        cache.load_from_db("jane@example.com", [make_message(1)])
+        cache.clear("jane@example.com")
+
+        assert cache.is_loaded("jane@example.com") is False
+        assert cache.size("jane@example.com") == 0
+
+
+class TestSnapshots:
+    """Binary snapshots for warm restarts"""
+
+    def make_dated(self, n: int, minute: int, visible: bool = True):
+        message = make_message(n, visible)
+        message["created_date"] = f"2025-09-05T19:{minute:02d}:00+00:00"
+        return message
+
+    def make_snapshot(self, tmp_path):
+        cache = UserMessageCache()
+        cache.load_from_db("a@example.com", [self.make_dated(1, 1), self.make_dated(2, 2, visible=False)])
+        cache.load_from_db("b@example.com", [self.make_dated(3, 5)])
+        cache.add_message("c@example.com", self.make_dated(4, 3))  # never loaded from DB
+        path = str(tmp_path / "cache.snap")
+        return path, cache.save_snapshot(path)
+
+    @pytest.mark.parametrize("use_msgpack", [True, False])
+    def test_round_trip(self, tmp_path, monkeypatch, use_msgpack):
+        if use_msgpack:
+            pytest.importorskip("msgpack")
+        else:
+            monkeypatch.setattr(snapshot, "msgpack", None)
+        path, result = self.make_snapshot(tmp_path)
+
+        restored = UserMessageCache()
+        watermark = restored.load_snapshot(path)
+
+        assert result["users"] == 3
+        assert result["messages"] == 4
+        assert watermark == "2025-09-05T19:05:00+00:00"
+        # Users are decoded lazily, on first read
+        assert restored.get_cached_users() == []
+        assert ids(restored.get_message_history("a@example.com")) == [1]
+        assert restored.size("a@example.com") == 2
+        assert restored.is_loaded("a@example.com")
+        assert restored.get_cached_users() == ["a@example.com"]
+        assert ids(restored.get_message_history("c@example.com")) == [4]
+        assert restored.is_loaded("c@example.com") is False
+
+    def test_snapshot_users_skip_the_loader(self, tmp_path):
+        path, _ = self.make_snapshot(tmp_path)
+        loader = Mock(return_value=[])
+        restored = UserMessageCache()
+        restored.set_loader(loader)
+        restored.load_snapshot(path)
+
+        restored.get_message_history("b@example.com")
+        restored.get_message_history("new@example.com")
+
+        loader.assert_called_once_with("new@example.com", 100)
+
+    def test_unread_users_carry_over_to_next_snapshot(self, tmp_path):
+        path, _ = self.make_snapshot(tmp_path)
+        restored = UserMessageCache()
+        restored.load_snapshot(path)
+        restored.add_message("b@example.com", self.make_dated(5, 6))
+
+        result = restored.save_snapshot(path)
+        reloaded = UserMessageCache()
+        watermark = reloaded.load_snapshot(path)
+
+        assert result["users"] == 3
+        assert watermark == "2025-09-05T19:06:00+00:00"
+        assert ids(reloaded.get_message_history("a@example.com")) == [1]
+        assert ids(reloaded.get_message_history("b@example.com")) == [3, 5]
+
+    def test_catch_up_applies_when_snapshot_user_is_read(self, tmp_path):
+        path, _ = self.make_snapshot(tmp_path)
+        restored = UserMessageCache()
+        restored.load_snapshot(path)
+
+        restored.catch_up("b@example.com", [self.make_dated(3, 5), self.make_dated(6, 7)])
+
+        assert ids(restored.get_message_history("b@example.com")) == [3, 6]
+
+    def test_restart_catches_up_past_one_page(self, tmp_path):
+        import app
+        from queries import MessageQueries
+
+        path, _ = self.make_snapshot(tmp_path)
+        # 2500 newer messages, ten to a timestamp, so pages also break between equal created_dates
+        newer = sorted(
+            (
+                ("a@example.com" if n % 2 else "b@example.com", {
+                    **make_message(n),
+                    "created_date": (datetime(2025, 9, 5, 20, tzinfo=timezone.utc) + timedelta(seconds=n // 10)).isoformat(),
+                })
+                for n in range(100, 2600)
+            ),
+            key=lambda row: (row[1]["created_date"], row[1]["id"]),
+        )
+        pages = []
+
+        def get_messages_since(db, since, after=None, limit=1000):
+            rows = [
+                row for row in newer
+                if datetime.fromisoformat(row[1]["created_date"]) > since
+                and (after is None or (datetime.fromisoformat(row[1]["created_date"]), uuid.UUID(row[1]["id"])) > after)
+            ][:limit]
+            pages.append(len(rows))
+            return rows
+
+        restored = UserMessageCache()
+        with patch.object(app, "message_cache", restored), \
+                patch.object(app, "get_db", lambda: iter([Mock()])), \
+                patch.object(MessageQueries, "get_messages_since", side_effect=get_messages_since):
+            assert app.restore_cache_snapshot(path)
+
+        assert pages == [1000, 1000, 500]
+        a = restored.get_message_history("a@example.com", limit=5000, visible_only=False)
+        b = restored.get_message_history("b@example.com", limit=5000, visible_only=False)
+        assert ids(a) == [1, 2] + list(range(101, 2600, 2))
+        assert ids(b) == [3] + list(range(100, 2600, 2))
+
+    def test_backends_without_snapshots_are_skipped(self, tmp_path):
+        import app
+        fakeredis = pytest.importorskip("fakeredis")
+        path = tmp_path / "cache.snap"
+        shared = UserMessageCache(backend=RedisBackend(client=fakeredis.FakeRedis()))
+        shared.add_message("a@example.com", make_message(1))
+
+        assert UserMessageCache().backend.supports_snapshots
+        assert not shared.backend.supports_snapshots
+        with patch.object(app, "message_cache", shared):
+            app.save_cache_snapshot(str(path))
+
+        assert not path.exists()
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "not-a-snapshot"
+        path.write_bytes(b"hello world, not a snapshot")
+
+        with pytest.raises(ValueError):
+            UserMessageCache().load_snapshot(str(path))
+
+    def test_catch_up_skips_known_ids_and_unloaded_users(self):
+        cache = UserMessageCache()
+        cache.load_from_db("a@example.com", [make_message(1), make_message(2)])
+
+        appended = cache.catch_up("a@example.com", [make_message(2), make_message(3)])
+
+        assert appended == 1
+        assert ids(cache.get_message_history("a@example.com")) == [1, 2, 3]
+        assert cache.catch_up("nobody@example.com", [make_message(9)]) == 0
+        assert cache.get_cached_users() == ["a@example.com"]
+
+
+class TestCachedMessage:
+    """Slotted records that replace Message.to_dict() dicts"""
+
+    def test_dict_round_trip(self):
+        data = make_message(1)
+        data["created_date"] = "2025-09-05T19:01:00.123456+00:00"
+        data["step_id"] = "response"
+        data["user_id"] = str(uuid.UUID(int=42))
+        data["message"]["tool_call_id"] = "call_1"
+
+        record = CachedMessage.from_dict(data)
+
+        assert record.to_dict() == {**data, "parent_id": None}
+        assert record.to_api_dict() == {"id": data["id"], "message": data["message"], "created_date": data["created_date"]}
+
+    def test_row_round_trip(self):
+        record = CachedMessage.from_dict({**make_message(1), "created_date": "2025-09-05T19:01:00+00:00"})
+
+        assert CachedMessage.from_row(record.to_row()) == record
+
+    def test_from_model(self):
+        from models import Message, StepEnum
+        from datetime import datetime, timezone
+
+        message = Message(
+            id=uuid.UUID(int=7),
+            message={"role": "assistant", "content": "hi"},
+            role="assistant",
+            visible_to_user=False,
+            step_id=StepEnum.RESPONSE,
+            user_id=uuid.UUID(int=1),
+            created_date=datetime(2025, 9, 5, 19, 1, tzinfo=timezone.utc),
+        )
+
+        record = CachedMessage.from_model(message)
+
+        assert record.to_dict() == message.to_dict()
+        assert record.extra is None
+
+    def test_records_have_no_instance_dict(self):
+        record = CachedMessage.coerce(make_message(1))
+
+        assert not hasattr(record, "__dict__")
+        assert CachedMessage.coerce(record) is record
+        # Roles are interned, so every record shares one string per role
+        assert record.role is CachedMessage.coerce(make_message(2)).role
+
+
+class TestConcurrency:
+    """Many threads hammering the same and different users"""
+
+    WRITERS = 12
+    USERS = 6
+    PER_WRITER = 400
+
+    def writer_message(self, writer: int, seq: int):
+        # Writer (from 1) and sequence number are packed into the id so order can be checked per writer
+        return make_message((writer << 32) | seq, visible=seq % 3 != 0)
+
+    def run_threads(self, targets):
+        start = threading.Barrier(len(targets))
+        errors = []
+
+        def run(target):
+            try:
+                start.wait()
+                target()
+            except Exception as e:  # Surface failures from worker threads
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    def assert_complete_and_ordered(self, history, writers):
+        seen = {}
+        for msg in history:
+            writer, seq = msg.id.int >> 32, msg.id.int & 0xFFFFFFFF
+            if writer in writers:
+                # Each writer's messages must come back in the order it wrote them
+                assert seq > seen.get(writer, -1)
+                seen[writer] = seq
+        assert seen == {writer: self.PER_WRITER - 1 for writer in writers}
+
+    @pytest.mark.parametrize("shards", [1, 4])
+    def test_no_lost_or_reordered_messages(self, shards):
+        cache = UserMessageCache(shards=shards)
+        emails = [f"user{i}@example.com" for i in range(self.USERS)]
+        db_history = [make_message(n) for n in range(1, 6)]
+
+        def slow_loader(email, limit):
+            time.sleep(0.01)  # Appends land while the load is in flight
+            return list(db_history)
+
+        cache.set_loader(slow_loader)
+
+        def writer(w):
+            def run():
+                for seq in range(self.PER_WRITER):
+                    cache.add_message(emails[w % self.USERS], self.writer_message(w, seq))
+            return run
+
+        def reader():
+            for i in range(self.PER_WRITER):
+                history = cache.get_message_history(emails[i % self.USERS], limit=20)
+                assert all(msg.visible_to_user for msg in history)
+
+        self.run_threads([writer(w) for w in range(1, self.WRITERS + 1)] + [reader] * 4)
+
+        for i, email in enumerate(emails):
+            history = cache.get_message_history(email, limit=10**6, visible_only=False)
+            writers = {w for w in range(1, self.WRITERS + 1) if w % self.USERS == i}
+            assert ids(history[:5]) == [1, 2, 3, 4, 5]
+            assert len(history) == 5 + len(writers) * self.PER_WRITER
+            self.assert_complete_and_ordered(history, writers)
+        assert cache.stats()["messages"] == self.USERS * 5 + self.WRITERS * self.PER_WRITER
+
+    def test_catch_up_and_hydration_race_keeps_every_message(self):
+        cache = UserMessageCache()
+        cache.set_loader(lambda email, limit: [make_message(1)])
+        cache.get_message_history("jane@example.com")
+
+        def catch_up(w):
+            def run():
+                for seq in range(self.PER_WRITER):
+                    # Each message is delivered twice, as the snapshot catch-up overlap does
+                    message = self.writer_message(w, seq)
+                    cache.catch_up("jane@example.com", [message])
+                    cache.catch_up("jane@example.com", [message])
+            return run
+
+        self.run_threads([catch_up(w) for w in range(1, 5)])
+
+        history = cache.get_message_history("jane@example.com", limit=10**6, visible_only=False)
+        assert len(history) == 1 + 4 * self.PER_WRITER
+        self.assert_complete_and_ordered(history[1:], {1, 2, 3, 4})
+
+    def test_sharded_budget_is_split_evenly(self):
+        cache = UserMessageCache(max_users=8, shards=4)
+
+        for n in range(100):
+            cache.add_message(f"user{n}@example.com", make_message(n))
+
+        stats = cache.stats()
+        assert stats["shards"] == 4
+        assert stats["users"] <= 8
+        assert stats["evictions"] == 100 - stats["users"]
+
+
+class TestWarmup:
+    """Startup warmup streamed from the per-user window query"""
+
+    def stream(self, users: int, per_user: int, consumed: list):
+        """Fake query stream that records how far it was consumed and whether it was closed"""
+        try:
+            for u in range(users):
+                consumed.append(u)
+                yield f"user{u}@example.com", [make_message(u * 1000 + n) for n in range(per_user)]
+        finally:
+            consumed.append("closed")
+
+    def test_loads_users_until_user_cap(self):
+        cache = UserMessageCache()
+        consumed = []
+
+        result = cache.warm_up(self.stream(10, 3, consumed), max_users=4)
+
+        assert result["users"] == 4
+        assert result["messages"] == 12
+        assert cache.get_cached_users() == [f"user{u}@example.com" for u in range(4)]
+        assert ids(cache.get_message_history("user1@example.com")) == [1000, 1001, 1002]
+        # Stops reading as soon as the cap is hit and closes the cursor
+        assert consumed == [0, 1, 2, 3, 4, "closed"]
+
+    def test_stops_before_memory_cap(self):
+        cache = UserMessageCache()
+        per_user_bytes = sum(CachedMessage.coerce(make_message(n)).approx_size() for n in range(5))
+
+        result = cache.warm_up(self.stream(10, 5, []), max_bytes=int(per_user_bytes * 2.5))
+
+        assert result["users"] == 2
+        assert result["bytes"] <= per_user_bytes * 2.5
+
+    def test_skips_users_already_loaded(self):
+        cache = UserMessageCache()
+        cache.load_from_db("user0@example.com", [make_message(1)])
+
+        result = cache.warm_up(self.stream(2, 2, []))
+
+        assert result["users"] == 1
+        assert ids(cache.get_message_history("user0@example.com")) == [1]
+
+    def test_query_reads_each_user_through_lateral_limit(self):
+        from sqlalchemy.dialects import postgresql
+        from queries import MessageQueries
+
+        since = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        compiled = MessageQueries.recent_messages_per_user_statement(per_user=50, max_users=10, active_since=since).compile(
+            dialect=postgresql.dialect()
+        )
+        sql = " ".join(str(compiled).split())
+
+        # Active users come from the window only, most recent first
+        assert "WHERE messages.user_id IS NOT NULL AND messages.created_date >= " in sql
+        assert "GROUP BY messages.user_id ORDER BY last_message DESC LIMIT " in sql
+        # Each user's rows are a LIMIT per_user walk of idx_messages_user_timeline, not a ranking of all their rows
+        assert "JOIN LATERAL (SELECT" in sql
+        assert "WHERE messages.user_id = active_users.user_id ORDER BY messages.created_date DESC, messages.id DESC LIMIT " in sql
+        assert "row_number" not in sql
+        assert sorted(value for value in compiled.params.values() if isinstance(value, int)) == [10, 50]
+
+    def test_stream_groups_rows_and_uses_server_side_cursor(self):
+        from types import SimpleNamespace
+        from queries import MessageQueries
+
+        def row(email, n):
+            data = make_message(n)
+            return SimpleNamespace(
+                email=email, id=uuid.UUID(data["id"]), message=data["message"], role="user",
+                visible_to_user=True, step_id=None, parent_id=None, user_id=None, created_date=None,
+            )
+
+        result = Mock()
+        result.__iter__ = Mock(return_value=iter([row("a@example.com", 1), row("a@example.com", 2), row("b@example.com", 3)]))
+        db = Mock()
+        db.execute.return_value = result
+
+        users = list(MessageQueries.stream_recent_messages_per_user(db, per_user=2, batch_size=500))
+
+        assert [(email, ids(messages)) for email, messages in users] == [("a@example.com", [1, 2]), ("b@example.com", [3])]
+        assert db.execute.call_args.kwargs["execution_options"] == {"yield_per": 500}
+        result.close.assert_called_once()
+
+
+class TestPolicyCache:
+    """Per-community policy cache with normalized pet lookups"""
+
+    RULES = {
+        "pet": {
+            "Cats": {"allowed": True, "fee": 50},
+            "dog": {"allowed": True, "fee": 75},
+            "default": {"allowed": False, "notes": "Contact office"},
+        },
+        "parking": {"garage": {"fee": 150}},
+    }
+
+    @pytest.mark.parametrize("asked,canonical", [
+        ("cat", "cat"), ("Cats", "cat"), ("kitten", "cat"), ("Kittens", "cat"), (" kitty ", "cat"),
+        ("dog", "dog"), ("puppy", "dog"), ("Puppies", "dog"), ("bunny", "rabbit"),
+        ("guinea-pig", "guinea pig"), ("fish", "fish"), ("bass", "bass"),
+    ])
+    def test_normalize_pet_type(self, asked, canonical):
+        assert normalize_pet_type(asked) == canonical
+
+    def test_pet_lookup_resolves_aliases_before_default(self):
+        policy = PetPolicy(self.RULES["pet"])
+        assert policy.lookup("kitten") == ({"allowed": True, "fee": 50}, "cat")
+        assert policy.lookup("Puppy")[0]["fee"] == 75
+        assert policy.lookup("iguana") == (None, "iguana")
+        assert policy.default == {"allowed": False, "notes": "Contact office"}
+
+    def test_canonical_rule_wins_over_alias_rule(self):
+        policy = PetPolicy({"kitten": {"fee": 10}, "cat": {"fee": 50}})
+        assert policy.lookup("cats")[0] == {"fee": 50}
+
+    def test_ttl_and_invalidation(self):
+        now = [0.0]
+        cache = PolicyCache(ttl_seconds=10, clock=lambda: now[0])
+        assert cache.get("sunset-ridge") is None
+        cache.put("sunset-ridge", self.RULES)
+        cache.put("downtown-lofts", {})
+
+        assert cache.get("sunset-ridge").rules["parking"] == {"garage": {"fee": 150}}
+        assert cache.peek("downtown-lofts").pet is None  # No policies is cached too
+        cache.invalidate("sunset-ridge")
+        assert cache.peek("sunset-ridge") is None
+        now[0] = 11
+        assert cache.get("downtown-lofts") is None
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["expirations"]) == (2, 2, 1)
+        assert (stats["loads"], stats["invalidations"]) == (2, 1)
+
+    def test_lru_eviction_and_disabled(self):
+        cache = PolicyCache(max_communities=2)
+        for community in ("a", "b", "c"):
+            cache.put(community, {})
+        assert cache.peek("a") is None and cache.stats()["evictions"] == 1
+
+        disabled = PolicyCache(ttl_seconds=0)
+        assert disabled.put("a", self.RULES).pet is not None
+        assert disabled.peek("a") is None
+
+
+class TestHistoryPagination:
+    """/api/messages pages: newest from the cache, older pages by keyset from the database"""
+
+    def setup_method(self):
+        import app
+        self.app = app
+        self.cache = UserMessageCache(hydration_limit=3)
+        self.cache.set_loader(lambda email, limit: [make_message(n) for n in (1, 2, 3, 4, 5)][-limit:])
+
+    def message_at(self, n: int):
+        return CachedMessage.from_dict({**make_message(n), "created_date": f"2025-01-01T00:00:{n:02d}+00:00"})
+
+    def test_cursor_round_trip(self):
+        from queries import format_cursor, parse_cursor
+
+        message = self.message_at(7)
+        cursor = format_cursor(message.created_date, message.id)
+        created, message_id = parse_cursor(cursor)
+        assert message_id == message.id
+        assert created.isoformat() == message.created_date
+        # An unescaped "+" in the query string arrives as a space
+        assert parse_cursor(cursor.replace("+", " ")) == (created, message_id)
+        with pytest.raises(ValueError):
+            parse_cursor("yesterday")
+
+    def test_page_statement_uses_row_comparison(self):
+        from sqlalchemy.dialects import postgresql
+        from queries import MessageQueries
+
+        before = (datetime(2025, 1, 1, tzinfo=timezone.utc), uuid.UUID(int=7))
+        statement = MessageQueries.user_messages_page_statement("a@example.com", before=before, limit=20)
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+
+        assert "(messages.created_date, messages.id) < (" in sql
+        assert "ORDER BY messages.created_date DESC, messages.id DESC" in sql
+        # Bare boolean, exactly the partial index predicate
+        assert "AND messages.visible_to_user AND (messages.created_date, messages.id) < (" in " ".join(sql.split())
+        assert "IS true" not in sql
+        assert "LIMIT" in sql
+
+    @pytest.mark.asyncio
+    async def test_full_history_in_cache_skips_database(self):
+        self.cache.set_loader(lambda email, limit: [make_message(1), make_message(2)])
+        with patch.object(self.app, "message_cache", self.cache), \
+                patch.object(self.app, "load_history_page", side_effect=AssertionError("no DB read")):
+            page = await self.app.get_messages("a@example.com", limit=10)
+
+        assert [m["id"] for m in page["messages"]] == [str(uuid.UUID(int=n)) for n in (1, 2)]
+        assert page["next_before"] is None
+
+    @pytest.mark.asyncio
+    async def test_cache_short_page_is_filled_from_database(self):
+        older = [self.message_at(1), self.message_at(2)]
+        with patch.object(self.app, "message_cache", self.cache), \
+                patch.object(self.app, "load_history_page", return_value=older) as load_page:
+            page = await self.app.get_messages("a@example.com", limit=5)
+
+        email, cursor, limit, visible_only = load_page.call_args.args
+        assert cursor[1] == uuid.UUID(int=3) and limit == 2 and visible_only
+        assert [m["id"] for m in page["messages"]] == [str(uuid.UUID(int=n)) for n in (1, 2, 3, 4, 5)]
+        assert page["next_before"].endswith(str(uuid.UUID(int=1)))
+
+    @pytest.mark.asyncio
+    async def test_before_cursor_reads_database(self):
+        from fastapi import HTTPException
+        from queries import format_cursor, parse_cursor
+
+        anchor = self.message_at(9)
+        cursor = format_cursor(anchor.created_date, anchor.id)
+        with patch.object(self.app, "message_cache", self.cache), \
+                patch.object(self.app, "load_history_page", return_value=[self.message_at(7), self.message_at(8)]) as load_page:
+            page = await self.app.get_messages("a@example.com", limit=2, before=cursor)
+            with pytest.raises(HTTPException):
+                await self.app.get_messages("a@example.com", before="not-a-cursor")
+
+        load_page.assert_called_once_with("a@example.com", parse_cursor(cursor), 2, True)
+        assert page["count"] == 2
+        assert page["next_before"] == format_cursor(self.message_at(7).created_date, uuid.UUID(int=7))
+
+
+if __name__ == "__main__":
+    # Run tests directly
+    pytest.main([__file__, "-v"])
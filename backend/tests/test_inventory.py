@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the In-Memory Inventory Index
+
+Tests:
+1. Availability answers match the SQL: rent/unit_code order, notice units only when free by move-in
+2. Pricing lookups by (community, unit_code)
+3. Incremental refresh: changed rows replace old ones, overlapping polls are no-ops, lag is measured
+4. get_available_units / get_pricing use the index once loaded and SQL until then
+5. search_units filters (unit codes, rent range, bathrooms) match the search SQL
+
+Run with: python -m pytest tests/test_inventory.py -v
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from leasing_queries.inventory import InventoryIndex
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def unit_row(unit_id, unit_code, rent, status="available", bedrooms=2, available_at=None,
+             community_id="sunset-ridge", updated_at=T0):
+    return SimpleNamespace(
+        unit_id=unit_id, community_id=community_id, unit_code=unit_code, bedrooms=bedrooms,
+        bathrooms=2.0, rent=rent, specials=None, availability_status=status,
+        available_at=available_at, updated_at=updated_at, community_name="Sunset Ridge",
+    )
+
+
+def loaded_index(rows):
+    db = Mock()
+    db.execute.return_value.fetchall.return_value = rows
+    index = InventoryIndex()
+    index.load(db)
+    return index
+
+
+INVENTORY = [
+    unit_row("u1", "B201", 2100),
+    unit_row("u2", "A102", 1900),
+    unit_row("u3", "C301", 1900),
+    unit_row("u4", "D401", 1800, status="notice", available_at=datetime(2025, 3, 1, tzinfo=timezone.utc)),
+    unit_row("u5", "E501", 1500, status="occupied"),
+    unit_row("u6", "F601", 1200, bedrooms=1),
+]
+
+
+class TestInventoryQueries:
+    """Answers from the index match the availability and pricing SQL"""
+
+    def test_available_units_sorted_by_rent_then_code(self):
+        index = loaded_index(INVENTORY)
+        units = index.available_units("sunset-ridge", 2)
+        assert [unit["unit_code"] for unit in units] == ["A102", "C301", "B201"]
+        assert units[0] == {
+            'unit_id': 'u2', 'community_id': 'sunset-ridge', 'unit_code': 'A102', 'bedrooms': 2,
+            'bathrooms': 2.0, 'rent': 1900.0, 'specials': None, 'availability_status': 'available',
+            'available_at': None, 'community_name': 'Sunset Ridge',
+        }
+
+    def test_notice_units_only_when_free_by_move_in(self):
+        index = loaded_index(INVENTORY)
+        assert "D401" not in [u["unit_code"] for u in index.available_units("sunset-ridge", 2, "2025-02-15")]
+        units = index.available_units("sunset-ridge", 2, "2025-03-01")
+        assert [unit["unit_code"] for unit in units] == ["D401", "A102", "C301", "B201"]
+
+    def test_unknown_community_or_bedrooms(self):
+        index = loaded_index(INVENTORY)
+        assert index.available_units("no-such-community", 2) == []
+        assert index.available_units("sunset-ridge", 3) == []
+
+    def test_unit_lookup(self):
+        index = loaded_index(INVENTORY)
+        assert index.unit("sunset-ridge", "E501")["availability_status"] == "occupied"
+        assert index.unit("sunset-ridge", "Z999") is None
+        assert index.unit("other-community", "B201") is None
+
+    def test_results_are_copies(self):
+        index = loaded_index(INVENTORY)
+        index.unit("sunset-ridge", "B201")["rent"] = 0
+        assert index.unit("sunset-ridge", "B201")["rent"] == 2100.0
+
+
+class TestInventoryRefresh:
+    """Change polling keeps the index current"""
+
+    def test_changed_rows_replace_old_entries(self):
+        index = loaded_index(INVENTORY)
+        changed_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        index.apply([unit_row("u1", "B201", 1700, updated_at=changed_at),
+                     unit_row("u2", "A102", 1900, status="occupied", updated_at=changed_at)])
+        assert [u["unit_code"] for u in index.available_units("sunset-ridge", 2)] == ["B201", "C301"]
+        stats = index.stats()
+        assert stats["changes_applied"] == 2
+        assert stats["watermark"] == changed_at.isoformat()
+        assert 1 <= stats["last_change_lag_seconds"] < 60
+
+    def test_overlapping_poll_is_a_no_op(self):
+        index = loaded_index(INVENTORY)
+        snapshot = index._snapshot
+        index.apply([unit_row("u1", "B201", 2100)])
+        assert index._snapshot is snapshot
+        assert index.stats()["changes_applied"] == 0
+
+    def test_refresh_polls_from_watermark_minus_overlap(self):
+        index = loaded_index(INVENTORY)
+        db = Mock()
+        db.execute.return_value.fetchall.return_value = [unit_row("u7", "G701", 2500, updated_at=T0 + timedelta(minutes=1))]
+        assert index.refresh(db) == 1
+        assert db.execute.call_args[0][1] == {"since": T0 - index.overlap}
+        assert index.unit("sunset-ridge", "G701")["rent"] == 2500.0
+
+    def test_refresh_errors_are_counted(self):
+        index = loaded_index(INVENTORY)
+        db = Mock()
+        db.execute.side_effect = RuntimeError("database down")
+        with pytest.raises(RuntimeError):
+            index.refresh(db)
+        assert index.stats()["refresh_errors"] == 1
+        assert index.unit("sunset-ridge", "B201") is not None
+
+
+class TestQueryFallback:
+    """Leasing queries read from the index only once it is loaded"""
+
+    def test_sql_until_loaded(self):
+        from leasing_queries import get_available_units, get_pricing
+        db = Mock()
+        db.execute.return_value.fetchall.return_value = []
+        db.execute.return_value.fetchone.return_value = None
+        with patch('leasing_queries.unit_availability.inventory_index', InventoryIndex()), \
+             patch('leasing_queries.pricing.inventory_index', InventoryIndex()):
+            assert get_available_units(db, "sunset-ridge", 2) == []
+            assert get_pricing(db, "sunset-ridge", "B201") is None
+        assert db.execute.call_count == 2
+
+    def test_index_once_loaded(self):
+        from leasing_queries import get_available_units, get_pricing
+        index = loaded_index(INVENTORY)
+        db = Mock()
+        with patch('leasing_queries.unit_availability.inventory_index', index), \
+             patch('leasing_queries.pricing.inventory_index', index):
+            assert len(get_available_units(db, "sunset-ridge", 2)) == 3
+            assert get_pricing(db, "sunset-ridge", "B201")["rent"] == 2100.0
+        db.execute.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_async_twins_use_the_index(self):
+        from leasing_queries import get_available_units_async, get_pricing_async
+        index = loaded_index(INVENTORY)
+        db = Mock()
+        with patch('leasing_queries.unit_availability.inventory_index', index), \
+             patch('leasing_queries.pricing.inventory_index', index):
+            assert len(await get_available_units_async(db, "sunset-ridge", 2)) == 3
+            assert (await get_pricing_async(db, "sunset-ridge", "A102"))["unit_code"] == "A102"
+        db.execute.assert_not_called()
+
+
+class TestInventorySearch:
+    """Composite availability + pricing search from the index"""
+
+    def test_listed_units_with_filters(self):
+        index = loaded_index(INVENTORY)
+        assert [u["unit_code"] for u in index.search("sunset-ridge")] == ["F601", "A102", "C301", "B201"]
+        assert [u["unit_code"] for u in index.search("sunset-ridge", bedrooms=2, max_rent=2000)] == ["A102", "C301"]
+        assert [u["unit_code"] for u in index.search("sunset-ridge", min_rent=1850, move_in_date="2025-03-01")] == ["A102", "C301", "B201"]
+        assert [u["unit_code"] for u in index.search("sunset-ridge", max_rent=1800, move_in_date="2025-03-01")] == ["F601", "D401"]
+        assert index.search("sunset-ridge", min_bathrooms=2.5) == []
+
+    def test_unit_codes_return_any_status(self):
+        index = loaded_index(INVENTORY)
+        units = index.search("sunset-ridge", unit_codes=["E501", "B201", "Z999"])
+        assert [(u["unit_code"], u["availability_status"]) for u in units] == [("E501", "occupied"), ("B201", "available")]
+        assert units[1]["rent"] == 2100.0 and units[1]["available_at"] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
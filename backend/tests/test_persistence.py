@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Turn Persistence
+
+Tests the turn unit of work and writers against a fake AsyncSession:
+1. plan_user_write for new, unchanged and updated users
+2. write_turns issues one user upsert, one multi-row message INSERT and one commit
+3. Upsert RETURNING remaps messages onto the stored user_id
+4. TurnWriter commits once per turn
+5. GroupCommitWriter batches concurrent turns into one transaction
+6. A failed group batch is retried per turn so only the bad turn fails
+7. Journal records round-trip and replay skips committed turns and torn lines
+8. WriteBehindWriter acknowledges after fsync, drains in the background and compacts off the event loop
+9. Turns journaled during a database outage are replayed on the next start
+   and a turn the database rejects is dead-lettered without blocking the rest
+10. Monthly partitions: creation window, retention cutoff, verified gzip export before drop
+
+Run with: python -m pytest tests/test_persistence.py -v
+"""
+
+import asyncio
+import json
+import pytest
+import sys
+import os
+import threading
+import uuid
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy.dialects import postgresql
+
+from persistence import GroupCommitWriter, Turn, TurnJournal, TurnWriter, WriteBehindWriter, new_message, write_turns
+from user_service import plan_user_write
+
+
+class FakeSession:
+    """Records executed statements and commits; acts as its own session factory"""
+
+    def __init__(self, returning=None, fail_when=None):
+        self.statements = []
+        self.commits = 0
+        self.returning = returning or []
+        self.fail_when = fail_when  # Predicate over the batch's statement params
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def execute(self, statement):
+        compiled = statement.compile(dialect=postgresql.dialect())
+        if self.fail_when and self.fail_when(compiled.params):
+            raise RuntimeError("insert failed")
+        self.statements.append(compiled)
+        return SimpleNamespace(all=lambda: self.returning)
+
+    async def commit(self):
+        self.commits += 1
+
+
+class DownSession(FakeSession):
+    """A database that refuses every statement"""
+
+    async def execute(self, statement):
+        raise ConnectionError("database unavailable")
+
+
+def make_turn(email: str, write_user: bool = True, content: str = "Any 2 bedrooms?") -> Turn:
+    user, _ = plan_user_write(None, email=email, name="Jane")
+    question = new_message("user", content, user_id=user.user_id)
+    answer = new_message("assistant", "Yes, B201.", user_id=user.user_id, parent_id=question.id)
+    return Turn(user, write_user, [question, answer])
+
+
+class TestPlanUserWrite:
+    """User state is resolved in memory; the write is deferred to the turn"""
+
+    def test_new_user_gets_client_id(self):
+        user, write_user = plan_user_write(None, email=" jane@example.com ", name="Jane", preferences={"bedrooms": 2})
+
+        assert write_user
+        assert isinstance(user.user_id, uuid.UUID)
+        assert user.email == "jane@example.com"
+        assert user.preferences == {"bedrooms": 2}
+
+    def test_existing_user_unchanged_and_updated(self):
+        existing, _ = plan_user_write(None, email="jane@example.com", name="Jane", preferences={"bedrooms": 2})
+
+        assert plan_user_write(existing, email="jane@example.com", name="Jane") == (existing, False)
+        user, write_user = plan_user_write(existing, email="jane@example.com", name="Jane", preferences={"pets": True})
+        assert write_user
+        assert user.preferences == {"bedrooms": 2, "pets": True}
+
+    def test_requires_name(self):
+        with pytest.raises(ValueError):
+            plan_user_write(None, email="jane@example.com", name=" ")
+
+
+class TestWriteTurns:
+    """All rows of a batch go out in two statements and one commit"""
+
+    @pytest.mark.asyncio
+    async def test_multi_row_statements_single_commit(self):
+        db = FakeSession()
+        turns = [make_turn("a@example.com"), make_turn("b@example.com", write_user=False)]
+
+        written = await write_turns(db, turns)
+
+        assert written == 4
+        assert db.commits == 1
+        upsert, insert = db.statements
+        assert "ON CONFLICT (email) DO UPDATE" in str(upsert)
+        assert "|| excluded.preferences" in str(upsert)
+        assert "RETURNING" in str(upsert)
+        assert sum(1 for key in upsert.params if key.startswith("email")) == 1
+        assert str(insert).startswith("INSERT INTO messages")
+        assert sum(1 for key in insert.params if key.startswith("id")) == 4
+
+    @pytest.mark.asyncio
+    async def test_messages_follow_stored_user_id(self):
+        turn = make_turn("a@example.com")
+        stored_id = uuid.UUID(int=7)
+        db = FakeSession(returning=[("a@example.com", stored_id, "Jane", {})])
+
+        await write_turns(db, [turn])
+
+        insert = db.statements[-1]
+        assert {value for key, value in insert.params.items() if key.startswith("user_id")} == {stored_id}
+
+    @pytest.mark.asyncio
+    async def test_no_user_write_skips_upsert(self):
+        db = FakeSession()
+
+        await write_turns(db, [make_turn("a@example.com", write_user=False)])
+
+        assert len(db.statements) == 1
+        assert db.commits == 1
+
+
+class TestWriters:
+    """Turn and group-commit writers"""
+
+    @pytest.mark.asyncio
+    async def test_turn_writer_one_commit_per_turn(self):
+        db = FakeSession()
+        writer = TurnWriter(session_factory=db)
+
+        for n in range(3):
+            await writer.submit(make_turn(f"lead-{n}@example.com"))
+
+        assert db.commits == 3
+        assert writer.stats()["turns_per_commit"] == 1
+
+    @pytest.mark.asyncio
+    async def test_group_commit_batches_concurrent_turns(self):
+        db = FakeSession()
+        writer = GroupCommitWriter(session_factory=db, max_batch=50, max_delay=0.05)
+        await writer.start()
+
+        await asyncio.gather(*(writer.submit(make_turn(f"lead-{n}@example.com")) for n in range(20)))
+        await writer.stop()
+
+        assert db.commits == 1
+        stats = writer.stats()
+        assert stats["turns"] == 20
+        assert stats["messages"] == 40
+        assert stats["turns_per_commit"] == 20
+
+    @pytest.mark.asyncio
+    async def test_group_commit_respects_max_batch(self):
+        db = FakeSession()
+        writer = GroupCommitWriter(session_factory=db, max_batch=4, max_delay=0.05)
+        await writer.start()
+
+        await asyncio.gather(*(writer.submit(make_turn(f"lead-{n}@example.com")) for n in range(10)))
+        await writer.stop()
+
+        assert db.commits == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_fails_only_bad_turn(self):
+        # Any statement carrying the bad content fails
+        db = FakeSession(fail_when=lambda params: any(
+            isinstance(value, dict) and value.get("content") == "bad" for value in params.values()
+        ))
+        writer = GroupCommitWriter(session_factory=db, max_batch=10, max_delay=0.05)
+        await writer.start()
+
+        results = await asyncio.gather(
+            writer.submit(make_turn("a@example.com")),
+            writer.submit(make_turn("b@example.com", content="bad")),
+            writer.submit(make_turn("c@example.com")),
+            return_exceptions=True,
+        )
+        await writer.stop()
+
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], RuntimeError)
+        assert db.commits == 2
+        assert writer.stats()["failures"] == 2  # The batch, then the bad turn on retry
+
+    @pytest.mark.asyncio
+    async def test_unstarted_group_writer_writes_directly(self):
+        db = FakeSession()
+        writer = GroupCommitWriter(session_factory=db)
+
+        await writer.submit(make_turn("a@example.com"))
+
+        assert db.commits == 1
+
+
+class TestJournal:
+    """Append-only journal with commit markers"""
+
+    def test_turn_record_round_trip(self):
+        turn = make_turn("a@example.com")
+
+        restored = Turn.from_record(turn.to_record())
+
+        assert restored.email == turn.email
+        assert restored.user.user_id == turn.user.user_id
+        assert restored.write_user
+        assert restored.messages == turn.messages
+
+    def test_replay_skips_committed_and_torn_lines(self, tmp_path):
+        path = str(tmp_path / "journal.jsonl")
+        journal = TurnJournal(path)
+        journal.open()
+        first = journal.append(make_turn("a@example.com"))
+        journal.append(make_turn("b@example.com"))
+        journal.mark_committed([first])
+        journal.sync()
+        journal.close()
+        with open(path, "ab") as f:
+            f.write(b'{"seq": 3, "tu')  # Crash mid-append
+
+        reopened = TurnJournal(path)
+        pending = reopened.open()
+
+        assert [(seq, turn.email) for seq, turn in pending] == [(2, "b@example.com")]
+        # The rewritten journal holds only the pending turn, and numbering continues
+        assert reopened.append(make_turn("c@example.com")) == 3
+        reopened.close()
+
+
+class TestWriteBehind:
+    """Replies wait for the journal fsync, not for Postgres"""
+
+    @pytest.mark.asyncio
+    async def test_acknowledges_before_database_write(self, tmp_path):
+        db = FakeSession()
+        writer = WriteBehindWriter(str(tmp_path / "journal.jsonl"), session_factory=db, drain_interval=10)
+        await writer.start()
+        writer._tasks[1].cancel()  # Hold the drain so the turn stays pending
+
+        turn = make_turn("a@example.com")
+        await asyncio.gather(*(writer.submit(t) for t in [turn, make_turn("b@example.com")]))
+
+        assert db.commits == 0
+        assert writer.journal.fsyncs == 1  # Both replies shared one fsync
+        assert writer.pending_messages("a@example.com") == turn.messages
+        pending_user = writer.pending_user("a@example.com")
+        assert (pending_user.user_id, pending_user.name) == (turn.user.user_id, turn.user.name)
+        assert writer.stats()["pending_turns"] == 2
+
+        await writer.stop()
+
+        assert db.commits == 1
+        assert writer.stats()["pending_turns"] == 0
+        assert writer.pending_messages("a@example.com") == []
+
+    @pytest.mark.asyncio
+    async def test_pending_user_is_a_copy(self, tmp_path):
+        writer = WriteBehindWriter(str(tmp_path / "journal.jsonl"), session_factory=FakeSession(), drain_interval=10)
+        await writer.start()
+        writer._tasks[1].cancel()
+        turn = make_turn("a@example.com")
+        await writer.submit(turn)
+
+        # The next request plans its own changes on the pending state
+        user, write_user = plan_user_write(writer.pending_user("a@example.com"), email="a@example.com",
+                                           name="Janet", preferences={"pets": True})
+
+        assert write_user and user is not turn.user
+        assert (turn.user.name, turn.user.preferences) == ("Jane", {})
+        await writer.stop()
+
+    @pytest.mark.asyncio
+    async def test_compaction_runs_off_the_event_loop(self, tmp_path):
+        path = str(tmp_path / "journal.jsonl")
+        writer = WriteBehindWriter(path, session_factory=FakeSession(), drain_interval=10, compact_bytes=1)
+        await writer.start()
+        writer._tasks[1].cancel()  # Drain by hand
+        await writer.submit(make_turn("a@example.com"))
+
+        started, release = threading.Event(), threading.Event()
+        rewrite = writer.journal.rewrite
+
+        def slow_rewrite(pending):
+            started.set()
+            release.wait(2)
+            rewrite(pending)
+
+        with patch.object(writer.journal, "rewrite", side_effect=slow_rewrite):
+            drain = asyncio.create_task(writer._drain_once())
+            # The loop keeps running while the rewrite blocks its thread
+            while not started.is_set():
+                await asyncio.sleep(0.001)
+            late = asyncio.create_task(writer.submit(make_turn("b@example.com")))
+            await asyncio.sleep(0.02)
+            # The append waits for the rewrite instead of interleaving with it
+            assert not late.done()
+            assert writer.stats()["pending_turns"] == 0
+            release.set()
+            await drain
+            await late
+
+        with open(path) as f:
+            emails = [json.loads(line)["turn"]["user"]["email"] for line in f if '"seq"' in line]
+        assert emails == ["b@example.com"]
+        await writer.stop()
+
+    @pytest.mark.asyncio
+    async def test_drains_in_background(self, tmp_path):
+        db = FakeSession()
+        writer = WriteBehindWriter(str(tmp_path / "journal.jsonl"), session_factory=db, drain_interval=0.01)
+        await writer.start()
+
+        await writer.submit(make_turn("a@example.com"))
+        for _ in range(100):
+            if db.commits:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+
+        assert db.commits == 1
+        assert writer.stats()["messages"] == 2
+
+    @pytest.mark.asyncio
+    async def test_rejected_turn_is_dead_lettered(self, tmp_path):
+        path = str(tmp_path / "journal.jsonl")
+        # The database is up but rejects any statement carrying the poison content
+        db = FakeSession(fail_when=lambda params: any(
+            isinstance(value, dict) and value.get("content") == "poison" for value in params.values()
+        ))
+        writer = WriteBehindWriter(path, session_factory=db, drain_interval=0.01)
+        await writer.start()
+        writer._tasks[1].cancel()  # Queue everything before the drain starts
+        await asyncio.gather(writer._tasks[1], return_exceptions=True)
+
+        poison = make_turn("bad@example.com", content="poison")
+        good = [make_turn(f"user{i}@example.com") for i in range(3)]
+        for turn in [poison, *good]:
+            await writer.submit(turn)
+        writer._tasks[1] = asyncio.create_task(writer._drain_loop())
+        for _ in range(100):
+            if not writer.stats()["pending_turns"]:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+
+        # The good turns behind it reached the database; the poison turn was set aside
+        stats = writer.stats()
+        assert (stats["pending_turns"], stats["dead_lettered_turns"]) == (0, 1)
+        assert stats["turns"] == 3
+        with open(writer.journal.dead_letter_path) as f:
+            dead, = [json.loads(line) for line in f]
+        assert dead["turn"]["user"]["email"] == "bad@example.com"
+        assert dead["error"] == "RuntimeError: insert failed"
+        assert TurnJournal(path).open() == []
+
+    @pytest.mark.asyncio
+    async def test_outage_is_not_dead_lettered(self, tmp_path):
+        writer = WriteBehindWriter(str(tmp_path / "journal.jsonl"), session_factory=DownSession(), drain_interval=0.01)
+        await writer.start()
+        await writer.submit(make_turn("a@example.com"))
+        await asyncio.sleep(0.1)  # Several failed drains of a batch of one
+        await writer.stop()
+
+        assert (writer.stats()["pending_turns"], writer.stats()["dead_lettered_turns"]) == (1, 0)
+        assert not os.path.exists(writer.journal.dead_letter_path)
+
+    @pytest.mark.asyncio
+    async def test_outage_turns_replayed_on_restart(self, tmp_path):
+        path = str(tmp_path / "journal.jsonl")
+        down = WriteBehindWriter(path, session_factory=DownSession(), drain_interval=0.01)
+        await down.start()
+
+        turn = make_turn("a@example.com")
+        await down.submit(turn)  # Acknowledged even though Postgres is down
+        await down.stop()
+
+        assert down.stats()["pending_turns"] == 1
+
+        db = FakeSession()
+        restarted = WriteBehindWriter(path, session_factory=db, drain_interval=0.01)
+        await restarted.start()
+
+        assert restarted.replayed == 1
+        assert [message.id for message in restarted.pending_messages("a@example.com")] == [m.id for m in turn.messages]
+        await restarted.stop()
+
+        assert db.commits == 1
+        assert "ON CONFLICT DO NOTHING" in str(db.statements[-1])
+        assert TurnJournal(path).open() == []
+
+
+class FakeCopyConnection:
+    """SQLAlchemy Connection stand-in: COUNT(*) results plus a psycopg-style COPY stream"""
+
+    def __init__(self, csv_text: str, count: int):
+        self.executed = []
+        self.count = count
+        cursor = Mock()
+        cursor.__enter__ = Mock(return_value=cursor)
+        cursor.__exit__ = Mock(return_value=False)
+        copy = Mock()
+        copy.__enter__ = Mock(side_effect=lambda: iter([csv_text.encode()]))
+        copy.__exit__ = Mock(return_value=False)
+        cursor.copy.return_value = copy
+        self.cursor = cursor
+        self.connection = SimpleNamespace(driver_connection=SimpleNamespace(cursor=lambda: cursor))
+
+    def execute(self, statement, params=None):
+        self.executed.append(str(statement))
+        return SimpleNamespace(scalar=lambda: self.count)
+
+
+class TestPartitions:
+    """Monthly messages partitions: creation, retention and archival"""
+
+    def test_month_arithmetic_and_names(self):
+        from datetime import date
+        from persistence.partitions import add_months, partition_name
+
+        assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+        assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+        assert partition_name(date(2025, 3, 1)) == "messages_y2025m03"
+
+    def test_ensure_covers_this_month_and_months_ahead(self):
+        from datetime import date
+        from persistence import ensure_future_partitions
+
+        connection = Mock()
+        connection.execute.return_value.scalar.return_value = 2
+
+        assert ensure_future_partitions(connection, months_ahead=3, today=date(2025, 11, 20)) == 2
+        statement, params = connection.execute.call_args.args
+        assert "create_message_partitions('messages'" in str(statement)
+        assert params == {"from_month": date(2025, 11, 1), "through_month": date(2026, 2, 1)}
+        connection.commit.assert_called_once()
+
+    def test_retention_keeps_current_month_and_window(self):
+        from datetime import date
+        from persistence.partitions import MessagePartition, expired_partitions
+
+        partitions = [MessagePartition(f"messages_y2025m{m:02d}", date(2025, m, 1), True) for m in range(1, 13)]
+        expired = expired_partitions(partitions, retain_months=3, today=date(2025, 12, 5))
+
+        assert [p.name for p in expired] == [f"messages_y2025m{m:02d}" for m in range(1, 10)]
+
+    def test_export_writes_verified_gzip(self, tmp_path):
+        import gzip
+        from persistence.partitions import export_partition
+
+        csv_text = 'id,message\n1,"{""content"": ""hi""}"\n2,"{""content"": ""there""}"\n'
+        connection = FakeCopyConnection(csv_text, count=2)
+        result = export_partition(connection, "messages_y2024m01", str(tmp_path))
+
+        assert result["rows"] == 2
+        assert result["path"].endswith("messages_y2024m01.csv.gz")
+        with gzip.open(result["path"], "rt") as exported:
+            assert exported.read() == csv_text
+        assert "ORDER BY created_date, id) TO STDOUT WITH (FORMAT csv, HEADER)" in connection.cursor.copy.call_args.args[0]
+        assert list(tmp_path.iterdir()) == [tmp_path / "messages_y2024m01.csv.gz"]  # No .tmp left behind
+
+    def test_export_row_mismatch_keeps_partition(self, tmp_path):
+        from persistence.partitions import export_partition
+
+        with pytest.raises(RuntimeError):
+            export_partition(FakeCopyConnection("id\n1\n", count=5), "messages_y2024m01", str(tmp_path))
+        with pytest.raises(ValueError):
+            export_partition(FakeCopyConnection("", count=0), "users; DROP TABLE users", str(tmp_path))
+
+    def test_archive_detaches_exports_then_drops(self, tmp_path):
+        from datetime import date
+        from persistence.partitions import MessagePartition, archive_expired_partitions
+
+        connection = FakeCopyConnection("id\n1\n", count=1)
+        engine = Mock()
+        engine.connect.return_value.execution_options.return_value.__enter__ = Mock(return_value=connection)
+        engine.connect.return_value.execution_options.return_value.__exit__ = Mock(return_value=False)
+        partitions = [
+            MessagePartition("messages_y2024m01", date(2024, 1, 1), False),  # Left detached by a failed run
+            MessagePartition("messages_y2024m02", date(2024, 2, 1), True),
+            MessagePartition("messages_y2025m11", date(2025, 11, 1), True),
+        ]
+        with patch("persistence.partitions.list_partitions", return_value=partitions):
+            archived = archive_expired_partitions(engine, str(tmp_path), retain_months=12, today=date(2025, 11, 20))
+
+        assert [result["partition"] for result in archived] == ["messages_y2024m01", "messages_y2024m02"]
+        engine.connect.return_value.execution_options.assert_called_once_with(isolation_level="AUTOCOMMIT")
+        ddl = [sql for sql in connection.executed if not sql.startswith("SELECT")]
+        assert ddl == [
+            'DROP TABLE "messages_y2024m01"',
+            'ALTER TABLE messages DETACH PARTITION "messages_y2024m02" CONCURRENTLY',
+            'DROP TABLE "messages_y2024m02"',
+        ]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Speculative Routing
+
+Tests:
+1. BOOKING_INFO: the booking prompt runs while the router classifies, and its answer is used
+2. MALICIOUS_QUERY: the speculative prompt stops before its tool calls, and its tokens are counted as wasted
+3. A failed classification discards the speculation
+4. A cancelled prompt makes no LLM calls at all
+
+Run with: python -m pytest tests/test_speculation.py -v
+"""
+
+import pytest
+import sys
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from booking_agent.preclassifier import Preclassifier
+from booking_agent.speculation import SpeculationCancelled, SpeculativeExecutor
+from schemas import BookingResponse
+
+AMBIGUOUS_QUERY = "what model are you running on"
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def speculative_agent(router_reply, booking_response):
+    agent = Mock(tool_impls={}, tools_spec=[{}], _single_pass=True, _speculative_routing=True)
+    router = Mock(usage=None)
+    router.choices = [Mock(message=Mock(content=router_reply))]
+    agent.client.chat.completions.create.return_value = router
+    agent.client.beta.chat.completions.parse.side_effect = booking_response
+    return agent
+
+
+def run_router(agent, executor):
+    from booking_agent.prompts.router_prompt import RouterPrompt
+    with patch("booking_agent.prompts.router_prompt.preclassifier", Preclassifier(shadow_rate=0)), \
+         patch("booking_agent.prompts.router_prompt.speculative_executor", executor):
+        return RouterPrompt(AMBIGUOUS_QUERY, context={"community_id": "sunset-ridge"}).execute(agent, [], request_id="req-1")
+
+
+class TestSpeculativeRouting:
+    """RouterPrompt with AGENT_SPECULATIVE_ROUTING on"""
+
+    def test_booking_runs_during_classification(self):
+        booking_started = threading.Event()
+        answer = Mock(usage=None)
+        answer.choices = [Mock(message=Mock(tool_calls=None, parsed=BookingResponse(reply="How many bedrooms?")))]
+
+        def booking(**kwargs):
+            booking_started.set()
+            return answer
+
+        agent = speculative_agent("BOOKING_INFO", booking)
+        # The router's call only returns once the booking call has started: the two overlap
+        router_response = agent.client.chat.completions.create.return_value
+        agent.client.chat.completions.create.side_effect = lambda **kwargs: booking_started.wait(2) and router_response
+
+        executor = SpeculativeExecutor(max_workers=2)
+        result = run_router(agent, executor)
+
+        assert result.reply == "How many bedrooms?"
+        # The speculative prompt saw the history without the classification exchange
+        booking_messages = agent.client.beta.chat.completions.parse.call_args.kwargs["messages"]
+        assert not any("[ROUTING:" in str(m.get("content")) for m in booking_messages)
+        stats = executor.stats()
+        assert (stats["started"], stats["committed"], stats["discarded"]) == (1, 1, 0)
+        assert "hits" not in stats  # Only its own counters, none of the cache's
+        executor.shutdown()
+
+    def test_malicious_route_cancels_before_tools(self):
+        executor = SpeculativeExecutor(max_workers=2)
+        call = Mock(id="call_1")
+        call.function.name = "check_availability"
+        call.function.arguments = '{"community_id": "sunset-ridge", "bedrooms": 2}'
+        wants_tools = Mock(usage=Mock(prompt_tokens=100, completion_tokens=20, total_tokens=120))
+        wants_tools.choices = [Mock(message=Mock(tool_calls=[call], content=None, parsed=None))]
+
+        def booking(**kwargs):
+            # Hold the first booking call until the router has rejected the turn
+            wait_for(lambda: executor.counters.discarded)
+            return wants_tools
+
+        agent = speculative_agent("MALICIOUS_QUERY", booking)
+        agent.tool_impls = {"check_availability": Mock()}
+
+        result = run_router(agent, executor)
+
+        assert result.action.value == "handoff_human"
+        wait_for(lambda: executor.counters.cancelled_early)
+        agent.tool_impls["check_availability"].assert_not_called()
+        assert agent.client.beta.chat.completions.parse.call_count == 1
+        stats = executor.stats()
+        assert (stats["discarded"], stats["wasted_llm_calls"], stats["wasted_tokens"]) == (1, 1, 120)
+        executor.shutdown()
+
+    def test_router_failure_discards_speculation(self):
+        executor = SpeculativeExecutor(max_workers=1)
+        agent = speculative_agent("BOOKING_INFO", lambda **kwargs: None)
+        agent.client.chat.completions.create.side_effect = RuntimeError("router down")
+
+        with pytest.raises(RuntimeError):
+            run_router(agent, executor)
+        assert executor.stats()["discarded"] == 1
+        executor.shutdown()
+
+    def test_cancelled_prompt_makes_no_calls(self):
+        from booking_agent.prompts.base_prompt import ToolPrompt
+        agent = Mock(tool_impls={}, tools_spec=[{}], _single_pass=True)
+        prompt = ToolPrompt("hello")
+        prompt.cancel_event = threading.Event()
+        prompt.cancel_event.set()
+
+        with pytest.raises(SpeculationCancelled):
+            prompt.execute(agent, [], request_id="req-1")
+        agent.client.beta.chat.completions.parse.assert_not_called()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,14 +1,75 @@
 """
 User service for managing user storage and preferences
 """
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import user_cache
 from models import User
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+def _validate_identity(email: str, name: str) -> Tuple[str, str]:
+    """Check required fields and strip whitespace"""
+    if not email or not email.strip():
+        raise ValueError("Email is required for user creation")
+    
+    if not name or not name.strip():
+        raise ValueError("Name is required for user creation")
+    
+    return email.strip(), name.strip()
+
+def _apply_user_updates(user: User, name: str, preferences: Optional[Dict[str, Any]]) -> bool:
+    """Update an existing user's name and merged preferences; returns True if anything changed"""
+    updated = False
+    
+    if name and user.name != name:
+        user.name = name
+        updated = True
+        
+    if preferences:
+        # Merge preferences (new preferences override existing ones)
+        current_prefs = user.preferences or {}
+        merged_prefs = {**current_prefs, **preferences}
+        
+        if merged_prefs != current_prefs:
+            user.preferences = merged_prefs
+            updated = True
+    
+    return updated
+
+def upsert_user_statement(email: str, name: str, preferences: Optional[Dict[str, Any]] = None):
+    """
+    One-statement get-or-create: INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING.
+    An existing user's preferences are merged in SQL (preferences || new), so
+    concurrent requests can't overwrite each other's keys and there is no
+    SELECT-then-write race to handle.
+    """
+    statement = pg_insert(User).values(
+        user_id=uuid.uuid4(),
+        email=email,
+        name=name,
+        preferences=preferences or {},
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[User.email],
+        set_={
+            "name": statement.excluded.name,
+            "preferences": func.coalesce(User.preferences, text("'{}'::jsonb")).op("||")(statement.excluded.preferences),
+        },
+    ).returning(User)
+
+def _cached_user(email: str, name: str, preferences: Optional[Dict[str, Any]]) -> Optional[User]:
+    """The cached user if this request wouldn't change it (no DB round trip needed)"""
+    cached = user_cache.get(email)
+    if cached is not None and cached.satisfies(name, preferences):
+        return cached.to_user()
+    return None
+
 def get_or_create_user(
     db: Session, 
     email: str, 
@@ -16,13 +77,16 @@ def get_or_create_user(
     preferences: Optional[Dict[str, Any]] = None
 ) -> User:
     """
-    Get existing user or create new one with upsert pattern.
+    Get existing user or create new one with a single upsert statement.
+    A known lead whose name and preferences are unchanged is served from the
+    in-process user cache (cache.user_cache) as a detached User, without
+    touching the database.
     
     Args:
         db: Database session
         email: User email (unique identifier, required)
         name: User display name (required)
-        preferences: User preferences dictionary
+        preferences: User preferences dictionary (merged into existing ones)
     
     Returns:
         User object (existing or newly created)
@@ -30,75 +94,121 @@ def get_or_create_user(
     Raises:
         ValueError: If email or name is None or empty
     """
+    # Validate required fields
+    email, name = _validate_identity(email, name)
+    
+    user = _cached_user(email, name, preferences)
+    if user is not None:
+        return user
+    
     try:
-        # Validate required fields
-        if not email or not email.strip():
-            raise ValueError("Email is required for user creation")
-        
-        if not name or not name.strip():
-            raise ValueError("Name is required for user creation")
-        
-        email = email.strip()
-        name = name.strip()
-        
-        # Try to get existing user
-        user = db.query(User).filter(User.email == email).first()
-        
-        if user:
-            # Update existing user if data has changed
-            updated = False
-            
-            if name and user.name != name:
-                user.name = name
-                updated = True
-                
-            if preferences:
-                # Merge preferences (new preferences override existing ones)
-                current_prefs = user.preferences or {}
-                merged_prefs = {**current_prefs, **preferences}
-                
-                if merged_prefs != current_prefs:
-                    user.preferences = merged_prefs
-                    updated = True
-            
-            if updated:
-                db.commit()
-                logger.info(f"Updated existing user: {email}")
-            
-            return user
-        
-        else:
-            # Create new user
-            new_user = User(
-                email=email,
-                name=name,
-                preferences=preferences or {}
-            )
-            
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)  # Get the generated user_id
-            
-            logger.info(f"Created new user: {email} with ID: {new_user.user_id}")
-            return new_user
-            
-    except IntegrityError as e:
-        # Handle race condition where another request created the user
-        db.rollback()
-        logger.warning(f"Race condition creating user {email}, retrying...")
-        
-        # Try to get the user that was created by another request
-        user = db.query(User).filter(User.email == email).first()
-        if user:
-            return user
-        else:
-            # If still not found, re-raise the error
-            raise e
+        user = db.scalars(
+            upsert_user_statement(email, name, preferences),
+            execution_options={"populate_existing": True},
+        ).one()
+        user_cache.put_user(user)
+        db.commit()
+        return user
     except Exception as e:
         db.rollback()
+        user_cache.invalidate(email)
         logger.error(f"Error in get_or_create_user for {email}: {str(e)}")
         raise e
 
+async def get_or_create_user_async(
+    db: AsyncSession, 
+    email: str, 
+    name: str, 
+    preferences: Optional[Dict[str, Any]] = None
+) -> User:
+    """
+    Async version of get_or_create_user for AsyncSession (see globals.get_async_db).
+    
+    Args:
+        db: Async database session
+        email: User email (unique identifier, required)
+        name: User display name (required)
+        preferences: User preferences dictionary (merged into existing ones)
+    
+    Returns:
+        User object (existing or newly created)
+    
+    Raises:
+        ValueError: If email or name is None or empty
+    """
+    email, name = _validate_identity(email, name)
+    
+    user = _cached_user(email, name, preferences)
+    if user is not None:
+        return user
+    
+    try:
+        result = await db.scalars(
+            upsert_user_statement(email, name, preferences),
+            execution_options={"populate_existing": True},
+        )
+        user = result.one()
+        user_cache.put_user(user)
+        await db.commit()
+        return user
+    except Exception as e:
+        await db.rollback()
+        user_cache.invalidate(email)
+        logger.error(f"Error in get_or_create_user_async for {email}: {str(e)}")
+        raise e
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[User]:
+    """
+    Async version of get_user_by_email, served from the user cache when possible.
+    The session only checks out a connection on a cache miss.
+    
+    Args:
+        db: Async database session
+        email: User email
+    
+    Returns:
+        User object (a detached copy on a cache hit) or None if not found
+    """
+    cached = user_cache.get(email)
+    if cached is not None:
+        return cached.to_user()
+    
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    if user is not None:
+        user_cache.put_user(user)
+    return user
+
+def plan_user_write(
+    existing: Optional[User], 
+    email: str, 
+    name: str, 
+    preferences: Optional[Dict[str, Any]] = None
+) -> Tuple[User, bool]:
+    """
+    Work out a user's state for this request without touching the database.
+    The write itself is deferred to the turn's single transaction (see persistence).
+    
+    Args:
+        existing: The user as currently stored (detached), or None if new
+        email: User email (unique identifier, required)
+        name: User display name (required)
+        preferences: User preferences to merge
+    
+    Returns:
+        (user, needs_write): a new User with a client-generated user_id, or the
+        existing user with name/preferences applied, and whether it changed
+    
+    Raises:
+        ValueError: If email or name is None or empty
+    """
+    email, name = _validate_identity(email, name)
+    
+    if existing is None:
+        return User(user_id=uuid.uuid4(), email=email, name=name, preferences=preferences or {}), True
+    
+    return existing, _apply_user_updates(existing, name, preferences)
+
 def update_user_preferences(
     db: Session, 
     user_id: str, 
@@ -121,6 +231,7 @@ def update_user_preferences(
         if user:
             user.update_preferences(preferences)
             db.commit()
+            user_cache.invalidate(user.email)
             logger.info(f"Updated preferences for user {user_id}")
             return user
         else:
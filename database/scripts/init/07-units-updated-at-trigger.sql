@@ -0,0 +1,20 @@
+-- Migration: Keep units.updated_at current so the API's inventory index can poll for changes
+-- Each API process holds the units inventory in memory and re-reads rows with
+-- updated_at past its last watermark (see backend/leasing_queries/inventory.py)
+
+-- Touch updated_at on every update, whether or not the writer remembered to
+CREATE OR REPLACE FUNCTION units_touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS units_touch_updated_at ON units;
+CREATE TRIGGER units_touch_updated_at
+    BEFORE UPDATE ON units
+    FOR EACH ROW
+    EXECUTE FUNCTION units_touch_updated_at();
+
+-- Index for the change poll: WHERE updated_at > :since
+CREATE INDEX IF NOT EXISTS units_updated_at_idx ON units (updated_at);
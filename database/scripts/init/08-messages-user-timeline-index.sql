@@ -0,0 +1,16 @@
+-- Migration: Composite indexes for reading one user's message timeline
+-- /api/messages pages through a user's history newest first with a keyset
+-- cursor (created_date, id); these indexes serve every page with one index
+-- range scan, however deep into the conversation it is
+
+-- Full timeline (include_hidden=true, cache hydration)
+CREATE INDEX IF NOT EXISTS idx_messages_user_timeline
+    ON messages (user_id, created_date DESC, id DESC);
+
+-- Visible messages only (the default for /api/messages)
+CREATE INDEX IF NOT EXISTS idx_messages_user_visible_timeline
+    ON messages (user_id, created_date DESC, id DESC)
+    WHERE visible_to_user;
+
+-- Refresh planner statistics for the new indexes
+ANALYZE messages;
@@ -0,0 +1,87 @@
+-- Migration: Range-partition messages by month of created_date
+-- Inserts only maintain the current month's (small) indexes, and old months
+-- are removed by detaching a partition instead of DELETE + VACUUM.
+-- backend/scripts/manage_message_partitions.py creates future months
+-- (the API also does it at startup) and archives expired months to
+-- compressed files.
+--
+-- The table keeps its name and columns, so the ORM and MessageQueries are
+-- unchanged. A partitioned table's primary key must include the partition
+-- key, so it becomes (id, created_date); ids are still random UUIDs.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS messages_partitioned (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    message JSONB NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    visible_to_user BOOLEAN DEFAULT TRUE NOT NULL,
+    step_id VARCHAR(20),
+    parent_id UUID,
+    user_id UUID REFERENCES users(user_id) ON DELETE SET NULL,
+    created_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_date)
+) PARTITION BY RANGE (created_date);
+
+-- Create the monthly partitions covering [from_month, through_month]; returns how many were new
+CREATE OR REPLACE FUNCTION create_message_partitions(parent REGCLASS, from_month DATE, through_month DATE)
+RETURNS INT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::DATE;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month_start <= through_month LOOP
+        partition_name := format('messages_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, month_start, (month_start + INTERVAL '1 month')::DATE
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Every month that has messages, through three months ahead
+SELECT create_message_partitions(
+    'messages_partitioned',
+    COALESCE((SELECT MIN(created_date) FROM messages), NOW())::DATE,
+    (NOW() + INTERVAL '3 months')::DATE
+);
+
+-- Rows with a NULL created_date (allowed by 01-create-tables.sql) get the migration time
+INSERT INTO messages_partitioned (id, message, role, visible_to_user, step_id, parent_id, user_id, created_date)
+SELECT id, message, role, visible_to_user, step_id, parent_id, user_id, COALESCE(created_date, NOW())
+FROM messages;
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER TABLE messages_partitioned RENAME TO messages;
+
+-- Free the index names for the partitioned table
+ALTER INDEX IF EXISTS idx_messages_created_date RENAME TO idx_messages_unpartitioned_created_date;
+ALTER INDEX IF EXISTS idx_messages_parent_id RENAME TO idx_messages_unpartitioned_parent_id;
+ALTER INDEX IF EXISTS idx_messages_user_timeline RENAME TO idx_messages_unpartitioned_user_timeline;
+ALTER INDEX IF EXISTS idx_messages_user_visible_timeline RENAME TO idx_messages_unpartitioned_user_visible_timeline;
+
+-- Indexes are created on every partition. Only the ones queries use are kept:
+-- the GIN index over the whole message JSONB and the single-column role,
+-- visibility and step indexes are dropped (nothing filters on them alone).
+CREATE INDEX IF NOT EXISTS idx_messages_created_date ON messages (created_date);
+CREATE INDEX IF NOT EXISTS idx_messages_parent_id ON messages (parent_id);
+CREATE INDEX IF NOT EXISTS idx_messages_user_timeline ON messages (user_id, created_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_user_visible_timeline
+    ON messages (user_id, created_date DESC, id DESC)
+    WHERE visible_to_user;
+
+GRANT SELECT, INSERT, UPDATE, DELETE ON messages TO chatuser;
+GRANT EXECUTE ON FUNCTION create_message_partitions(REGCLASS, DATE, DATE) TO chatuser;
+
+COMMIT;
+
+-- The old heap is kept until the copy has been checked:
+--   SELECT (SELECT COUNT(*) FROM messages) = (SELECT COUNT(*) FROM messages_unpartitioned);
+--   DROP TABLE messages_unpartitioned;